@@ -9,17 +9,34 @@
     This file is the entry point for our dash app.
 '''
 
+import os
+import threading
+
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import dash_daq as daq
 import dash_bootstrap_components as dbc
 import pandas as pd
-import plotly.graph_objects as go
 
 import template
-import preprocess
-import heatmap, line_charts, bar_charts, dot_charts, passage_map
+import snapshot
+import dataset
+import delta
+import fetch
+import loader
+import metrics
+import passage_index
+import catalog
+import cumulative
+import figure_cache
+import figures
+import flows
+import response_cache
+import summary_stats
+import trip_geometry
+import voyages
+import line_charts, bar_charts, dot_charts, passage_map
 #
 #
 # Read: data is local, read and process original trip file.
@@ -31,29 +48,162 @@ import heatmap, line_charts, bar_charts, dot_charts, passage_map
 
 # trips_df_heat = pd.read_csv(trips_filename)
 # detail_df = pd.read_csv(detail_filename)
+# or point TRIPS_SOURCE and DETAIL_SOURCE to the local files, even the full ones:
+# they are streamed in chunks into the snapshot (see ingest.py).
 # end Read data local.
 
 
 # for web-hosting:
-trips_df_heat = pd.read_csv("https://inf8808-vis-test.s3.amazonaws.com/web-hosting/trips_slim.csv")
-detail_df = pd.read_csv("https://inf8808-vis-test.s3.amazonaws.com/web-hosting/detail_sample.csv")
+TRIPS_SOURCE = os.environ.get("TRIPS_SOURCE",
+                              "https://inf8808-vis-test.s3.amazonaws.com/web-hosting/trips_slim.csv")
+DETAIL_SOURCE = os.environ.get("DETAIL_SOURCE",
+                               "https://inf8808-vis-test.s3.amazonaws.com/web-hosting/detail_sample.csv")
 # end for web hosting.
 
-trips_df_heat = preprocess.convert_dates(trips_df_heat)
-trips_df_heat = preprocess.filter_years(trips_df_heat, 2011, 2021)  # to be used in region, harbour, vessel.
+# the remote sources are downloaded once into a local cache (see fetch.py), set FETCH_MAX_AGE
+# to check them against the server again after that many seconds.
+FETCH_DIR = os.environ.get("FETCH_DIR", "./assets/data/cache")
+FETCH_MAX_AGE = float(os.environ["FETCH_MAX_AGE"]) if os.environ.get("FETCH_MAX_AGE") else None
+
+# the sources are converted once into a local snapshot (dates parsed, years filtered),
+# later boots only open the snapshot, it is rebuilt when the sources change.
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "./assets/data/snapshot")
+
+# the workers memory-map the snapshot read-only and share its pages (see snapshot.py),
+# set SHARED_SNAPSHOT=0 to read it in the memory of each worker instead.
+SHARED_SNAPSHOT = os.environ.get("SHARED_SNAPSHOT", "1") != "0"
+
+# the figures prerendered by the warm-up command (python prerender.py), read on a figure cache miss.
+FIGURE_STORE = os.environ.get("FIGURE_STORE", "./assets/data/figures")
+
+# the url of a static export of the figures (python static_export.py): when set, the browser
+# reads the figures from it and the server builds none (see assets/static_figures.js).
+STATIC_FIGURES = os.environ.get("STATIC_FIGURES", "").rstrip("/")
+
+# new trips and passages are appended with POST /api/append (see delta.py), when a token is set.
+# out of SNAPSHOT_DIR: a rebuild of the snapshot replaces its directory.
+DELTA_DIR = os.environ.get("DELTA_DIR", "./assets/data/deltas")
+APPEND_TOKEN = os.environ.get("APPEND_TOKEN", "")
+# merging a delta gives each worker its own copy of the trips and passages: once FOLD_DELTAS deltas
+# are merged, they are folded into a new generation of the snapshot, loaded again shared (0: never).
+FOLD_DELTAS = int(os.environ.get("FOLD_DELTAS", "1"))
+# one delta is merged at a time in the process.
+DELTA_LOCK = threading.Lock()
+
+
+def load_dataset():
+    '''
+        Opens the snapshot and derives the values used by the callbacks.
+        Runs in the background thread of the loader.
+
+        Returns:
+            The dataset, see dataset.py
+    '''
+    try:
+        trips_source, detail_source = fetch.fetch_all([TRIPS_SOURCE, DETAIL_SOURCE], FETCH_DIR, FETCH_MAX_AGE)
+    except (OSError, ValueError) as error:
+        # the snapshot checks the sources itself, and is used as is if they can not be reached.
+        print("could not download the sources: {}".format(error))
+        trips_source, detail_source = TRIPS_SOURCE, DETAIL_SOURCE
+
+    snapshot_dir = os.path.abspath(SNAPSHOT_DIR)
+    if os.path.commonpath([snapshot_dir, os.path.abspath(DELTA_DIR)]) == snapshot_dir:
+        raise ValueError("DELTA_DIR must not be inside SNAPSHOT_DIR, a rebuild of the snapshot removes it")
+    # older versions kept the deltas in the snapshot directory.
+    moved = delta.adopt(DELTA_DIR, os.path.join(SNAPSHOT_DIR, "deltas"))
+    if moved:
+        print("moved {} deltas from {} to {}".format(moved, os.path.join(SNAPSHOT_DIR, "deltas"), DELTA_DIR))
+
+    trips_df_heat, detail_df, generation, orders = snapshot.load(SNAPSHOT_DIR, trips_source, detail_source,
+                                                                 2011, 2021,  # to be used in region, harbour, vessel.
+                                                                 shared=SHARED_SNAPSHOT)
+
+    carried = delta.carry_over(DELTA_DIR, generation["sources"])
+    if carried:
+        print("carried over {} deltas of previous sources, replayed on the current ones".format(carried))
+
+    data = dataset.build_dataset(trips_df_heat, detail_df, generation["version"], orders)
+    # the deltas are kept by the sources of the snapshot, the first ones may be folded in it, see delta.py
+    data.update(sources=generation["sources"], deltas=generation["deltas"], folded=generation["deltas"])
+    data = delta.sync(data, DELTA_DIR, 2011, 2021)
+    figures.prefill_heatmaps(data)
+
+    return data
+
+
+def append_delta(content, kind):
+    '''
+        Merges new trips or passages into the current dataset and swaps
+        the new dataset in.
+
+        Args:
+            content: the CSV of the delta, bytes
+            kind: "trips" or "passages"
+        Returns:
+            The new dataset.
+    '''
+    with DELTA_LOCK:
+        data = delta.append(loader.get_dataset(), DELTA_DIR, content, kind, 2011, 2021)
+        figures.prefill_heatmaps(data)
+        loader.set_dataset(data)
+        fold_deltas(data)
+
+    return data
+
+
+def fold_deltas(data):
+    '''
+        Folds the deltas merged in the dataset into a new generation of
+        the snapshot once there are FOLD_DELTAS of them, and loads it again
+        in the background: the dataset is served until then, and after a
+        failure until the loader's backoff is over. The workers folding the
+        same deltas write it once and all load it again.
+
+        Args:
+            data: the current dataset
+    '''
+    if not FOLD_DELTAS or data.get("deltas", 0) - data.get("folded", 0) < FOLD_DELTAS:
+        return
+
+    def build():
+        delta.fold(data, SNAPSHOT_DIR, FOLD_DELTAS)
+        return load_dataset()
+
+    loader.reload(build)
+
 
+def sync_deltas():
+    '''
+        Merges the deltas appended through the other workers.
+
+        Returns:
+            The current dataset, None while it is loading.
+    '''
+    with DELTA_LOCK:
+        data = loader.get_dataset()
+        if data is None:
+            return None
+        synced = delta.sync(data, DELTA_DIR, 2011, 2021)
+        if synced is not data:
+            figures.prefill_heatmaps(synced)
+            loader.set_dataset(synced)
+        fold_deltas(synced)
+
+    return synced
+
+
+def get_callback_name(output):
+    '''
+        Names the callback of an output, for the metrics.
 
-# summary panel
-total_voyage0 = trips_df_heat.shape[0]
-total_voyage = "{:,}".format(total_voyage0)
-international_trips = preprocess.get_international_trips(trips_df_heat)
-most_used_vessel = trips_df_heat[["Vessel Type", "Id"]].groupby("Vessel Type"
-                                                                ).count().sort_values(by="Id", ascending=False).index[0]
-trip_duration = preprocess.get_trip_duration(trips_df_heat, total_voyage0)
+        Args:
+            output: the output of a callback request, e.g. "heatmap_region.figure"
+        Returns:
+            The name of the callback function, the output if it is unknown.
+    '''
+    callback = app.callback_map.get(output, {}).get("callback")
 
-# region, harbour, vessel
-regions_sorted = sorted(trips_df_heat["Departure Region"].unique())
-vessel_type_sorted = sorted(trips_df_heat["Vessel Type"].unique())
+    return callback.__name__ if callback is not None else output
 
 
 template.create_custom_theme()
@@ -82,6 +232,7 @@ feature_ops = dbc.RadioItems(
         dict(label="HARBOUR", value=1),
         dict(label="VESSEL", value=2),
         dict(label="VOYAGE", value=3),
+        dict(label="FLOWS", value=4),
     ],
     value=0,
     inline=True,
@@ -94,9 +245,49 @@ feature_ops = dbc.RadioItems(
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
 
+# the server accepts requests while the data loads in the background.
+loader.register_routes(server)
+# before the response cache, to measure its hits.
+metrics.register_routes(server, get_callback_name)
+figure_cache.register_routes(server)
+figures.set_store(FIGURE_STORE)
+summary_stats.register_routes(server, loader.get_dataset)
+delta.register_routes(server, loader.get_dataset, append_delta, APPEND_TOKEN)
+voyages.register_routes(server, loader.get_dataset)
+flows.register_routes(server, loader.get_dataset)
+# repeated callback requests are answered with the serialized response of the first one.
+response_cache.register_routes(server, loader.get_dataset)
+loader.start(load_dataset)
+
 app.title = 'PROJECT | INF8808'
 
 
+def figure_callback(output, inputs):
+    '''
+        Registers a callback building figures on the server or, in the
+        static mode, the clientside function of the same name reading
+        them from the static export (see static_export.py).
+
+        Args:
+            output: the output of the callback
+            inputs: the list of its inputs
+        Returns:
+            The decorator.
+    '''
+    def register(function):
+        if STATIC_FIGURES:
+            app.clientside_callback(
+                ClientsideFunction(namespace='static_figures', function_name=function.__name__),
+                output,
+                inputs + [State('static-figures', 'data')]
+            )
+            return function
+
+        return app.callback(output, inputs)(function)
+
+    return register
+
+
 app.layout = html.Div([
     html.Div([
         html.H1('Maritime Traffic in Canada'),
@@ -105,6 +296,14 @@ app.layout = html.Div([
     # dcc.Store stores the intermediate value
     dcc.Store(id='intermediate-value-region-trip-direction'),
 
+    # version of the loaded data, polled quickly until the data is ready,
+    # then slowly to pick up appended data.
+    dcc.Store(id='dataset-version'),
+    dcc.Interval(id='loading-poll', interval=1000),
+
+    # url of the static export of the figures, empty when the server builds them.
+    dcc.Store(id='static-figures', data=STATIC_FIGURES),
+
 # panel summary
     html.Div([
         html.Div([
@@ -122,7 +321,7 @@ app.layout = html.Div([
                                 },
                             ),
                             html.H3(
-                                html.P(total_voyage),
+                                html.P("..."),
                                 id="trip_total"
                             ),
                         ],
@@ -136,7 +335,7 @@ app.layout = html.Div([
                                 },
                             ),
                             html.H3(
-                                html.P(international_trips),
+                                html.P("..."),
                                 id="trip_international"
                             ),
                         ],
@@ -150,7 +349,7 @@ app.layout = html.Div([
                                 },
                             ),
                             html.H3(
-                                html.P(trip_duration),
+                                html.P("..."),
                                 id="trip_duration"
                             ),
                         ],
@@ -164,7 +363,7 @@ app.layout = html.Div([
                             },
                         ),
                         html.H3(
-                            html.P(most_used_vessel),
+                            html.P("..."),
                             id="vessel_king"
                         ),
                     ],
@@ -174,6 +373,15 @@ app.layout = html.Div([
                 ],
                 style={"display": "flex"},
             ),
+            # the summary, the heatmaps and the drill-downs are scoped to the days selected,
+            # the figures of the static export cover all the days.
+            html.Div([
+                dcc.RangeSlider(id='date_range', min=0, max=0, step=1, allowCross=False,
+                                updatemode='mouseup', disabled=bool(STATIC_FIGURES)),
+                html.P(id='date_range_label', style={"text-align": "center"}),
+            ],
+                style={"margin-left": "4%", "margin-right": "4%"},
+            ),
         ],
             className="box",
             style={
@@ -206,12 +414,124 @@ app.layout = html.Div([
 )
 # -------------------------------callback ----------------------
 
+# data version, polled until the data is loaded.
+@app.callback(
+    [Output('dataset-version', 'data'),
+     Output('loading-poll', 'interval')],
+    [Input('loading-poll', 'n_intervals')],
+    [State('dataset-version', 'data')],
+)
+def poll_version(n_intervals, stored_version):
+    '''
+        Polls the loader until the data is ready, then stores the version
+        of the data. Polls slowly afterwards, new data is displayed when
+        it is appended.
+
+        Args:
+            The number of polls and the version displayed so far.
+        Returns:
+            The data version and the polling interval.
+    '''
+    data = sync_deltas()
+    if data is None:
+        return dash.no_update, 1000
+
+    if data["version"] == stored_version:
+        raise dash.exceptions.PreventUpdate
+
+    return data["version"], 30000
+
+
+# date range slider, spans the days of the data.
+@app.callback(
+    [Output('date_range', 'min'),
+     Output('date_range', 'max'),
+     Output('date_range', 'marks'),
+     Output('date_range', 'value')],
+    [Input('dataset-version', 'data')],
+    [State('date_range', 'value'),
+     State('date_range', 'max')],
+)
+def update_date_range(version, date_range, stored_max):
+    '''
+        Sets the days of the slider, in days since epoch, marked at the
+        start of each year. The selected range is kept when data is
+        appended, unless it ran to the last day.
+
+        Args:
+            The data version, the selected days and the last day so far.
+        Returns:
+            The first and last days, the marks and the selected days.
+    '''
+    data = loader.get_dataset()
+    if data is None:
+        raise dash.exceptions.PreventUpdate
+
+    trips = data["cumulative"]["trips"]
+    first_day, last_day = trips["first_day"], trips["first_day"] + max(trips["days"] - 1, 0)
+    years = list(range(pd.Timestamp(first_day, unit="D").year, pd.Timestamp(last_day, unit="D").year + 1))
+    marks = {str(day): str(year) for year, day in zip(years, cumulative.get_year_days(years).tolist())
+             if day >= first_day}
+
+    if date_range and date_range[1] != stored_max:
+        date_range = [max(date_range[0], first_day), min(date_range[1], last_day)]
+    else:
+        date_range = [date_range[0] if date_range else first_day, last_day]
+
+    return first_day, last_day, marks, date_range
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='format_days'),
+    Output('date_range_label', 'children'),
+    [Input('date_range', 'value')]
+)
+
+
+# summary panel, filled once the data is loaded.
+@app.callback(
+    [Output('trip_total', 'children'),
+     Output('trip_international', 'children'),
+     Output('trip_duration', 'children'),
+     Output('vessel_king', 'children')],
+    [Input('dataset-version', 'data'),
+     Input('date_range', 'value')],
+)
+def update_summary(version, date_range):
+    '''
+        Displays the summary statistics of the trips departing in the
+        selected days, read from the cumulative counts: any range costs
+        the same.
+
+        Args:
+            The data version and the selected days.
+        Returns:
+            The summary values.
+    '''
+    data = loader.get_dataset()
+    if data is None:
+        raise dash.exceptions.PreventUpdate
+
+    days = cumulative.get_days(data["cumulative"], date_range)
+    if days is not None:
+        data = summary_stats.format_stats(*cumulative.get_stats(data["cumulative"]["trips"], days))
+
+    return (html.P(data["total_voyage"]), html.P(data["international_trips"]),
+            html.P(data["trip_duration"]), html.P(data["most_used_vessel"]))
+
+
 # page selection
 @app.callback(
     Output(component_id='output', component_property='children'),
-    [Input('feature_ops', 'value')],
+    [Input('feature_ops', 'value'),
+     Input('dataset-version', 'data')],
 )
-def update_page(filter_chosen):
+def update_page(filter_chosen, version):
+    data = loader.get_dataset()
+    region_options = data["catalog"]["region_options"] if data is not None else []
+    vessel_options = data["catalog"]["vessel_options"] if data is not None else []
+    all_harbour_options = data["catalog"]["all_harbour_options"] if data is not None else []
+
  # region page
     if filter_chosen == 0:
         return html.Div([
@@ -226,6 +546,8 @@ def update_page(filter_chosen):
                     color="#8BC8FF",
                     value=False,
                 ),
+                # daily and monthly figures of the clicked cell, the toggle picks one in the browser.
+                dcc.Store(id='region-figures'),
             ],
                 className='row',
             ),
@@ -254,6 +576,29 @@ def update_page(filter_chosen):
                 },
             ),
 
+            html.Div([
+                dcc.Graph(
+                    id='heatmap_harbour',
+                    figure={},
+                    className='graph',
+                    config=dict(
+                        scrollZoom=False,
+                        showTips=False,
+                        showAxisDragHandles=False,
+                        doubleClick=False,
+                        displayModeBar=False
+                    )
+                ),
+            ],
+                className="box",
+                style={
+                    "margin": "2px",
+                    "padding-top": "2px",
+                    "padding-bottom": "2px",
+                    "width": "100%"
+                },
+            ),
+
             html.Div([
                 dcc.Graph(
                     id='line_region',
@@ -292,7 +637,7 @@ def update_page(filter_chosen):
                                    ),
                                 html.Div([
                                     dcc.Dropdown(id='region_selector', multi=False,
-                                                 options=[{'label': x, 'value': x} for x in regions_sorted],
+                                                 options=region_options,
                                                  value="Pacific Region",
                                                  searchable=True,
                                                  clearable=True,
@@ -328,6 +673,8 @@ def update_page(filter_chosen):
                                 color="#8BC8FF",
                                 value=False,
                             ),
+                            # daily and monthly figures of the clicked bar, the toggle picks one in the browser.
+                            dcc.Store(id='harbour-figures'),
                         ],
                            className='box',
                             style={"box-shadow": "0px 0px 0px #F9F9F8"}
@@ -406,7 +753,7 @@ def update_page(filter_chosen):
                             html.Div([
                                 "Select a Vessel Type",
                                 dcc.Dropdown(id='vessel_selector', multi=False,
-                                             options=[{'label': x, 'value': x} for x in vessel_type_sorted],
+                                             options=vessel_options,
                                              value="Special Purpose",
                                              searchable=True,
                                              clearable=False,
@@ -470,6 +817,61 @@ def update_page(filter_chosen):
         ])
 
 
+    # flows page
+    elif filter_chosen == 4:
+        first_year, last_year = flows.get_years(data["flows"]) if data is not None else (2011, 2021)
+        return html.Div([
+            html.Div([
+                html.Div([
+                    html.Br(),
+                    html.Div([
+                        dcc.RadioItems(id="flow_level",
+                                       options=[dict(label="Regions", value="region"),
+                                                dict(label="Harbours", value="harbour")],
+                                       value="region",
+                                       inline=True,
+                                       style={"width": "20%"}),
+                        dcc.Dropdown(id="flow_vessel", multi=False,
+                                     options=vessel_options,
+                                     placeholder="all vessel types",
+                                     clearable=True,
+                                     style={"width": "300px"}),
+                        dcc.Dropdown(id="flow_region", multi=False,
+                                     options=region_options,
+                                     placeholder="all regions",
+                                     clearable=True,
+                                     style={"width": "300px"}),
+                    ],
+                        className="row",
+                    ),
+                    html.Br(),
+                    dcc.RangeSlider(id="flow_years", min=first_year, max=last_year, step=1,
+                                    value=[first_year, last_year],
+                                    marks={str(year): str(year) for year in range(first_year, last_year + 1)}),
+                    dcc.Graph(
+                        id='sankey_flows',
+                        className='graph',
+                        figure={},
+                        config=dict(
+                            scrollZoom=False,
+                            showTips=False,
+                            displayModeBar=False
+                        )
+                    ),
+                ],
+                    className="box",
+                    style={
+                        "margin": "2px",
+                        "padding-top": "2px",
+                        "padding-bottom": "2px",
+                        "width": "100%"},
+                ),
+            ],
+                className="row",
+            ),
+        ])
+
+
     # voyage page
     else:
         return html.Div([
@@ -478,16 +880,30 @@ def update_page(filter_chosen):
                     html.Br(),
                     html.Label(
                         "Fill in a trip Id. e.g., 2079000000818245, empty map inidcates invalid Id. "
+                        "Several Ids separated by commas are shown together, "
+                        "or pick a harbour to show its trips (up to {}).".format(voyages.MAX_TRIPS)
                     ),
 
                     html.Div([
                         html.Div([
-                            dcc.Input(id="trip_input", type="number",
-                                      value=2079000000818245,
-                                      placeholder="digits",
+                            dcc.Input(id="trip_input", type="text",
+                                      value="2079000000818245",
+                                      placeholder="digits, separated by commas",
                                       debounce=True),
-                        ]),
-                        html.Br(),
+                            dcc.Dropdown(id="voyage_harbour", multi=False,
+                                         options=all_harbour_options,
+                                         placeholder="or the trips of a harbour",
+                                         style={"width": "300px"}),
+                            dcc.DatePickerRange(id="voyage_dates",
+                                                min_date_allowed="2011-01-01",
+                                                max_date_allowed="2021-12-31",
+                                                start_date_placeholder_text="first departure",
+                                                end_date_placeholder_text="last departure",
+                                                clearable=True),
+                        ],
+                            className="row",
+                        ),
+                        html.Div(id="trip_message"),
                         html.Br(),
                         html.Div([
                             dcc.Graph(
@@ -529,84 +945,115 @@ def update_page(filter_chosen):
 
 
 # region page features: show heatmap
-@app.callback(
+@figure_callback(
     Output("heatmap_region", "figure"),
-    [Input("trip_direction", "value")],
+    [Input("trip_direction", "value"),
+     Input("date_range", "value")],
 )
-def update_region_heat(direction_chosen):
+def update_region_heat(direction_chosen, date_range):
     '''
         Display a heatmap based on radio button value.
 
         Args:
             The radio button value indicating trip directions. default to 0,
-            means departure.
+            means departure, and the selected days.
         Returns:
             The necessary output values to update the heatmap.
 
     '''
 
-    yearly_df = preprocess.summarize_yearly_counts(trips_df_heat, direction_chosen)  # 0 means Departure
-    data = preprocess.restructure_df(yearly_df)
+    dataset = loader.get_dataset()
+    if dataset is None:
+        return template.get_loading_figure()
 
-
-    region_heat_fig = heatmap.get_figure(data, direction_chosen, total_voyage0)
+    # only 3 directions over all the days: the heatmaps are built at load, see figures.prefill_heatmaps.
+    # a range of days is read from the cumulative counts.
+    days = cumulative.get_days(dataset["cumulative"], date_range)
+    region_heat_fig = figures.get_cached("region_heat", dataset, direction_chosen, days)
 
     return region_heat_fig
 
 
+# region page features: show the harbours of a region
+@figure_callback(
+    Output("heatmap_harbour", "figure"),
+    [Input("heatmap_region", "clickData"),
+     Input("trip_direction", "value"),
+     Input("date_range", "value")],
+)
+def update_harbour_heat(click_data, direction_chosen, date_range):
+    '''
+        Display a heatmap of the harbours of the region clicked in the
+        region heatmap, by year. Before any click, shows the region
+        with the most voyages.
+
+        Args:
+            The clicked cell of the region heatmap, the radio button
+            value indicating trip directions and the selected days.
+        Returns:
+            The heatmap of the harbours of the region.
+    '''
+
+    dataset = loader.get_dataset()
+    if dataset is None:
+        return template.get_loading_figure()
+
+    if click_data is not None:
+        region = click_data['points'][0]['y']
+    else:
+        region = figures.get_default_region(dataset)
+
+    # built from the yearly counts of the harbours, see cube.build_harbour_years.
+    days = cumulative.get_days(dataset["cumulative"], date_range)
+    harbour_heat_fig = figures.get_cached("harbour_heat", dataset, region, direction_chosen, days)
+
+    return harbour_heat_fig
+
+
 # region page features: show line or bar
-@app.callback(
-    Output('line_region', 'figure'),
+@figure_callback(
+    Output('region-figures', 'data'),
     [Input('heatmap_region', 'clickData'),
      Input("trip_direction", "value"),
-     Input('region-toggle', 'value')]
+     Input("date_range", "value")]
 )
-def region_heatmap_clicked(click_data, stored_direction, toggle_value):
+def region_heatmap_clicked(click_data, stored_direction, date_range):
     '''
-        When a cell in the heatmap is clicked, updates the
-        line or bar chart shows the data for the corresponding
+        When a cell in the heatmap is clicked, builds the
+        line and bar charts showing the data for the corresponding
         region & year. If there is no data to show,
-        displays a message. The toggle selects line or bar charts.
+        displays a message. The toggle selects line or bar charts
+        in the browser.
 
         Args:
-            The necessary inputs to update the line or bar chart.
+            The necessary inputs to update the line and bar charts.
         Returns:
-            The necessary output values to update the line or bar
-            chart.
+            The daily line chart and the monthly bar chart, packed.
     '''
+    data = loader.get_dataset()
+    if data is None:
+        loading_fig = template.get_loading_figure()
+        return figures.pack_frequencies(loading_fig, loading_fig)
+
     if click_data is None or click_data['points'][0]['z'] == None:
         line_fig_empty = line_charts.get_empty_figure("region_page")
 
-        return line_fig_empty
+        return figures.pack_frequencies(line_fig_empty, line_fig_empty)
 
     region = click_data['points'][0]['y']
     year = click_data['points'][0]['x']
 
-    if not toggle_value:
-        # daily trip line chart
-        line_data = preprocess.get_data_by_freq(
-            trips_df_heat,
-            region,
-            year,
-            stored_direction,
-            "daily"
-        )
+    # prerendered by the warm-up command over all the days, see prerender.py
+    days = cumulative.get_days(data["cumulative"], date_range)
+    return figures.get_cached("region_frequencies", data, region, year, stored_direction, days)
 
-        my_fig = line_charts.get_region_figure(line_data, region, year, stored_direction)
 
-    else:
-        # monthly trip bar chart
-        bar_data = preprocess.get_data_by_freq(
-            trips_df_heat,
-            region,
-            year,
-            stored_direction,
-            "monthly"
-        )
-
-        my_fig = bar_charts.get_region_figure(bar_data, region, year, stored_direction)
-
-    return my_fig
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='pick_frequency'),
+    Output('line_region', 'figure'),
+    [Input('region-figures', 'data'),
+     Input('region-toggle', 'value')]
+)
 
 
 # harbour page features: chained dropdown
@@ -624,28 +1071,36 @@ def set_harbour_options(region_chosen):
         Returns:
             The necessary output values to update the harbour dropdown.
     '''
-    regions_harbours = preprocess.all_region_harbour(trips_df_heat)
-    harbours = preprocess.get_harbours_by_region(regions_harbours, region_chosen)
+    data = loader.get_dataset()
+    if data is None:
+        return []
 
-    return [{'label': x, 'value': x} for x in harbours]
+    # built once per dataset, see catalog.py
+    return catalog.get_harbour_options(data["catalog"], region_chosen)
 
 
 # harbour page features: stack bar
-@app.callback(
+@figure_callback(
     Output('bar_harbour_year', 'figure'),
     [Input('region_selector', 'value'),
-     Input('harbour_selector', 'value')]
+     Input('harbour_selector', 'value'),
+     Input('date_range', 'value')]
 )
-def add_stack_bar(region, harbour):
+def add_stack_bar(region, harbour, date_range):
     '''
         Display a stacked bar based on the input value from Region and Harbour dropdowns.
 
         Args:
-            The dropdowns indicate a Region and a harbour in the region.
+            The dropdowns indicate a Region and a harbour in the region,
+            and the selected days.
         Returns:
             The necessary output values to update the stacked bar.
     '''
 
+    data = loader.get_dataset()
+    if data is None:
+        return template.get_loading_figure()
+
     ctx = dash.callback_context
     my_trigger = ctx.triggered
 
@@ -658,42 +1113,38 @@ def add_stack_bar(region, harbour):
         return bar_fig_empty
 
 
-    stack_bar_data_depart = preprocess.get_depart_by_harbour(trips_df_heat, region, harbour)
-    stack_bar_data_arrive = preprocess.get_arrive_by_harbour(trips_df_heat, region, harbour)
-    stack_bar_data = preprocess.prepare_data_by_harbour(stack_bar_data_depart,
-                                                        stack_bar_data_arrive)
-
-    if stack_bar_data.shape[0] < 1:
-        bar_fig_empty = bar_charts.get_empty_figure()
-        return bar_fig_empty
-    else:
-        stack_bar_fig = bar_charts.get_harbour_figure_year(stack_bar_data, region, harbour)
+    days = cumulative.get_days(data["cumulative"], date_range)
+    stack_bar_fig = figures.get_cached("harbour_bar", data, region, harbour, days)
 
     return stack_bar_fig
 
 
 # harbour page features: click stack bar to show line daily or bar monthly
-@app.callback(
-    Output('line_harbour', 'figure'),
+@figure_callback(
+    Output('harbour-figures', 'data'),
     [Input('bar_harbour_year', 'clickData'),
      Input('region_selector', 'value'),
      Input('harbour_selector', 'value'),
-     Input('harbour-toggle', 'value')]
+     Input('date_range', 'value')]
 )
-def region_stack_bar_clicked(click_data, region_chosen, harbour_chosen, toggle_value):
+def region_stack_bar_clicked(click_data, region_chosen, harbour_chosen, date_range):
     '''
-        When a section of a stack bar is clicked, updates the
-        line or bar chart to show the data for the corresponding
+        When a section of a stack bar is clicked, builds the
+        line and bar charts showing the data for the corresponding
         harbour & year. If there is no data to show, displays a message.
-        The toggle selects line or bar charts.
+        The toggle selects line or bar charts in the browser.
 
         Args:
-            The necessary inputs to update the line or bar chart.
+            The necessary inputs to update the line and bar charts.
         Returns:
-            The necessary output values to update the line or bar
-            chart.
+            The daily line chart and the monthly bar chart, packed.
     '''
 
+    data = loader.get_dataset()
+    if data is None:
+        loading_fig = template.get_loading_figure()
+        return figures.pack_frequencies(loading_fig, loading_fig)
+
     ctx = dash.callback_context
     my_trigger = ctx.triggered
   #  print(my_trigger)
@@ -707,91 +1158,60 @@ def region_stack_bar_clicked(click_data, region_chosen, harbour_chosen, toggle_v
     if click_data is None or not region_chosen or not harbour_chosen:
         line_fig_empty = line_charts.get_empty_figure("harbour_page")
 
-        return line_fig_empty
+        return figures.pack_frequencies(line_fig_empty, line_fig_empty)
     #
     # num_trips = click_data['points'][0]['y']
     year = click_data['points'][0]['x']
     direction = click_data["points"][0]["customdata"][0]
     trip_direction = directions[direction]
 
-    if not toggle_value:
-    # daily trip line chart
-
-        if trip_direction == 0: # departure
-            line_data = preprocess.get_depart_by_harbour(trips_df_heat, region_chosen, harbour_chosen)
-            line_data = preprocess.prepare_day_month_data_by_harbour(line_data, year, "daily")
-
-        elif trip_direction == 1: # arrive
-            line_data = preprocess.get_arrive_by_harbour(trips_df_heat, region_chosen, harbour_chosen)
-            line_data = preprocess.prepare_day_month_data_by_harbour(line_data, year, "daily")
-
-        else:
-            print("wrong trip direction value")
-            return go.Figure(), go.Figure()
-
-        my_fig = line_charts.get_region_figure(line_data,
-                                                 region_chosen,
-                                                 year,
-                                                 trip_direction,
-                                                 harbour=harbour_chosen)
-
-    else:
-        # monthly trip bar chart
-
-        if trip_direction == 0: # departure
-            bar_data = preprocess.get_depart_by_harbour(trips_df_heat, region_chosen, harbour_chosen)
-            bar_data = preprocess.prepare_day_month_data_by_harbour(bar_data, year, "monthly")
-
-        elif trip_direction == 1: # arrive
-            bar_data = preprocess.get_arrive_by_harbour(trips_df_heat, region_chosen, harbour_chosen)
-            bar_data = preprocess.prepare_day_month_data_by_harbour(bar_data, year, "monthly")
-
-        else:
-            print("wrong trip direction value")
-            return go.Figure(), go.Figure()
-
-        my_fig = bar_charts.get_region_figure(bar_data,
-                                                 region_chosen,
-                                                 year,
-                                                 trip_direction,
-                                                 harbour=harbour_chosen)
+    days = cumulative.get_days(data["cumulative"], date_range)
+    return figures.get_cached("harbour_frequencies", data, region_chosen, harbour_chosen, trip_direction, year,
+                              days)
 
 
-    return my_fig
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='pick_frequency'),
+    Output('line_harbour', 'figure'),
+    [Input('harbour-figures', 'data'),
+     Input('harbour-toggle', 'value')]
+)
 
 
 # vessel page feature. show heatmap
-@app.callback(
+@figure_callback(
     Output("heatmap_vessel", "figure"),
-    [Input("vessel_selector", "value")],
+    [Input("vessel_selector", "value"),
+     Input("date_range", "value")],
 )
-def updape_heat_by_vessel(vessel_chosen):
+def updape_heat_by_vessel(vessel_chosen, date_range):
     '''
         Based on the vessel type indicated by the dropdown,
         display all trips using the type of vessel on a heatmap.
 
         Args:
-            A value indicates a vessel type.
+            A value indicates a vessel type, and the selected days.
         Returns:
             A heatmap shows all trips using the type of vessel.
     '''
-    trip_direction = 2  # display depart + arrive
+    dataset = loader.get_dataset()
+    if dataset is None:
+        return template.get_loading_figure()
 
-    # filter by vessel type, vessel_chosen can never be None, controled by Dash.
-    trips_vessel_df = trips_df_heat.loc[trips_df_heat["Vessel Type"]==vessel_chosen]
-    yearly_df = preprocess.summarize_yearly_counts(trips_vessel_df, trip_direction)
-    data = preprocess.restructure_df(yearly_df)
-    region_heat_fig = heatmap.get_figure(data, trip_direction, total_voyage0)
+    # vessel_chosen can never be None, controled by Dash.
+    days = cumulative.get_days(dataset["cumulative"], date_range)
+    region_heat_fig = figures.get_cached("vessel_heat", dataset, vessel_chosen, days)
 
     return region_heat_fig
 
 # vessel page voyage/harbour section.
-@app.callback(
+@figure_callback(
     Output('dot_vessel', 'figure'),
     [Input('heatmap_vessel', 'clickData'),
-     Input("vessel_selector", "value")]
+     Input("vessel_selector", "value"),
+     Input("date_range", "value")]
 )
-def vessel_heatmap_clicked(click_data, vessel_chosen):
+def vessel_heatmap_clicked(click_data, vessel_chosen, date_range):
     '''
         The heatmap displays all trips using a type of vessel.
         When a cell in the heatmap is clicked, updates the
@@ -804,6 +1224,10 @@ def vessel_heatmap_clicked(click_data, vessel_chosen):
         Returns:
             The necessary output values to update the dot plot.
     '''
+    data = loader.get_dataset()
+    if data is None:
+        return template.get_loading_figure()
+
     ctx = dash.callback_context
     my_trigger = ctx.triggered
 
@@ -818,52 +1242,131 @@ def vessel_heatmap_clicked(click_data, vessel_chosen):
     year = click_data['points'][0]['x']
 
     # vessel usage in harbours dot plot
-    dotplot_data = preprocess.get_vessel_harbour(
-        trips_df_heat,
-        vessel_chosen,
-        region,
-        year
-    )
-
-    if dotplot_data.shape:
-        fig_RHV = dot_charts.get_vesselport_figure(dotplot_data, region, year)
-    else:
-        fig_RHV = dot_charts.get_empty_figure()
-
+    days = cumulative.get_days(data["cumulative"], date_range)
+    fig_RHV = figures.get_cached("vessel_dots", data, vessel_chosen, region, year, days)
 
     return fig_RHV
 
 
 
+# flows page features: voyages between regions or harbours.
+@app.callback(
+    Output("sankey_flows", "figure"),
+    [Input("flow_level", "value"),
+     Input("flow_vessel", "value"),
+     Input("flow_region", "value"),
+     Input("flow_years", "value")],
+)
+def update_flows(level, vessel_chosen, region_chosen, years):
+    '''
+        Display the voyages between regions or harbours as a Sankey
+        diagram, for the vessel type, region and years selected. Read
+        from the flows counted at load, built by the server in the static
+        mode too.
+
+        Args:
+            The level, the vessel type and the region (all if empty),
+            and the first and last years.
+        Returns:
+            The Sankey diagram.
+    '''
+    data = loader.get_dataset()
+    if data is None:
+        return template.get_loading_figure()
+
+    return figures.get_cached("flows", data, level, vessel_chosen or None, region_chosen or None,
+                              (min(years), max(years)))
+
+
 # voyga page features. if trip Id is incorrect. the map is blank with a message.
 @app.callback(
     [Output("trip_passage","figure"),
-    Output("trip_input", "pattern")],
-    [Input("trip_input", "value")],
+    Output("trip_input", "pattern"),
+    Output("trip_message", "children")],
+    [Input("trip_input", "value"),
+     Input("voyage_harbour", "value"),
+     Input("voyage_dates", "start_date"),
+     Input("voyage_dates", "end_date")],
 )
-def retrieve_passage(trip_id):
+def retrieve_passage(trip_value, harbour, start_date, end_date):
     '''
-    display all the passages of a trip on a map.
+    display all the passages of a trip on a map, or the passages of
+    several trips: the Ids typed, or the trips of the harbour chosen.
 
         Args:
-            A trip Id. If the Id is incorrect, display a message.
+            Trip Ids. If an Id is incorrect, display a message.
+            A harbour and the range of the departure dates of its trips.
         Returns:
-            A map showing the itinerary of a trip.
+            A map showing the itinerary of the trips, and a message.
     '''
 
-    pattern = str(trip_id)
-
-    trip_id = trip_id
-    atrip = detail_df.loc[detail_df.Id == trip_id]  # all ids in trip.csv are in detail_trip.csv
+    data = loader.get_dataset()
+    if data is None:
+        return template.get_loading_figure(), dash.no_update, ""
+
+    pattern = str(trip_value)
+    if harbour:
+        # the end date is the last day shown.
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else None
+        with metrics.phase("data"):
+            trip_ids = voyages.find_trips(data, harbour, start_date, end)
+        return get_overlay(data, trip_ids, pattern)
+
+    trip_ids = voyages.parse_ids(trip_value)
+    if trip_ids is None:
+        return passage_map.get_empty_figure(), pattern + "_invalid", ""
+    if len(trip_ids) > 1:
+        return get_overlay(data, trip_ids, pattern)
+    trip_id = trip_ids[0]
+
+    # all ids in trip.csv are in detail_trip.csv
+    with metrics.phase("data"):
+        atrip = passage_index.get_trip(data["passage_index"], trip_id)
 
     if atrip.empty:
         pattern = pattern + "_invalid"
 
-        return passage_map.get_empty_figure(), pattern
+        return passage_map.get_empty_figure(), pattern, ""
 
     else:
-        fig = passage_map.get_passage_map(atrip)
+        with metrics.phase("data"):
+            geometry = trip_geometry.get_cached(data, trip_id, atrip)
+        with metrics.phase("figure"):
+            fig = passage_map.get_passage_map(atrip, geometry)
+
 
+    return fig, pattern, ""
 
-    return fig, pattern
+
+def get_overlay(data, trip_ids, pattern):
+    '''
+        Draws several trips on one map.
+
+        Args:
+            data: the dataset, see dataset.py
+            trip_ids: the Ids of the trips
+            pattern: the pattern of the trip input
+        Returns:
+            The outputs of retrieve_passage.
+    '''
+    with metrics.phase("data"):
+        batch = voyages.lookup(data, trip_ids)
+
+    if not batch["ids"].shape[0]:
+        return passage_map.get_empty_figure(), pattern + "_invalid", "No trip found."
+
+    with metrics.phase("data"):
+        zoom = passage_map.get_fit_zoom(batch["passages"].Latitude.to_numpy(dtype=float),
+                                        batch["passages"].Longitude.to_numpy(dtype=float))
+        batch = voyages.simplify(batch, zoom)
+    with metrics.phase("figure"):
+        fig = passage_map.get_overlay_map(batch, batch["positions"], zoom)
+
+    message = "{:,} trips shown".format(batch["ids"].shape[0])
+    if batch["truncated"]:
+        message += ", the first {:,} of {:,}".format(voyages.MAX_TRIPS, batch["total"])
+    if batch["missing"].shape[0]:
+        message += ". Unknown Ids: " + ", ".join(map(str, batch["missing"][:10]))
+
+    return fig, pattern, message + "."
 
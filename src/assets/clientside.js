@@ -0,0 +1,60 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    charts: {
+        /*
+         * Picks the daily (line) or the monthly (bar) figure packed by the
+         * server (see figures.pack_frequencies): flipping the toggle needs
+         * no request.
+         */
+        pick_frequency: function(figures, monthly) {
+            if (!figures) {
+                return window.dash_clientside.no_update;
+            }
+            var figure = monthly ? figures.monthly : figures.daily;
+            var layout = Object.assign({}, figure.layout);
+            if (figures.template) {
+                layout.template = figures.template;
+            }
+            var data = (figure.data || []).map(window.dash_clientside.charts.decode_trace);
+            return Object.assign({}, figure, {data: data, layout: layout});
+        },
+
+        /*
+         * Decodes the typed arrays of a trace (see compact.py), base64
+         * {dtype, bdata}, into the typed arrays plotly.js reads.
+         */
+        decode_trace: function(trace) {
+            var types = {
+                i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+                i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array
+            };
+            var decoded = Object.assign({}, trace);
+            Object.keys(trace).forEach(function(name) {
+                var value = trace[name];
+                if (!value || typeof value.bdata !== "string" || !types[value.dtype]) {
+                    return;
+                }
+                var bytes = window.atob(value.bdata);
+                var buffer = new Uint8Array(bytes.length);
+                for (var position = 0; position < bytes.length; position++) {
+                    buffer[position] = bytes.charCodeAt(position);
+                }
+                decoded[name] = new types[value.dtype](buffer.buffer);
+            });
+            return decoded;
+        },
+
+        /*
+         * Writes the days selected by the date range slider, days since
+         * epoch, as dates.
+         */
+        format_days: function(value) {
+            if (!value) {
+                return "";
+            }
+            var dates = value.map(function(day) {
+                return new Date(day * 86400000).toISOString().slice(0, 10);
+            });
+            return dates[0] + " to " + dates[1];
+        }
+    }
+});
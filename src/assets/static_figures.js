@@ -0,0 +1,116 @@
+/*
+ * Figure callbacks of the static mode (see static_export.py): the figures
+ * are read from the static export instead of being built by the server.
+ * Each function has the name and the inputs of the server callback it
+ * replaces in app.py, plus the url of the export. The export covers all
+ * the days, the days selected (disabled slider) are not read.
+ *
+ * The clientside callbacks of this version of Dash return their value, so
+ * the files are read with synchronous requests. The manifest and the
+ * figures read are kept, a figure is read once per page.
+ */
+(function() {
+    var files = {};
+
+    function read(url) {
+        if (!(url in files)) {
+            var request = new XMLHttpRequest();
+            request.open("GET", url, false);
+            request.send(null);
+            files[url] = request.status === 200 ? JSON.parse(request.responseText) : null;
+        }
+        return files[url];
+    }
+
+    function read_empty(base, name) {
+        var manifest = read(base + "/manifest.json");
+        if (!manifest || !manifest.empty[name]) {
+            return window.dash_clientside.no_update;
+        }
+        return read(base + "/" + manifest.empty[name]);
+    }
+
+    function read_figure(base, name, inputs) {
+        var manifest = read(base + "/manifest.json");
+        if (!manifest) {
+            return window.dash_clientside.no_update;
+        }
+        var path = (manifest.figures[name] || {})[JSON.stringify(inputs)];
+        if (!path) {
+            // the cells and bars without voyage are not exported.
+            return read_empty(base, name);
+        }
+        return read(base + "/" + path);
+    }
+
+    function triggered_by(prop_ids) {
+        var context = window.dash_clientside.callback_context;
+        return (context.triggered || []).some(function(trigger) {
+            return prop_ids.indexOf(trigger.prop_id) >= 0;
+        });
+    }
+
+    function clicked(click_data) {
+        return click_data ? click_data.points[0] : null;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        static_figures: {
+            update_region_heat: function(direction, days, base) {
+                return read_figure(base, "region_heat", [direction, null]);
+            },
+
+            update_harbour_heat: function(click_data, direction, days, base) {
+                var point = clicked(click_data);
+                var manifest = read(base + "/manifest.json");
+                var region = point ? point.y : (manifest ? manifest.default_region : null);
+                return read_figure(base, "harbour_heat", [region, direction, null]);
+            },
+
+            region_heatmap_clicked: function(click_data, direction, days, base) {
+                var point = clicked(click_data);
+                if (!point || point.z === null || point.z === undefined) {
+                    return read_empty(base, "region_frequencies");
+                }
+                return read_figure(base, "region_frequencies", [point.y, point.x, direction, null]);
+            },
+
+            add_stack_bar: function(region, harbour, days, base) {
+                if (triggered_by(["region_selector.value"])) {
+                    harbour = null;
+                }
+                if (!region || !harbour) {
+                    return read_empty(base, "harbour_bar");
+                }
+                return read_figure(base, "harbour_bar", [region, harbour, null]);
+            },
+
+            region_stack_bar_clicked: function(click_data, region, harbour, days, base) {
+                if (triggered_by(["region_selector.value", "harbour_selector.value"])) {
+                    click_data = null;
+                }
+                var point = clicked(click_data);
+                if (!point || !region || !harbour) {
+                    return read_empty(base, "harbour_frequencies");
+                }
+                var direction = {"Departure": 0, "Arrival": 1}[point.customdata[0]];
+                return read_figure(base, "harbour_frequencies", [region, harbour, direction, point.x, null]);
+            },
+
+            updape_heat_by_vessel: function(vessel, days, base) {
+                return read_figure(base, "vessel_heat", [vessel, null]);
+            },
+
+            vessel_heatmap_clicked: function(click_data, vessel, days, base) {
+                if (triggered_by(["vessel_selector.value"])) {
+                    click_data = null;
+                }
+                var point = clicked(click_data);
+                if (!point || point.z === null || point.z === undefined) {
+                    return read_empty(base, "vessel_dots");
+                }
+                return read_figure(base, "vessel_dots", [vessel, point.y, point.x, null]);
+            }
+        }
+    });
+})();
@@ -2,6 +2,7 @@
 import plotly.express as px
 import plotly.graph_objects as go
 import hover_template
+import compact
 
 from template import THEME
 
@@ -49,15 +50,17 @@ def get_region_figure(bar_data, region, year, trip_direction, harbour=""):
 
     total_counts = bar_data.Counts.sum()  #  to calculate %
     fig = go.Figure()
-    fig.add_trace(go.Bar(x=bar_data.Date, y=bar_data.Counts,
+    fig.add_trace(go.Bar(y=compact.to_integers(bar_data.Counts),
                          customdata = round(bar_data.Counts / total_counts * 100, 2)  # %
                          ))
+    compact.set_dates(fig.data[0], bar_data.Date)
 
     num_xticks = len(bar_data.Date.dt.month.unique())
     fig.update_xaxes(nticks=num_xticks)
 
     fig.update_layout(
         xaxis_tickformat='%b',
+        xaxis_type='date',
         xaxis_tickangle=0,
         yaxis_title="Number of voyages",
         xaxis_title=""
@@ -0,0 +1,445 @@
+'''
+    Benchmarks of the preprocessing, the chart builders and the callbacks.
+
+    For each size, synthetic trips and passages are generated (see
+    synthetic.py) and every step is timed several times: the loading
+    pipeline (date conversion, year filter, encoding, dataset build), the
+    preprocess functions, the chart builders, and the callbacks of the app
+    called through its HTTP endpoint, with the figure and response caches
+    emptied before each call. The latency percentiles and the peak memory
+    (traced by tracemalloc, on one more run) are written as JSON, so two
+    versions are compared with --compare.
+
+    python benchmark.py --sizes 1000000,10000000 --output bench.json
+    python benchmark.py --compare before.json after.json
+'''
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import bar_charts
+import cumulative
+import dataset
+import dot_charts
+import encoding
+import heatmap
+import line_charts
+import passage_index
+import passage_map
+import preprocess
+import synthetic
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def measure(function, repeat):
+    '''
+    Times a function, then traces the memory of one more run.
+
+    Args:
+        function: the function, without arguments
+        repeat: number of timed runs
+    Returns:
+        dict with the latency percentiles, mean, min and max in milliseconds,
+        and the peak memory allocated in megabytes.
+    '''
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    times = np.array(times)
+    result = {"p{}_ms".format(percentile): round(float(np.percentile(times, percentile)), 3)
+              for percentile in PERCENTILES}
+    result.update({
+        "mean_ms": round(float(times.mean()), 3),
+        "min_ms": round(float(times.min()), 3),
+        "max_ms": round(float(times.max()), 3),
+        "runs": repeat,
+        "peak_mb": round(peak / 2**20, 3),
+    })
+
+    return result
+
+
+def get_selection(data):
+    '''
+    Picks the values the figures are drawn for: the busiest region, its
+    busiest harbour, the most used vessel type, a year in the middle, and a
+    trip having passages.
+
+    Args:
+        data: the dataset, see dataset.py
+    Returns:
+        dict of the values.
+    '''
+
+    totals = data["catalog"]["totals"]
+    region = max(totals, key=lambda name: sum(totals[name].values()))
+    years = sorted(set(data["cube"]["year"].tolist()))
+    year = int(years[len(years) // 2])
+
+    return {
+        "region": region,
+        "harbour": max(totals[region], key=totals[region].get),
+        "vessel": data["most_used_vessel"],
+        "year": year,
+        # the days of that year, for the date range slider.
+        "days": [int(day) for day in cumulative.get_year_days([year, year + 1]) - [0, 1]],
+        "trip_id": int(data["passage_index"]["trip_ids"][0]),
+    }
+
+
+def load_steps(trips_raw, passages_raw):
+    '''
+    Args:
+        trips_raw: trips, as read from the CSV
+        passages_raw: passages, as read from the CSV
+    Returns:
+        dict of name -> function of the loading pipeline.
+    '''
+
+    trips = preprocess.filter_years(preprocess.convert_dates(trips_raw), 2011, 2021)
+    passages = preprocess.convert_dates(passages_raw)
+    dictionaries = encoding.build_dictionaries(trips, passages)
+    encoded_trips = encoding.encode(trips.copy(), dictionaries)
+    encoded_passages = encoding.encode(passages.copy(), dictionaries)
+
+    return {
+        "preprocess.convert_dates[trips]": lambda: preprocess.convert_dates(trips_raw),
+        "preprocess.convert_dates[passages]": lambda: preprocess.convert_dates(passages_raw),
+        "preprocess.filter_years": lambda: preprocess.filter_years(trips, 2011, 2021),
+        "encoding.encode": lambda: encoding.encode(trips.copy(), encoding.build_dictionaries(trips, passages)),
+        "dataset.build_dataset": lambda: dataset.build_dataset(encoded_trips, encoded_passages, "benchmark"),
+    }
+
+
+def preprocess_steps(data, selection):
+    '''
+    Args:
+        data: the dataset, see dataset.py
+        selection: the values the figures are drawn for, see get_selection
+    Returns:
+        dict of name -> function of each preprocess function.
+    '''
+
+    region, harbour, year, days = selection["region"], selection["harbour"], selection["year"], selection["days"]
+    trips, data_cube = data["trips"], data["cube"]
+    regions_harbours = preprocess.all_region_harbour(trips)
+    series = data["cumulative"]["region"]
+
+    return {
+        "preprocess.summarize_yearly_counts": lambda: preprocess.summarize_yearly_counts(data_cube, 2),
+        "preprocess.restructure_df": lambda: preprocess.restructure_df(
+            preprocess.summarize_yearly_counts(data_cube, 2)),
+        "preprocess.get_data_by_freq[daily]": lambda: preprocess.get_data_by_freq(
+            data_cube, region, year, 0, "daily"),
+        "preprocess.get_data_by_freq[monthly]": lambda: preprocess.get_data_by_freq(
+            data_cube, region, year, 0, "monthly"),
+        "preprocess.all_region_harbour": lambda: preprocess.all_region_harbour(trips),
+        "preprocess.get_depart_by_harbour": lambda: preprocess.get_depart_by_harbour(trips, region, harbour),
+        "preprocess.get_arrive_by_harbour": lambda: preprocess.get_arrive_by_harbour(trips, region, harbour),
+        "preprocess.prepare_day_month_data_by_harbour[daily]": lambda: preprocess.prepare_day_month_data_by_harbour(
+            data_cube, region, harbour, 0, year, "daily"),
+        "preprocess.prepare_day_month_data_by_harbour[monthly]":
+            lambda: preprocess.prepare_day_month_data_by_harbour(data_cube, region, harbour, 0, year, "monthly"),
+        "preprocess.prepare_data_by_harbour": lambda: preprocess.prepare_data_by_harbour(data_cube, region, harbour),
+        "preprocess.get_harbours_by_region": lambda: preprocess.get_harbours_by_region(regions_harbours, region),
+        "preprocess.get_international_trips": lambda: preprocess.get_international_trips(trips),
+        "preprocess.get_trip_duration": lambda: preprocess.get_trip_duration(trips, data["total_voyage0"]),
+        "preprocess.get_vessel_harbour": lambda: preprocess.get_vessel_harbour(
+            data_cube, selection["vessel"], region, year),
+        "passage_index.get_trip": lambda: passage_index.get_trip(data["passage_index"], selection["trip_id"]),
+        # the same data over the days of the date range slider.
+        "preprocess.get_yearly_counts_in_range": lambda: preprocess.get_yearly_counts_in_range(
+            series, [(0,), (1,)], days, "Region"),
+        "preprocess.get_data_by_freq[daily,range]": lambda: preprocess.get_data_by_freq(
+            data_cube, region, year, 0, "daily", days),
+        "preprocess.prepare_data_by_harbour[range]": lambda: preprocess.prepare_data_by_harbour(
+            data_cube, region, harbour, days),
+        "preprocess.get_vessel_harbour[range]": lambda: preprocess.get_vessel_harbour(
+            data_cube, selection["vessel"], region, year, days),
+        "cumulative.get_stats[range]": lambda: cumulative.get_stats(data["cumulative"]["trips"], days),
+    }
+
+
+def chart_steps(data, selection):
+    '''
+    Args:
+        data: the dataset, see dataset.py
+        selection: the values the figures are drawn for, see get_selection
+    Returns:
+        dict of name -> function of each chart builder, on precomputed data.
+    '''
+
+    region, harbour, year, days = selection["region"], selection["harbour"], selection["year"], selection["days"]
+    heat_data = preprocess.restructure_df(preprocess.summarize_yearly_counts(data["cube"], 2))
+    range_data = preprocess.get_yearly_counts_in_range(data["cumulative"]["region"], [(0,), (1,)], days, "Region")
+    range_total = cumulative.get_stats(data["cumulative"]["trips"], days)[0]["count"]
+    line_data = preprocess.get_data_by_freq(data["cube"], region, year, 0, "daily")
+    bar_data = preprocess.get_data_by_freq(data["cube"], region, year, 0, "monthly")
+    stack_data = preprocess.prepare_data_by_harbour(data["cube"], region, harbour)
+    dot_data = preprocess.get_vessel_harbour(data["cube"], selection["vessel"], region, year)
+    atrip = passage_index.get_trip(data["passage_index"], selection["trip_id"])
+
+    return {
+        "heatmap.get_figure": lambda: heatmap.get_figure(heat_data, 2, data["total_voyage0"]),
+        "heatmap.get_figure[range]": lambda: heatmap.get_figure(range_data, 2, range_total),
+        "line_charts.get_region_figure": lambda: line_charts.get_region_figure(line_data, region, year, 0),
+        "bar_charts.get_region_figure": lambda: bar_charts.get_region_figure(bar_data, region, year, 0),
+        "bar_charts.get_harbour_figure_year": lambda: bar_charts.get_harbour_figure_year(
+            stack_data, region, harbour),
+        "dot_charts.get_vesselport_figure": lambda: dot_charts.get_vesselport_figure(dot_data, region, year),
+        "passage_map.get_passage_map": lambda: passage_map.get_passage_map(atrip),
+    }
+
+
+def callback_request(output, inputs, changed=None, state=None):
+    '''
+    Builds the body of a request to the Dash callback endpoint.
+
+    Args:
+        output: the output, e.g. "heatmap_region.figure", or "..a.b...c.d.." for several
+        inputs: list of (component id, property, value)
+        changed: the properties triggering the callback, the first input if None
+        state: list of (component id, property, value) of the states, none if None
+    Returns:
+        The body, a dict.
+    '''
+
+    outputs = [{"id": name.split(".")[0], "property": name.split(".")[1]}
+               for name in output.strip(".").split("...")]
+
+    return {
+        "output": output,
+        "outputs": outputs if output.startswith("..") else outputs[0],
+        "inputs": [{"id": name, "property": prop, "value": value} for name, prop, value in inputs],
+        "changedPropIds": changed or ["{}.{}".format(*inputs[0][:2])],
+        "state": [{"id": name, "property": prop, "value": value} for name, prop, value in state or []],
+    }
+
+
+def callback_steps(client, selection, clear):
+    '''
+    Args:
+        client: test client of the Flask server of the app
+        selection: the values the figures are drawn for, see get_selection
+        clear: function emptying the caches of the app
+    Returns:
+        dict of name -> function calling each callback.
+    '''
+
+    region, harbour, year, days = selection["region"], selection["harbour"], selection["year"], selection["days"]
+
+    def click(x, y, customdata=None):
+        point = {"x": x, "y": y, "z": 1}
+        if customdata is not None:
+            point["customdata"] = customdata
+        return {"points": [point]}
+
+    requests = {
+        "update_page[region]": callback_request("output.children", [("feature_ops", "value", 0),
+                                                                     ("dataset-version", "data", None)]),
+        "update_date_range": callback_request(
+            "..date_range.min...date_range.max...date_range.marks...date_range.value..",
+            [("dataset-version", "data", None)], state=[("date_range", "value", None), ("date_range", "max", None)]),
+        "update_summary": callback_request(
+            "..trip_total.children...trip_international.children...trip_duration.children...vessel_king.children..",
+            [("dataset-version", "data", None), ("date_range", "value", None)]),
+        "update_summary[range]": callback_request(
+            "..trip_total.children...trip_international.children...trip_duration.children...vessel_king.children..",
+            [("dataset-version", "data", None), ("date_range", "value", days)], ["date_range.value"]),
+        "update_region_heat": callback_request("heatmap_region.figure", [
+            ("trip_direction", "value", 2), ("date_range", "value", None)]),
+        "update_region_heat[range]": callback_request("heatmap_region.figure", [
+            ("trip_direction", "value", 2), ("date_range", "value", days)], ["date_range.value"]),
+        "update_harbour_heat": callback_request("heatmap_harbour.figure", [
+            ("heatmap_region", "clickData", click(year, region)), ("trip_direction", "value", 0),
+            ("date_range", "value", None)]),
+        "region_heatmap_clicked": callback_request("region-figures.data", [
+            ("heatmap_region", "clickData", click(year, region)), ("trip_direction", "value", 0),
+            ("date_range", "value", None)]),
+        "set_harbour_options": callback_request("harbour_selector.options", [("region_selector", "value", region)]),
+        "add_stack_bar": callback_request("bar_harbour_year.figure", [
+            ("region_selector", "value", region), ("harbour_selector", "value", harbour),
+            ("date_range", "value", None)], ["harbour_selector.value"]),
+        "region_stack_bar_clicked": callback_request("harbour-figures.data", [
+            ("bar_harbour_year", "clickData", click(year, 1, ["Departure", 1.0])),
+            ("region_selector", "value", region), ("harbour_selector", "value", harbour),
+            ("date_range", "value", None)]),
+        "updape_heat_by_vessel": callback_request("heatmap_vessel.figure", [
+            ("vessel_selector", "value", selection["vessel"]), ("date_range", "value", None)]),
+        "vessel_heatmap_clicked": callback_request("dot_vessel.figure", [
+            ("heatmap_vessel", "clickData", click(year, region)), ("vessel_selector", "value", selection["vessel"]),
+            ("date_range", "value", None)]),
+        "update_flows[region]": callback_request("sankey_flows.figure", [
+            ("flow_level", "value", "region"), ("flow_vessel", "value", None), ("flow_region", "value", None),
+            ("flow_years", "value", [year, year])]),
+        "update_flows[harbour]": callback_request("sankey_flows.figure", [
+            ("flow_level", "value", "harbour"), ("flow_vessel", "value", selection["vessel"]),
+            ("flow_region", "value", region), ("flow_years", "value", [year, year])]),
+        "retrieve_passage": callback_request("..trip_passage.figure...trip_input.pattern...trip_message.children..", [
+            ("trip_input", "value", str(selection["trip_id"])), ("voyage_harbour", "value", None),
+            ("voyage_dates", "start_date", None), ("voyage_dates", "end_date", None)]),
+        "retrieve_passage[harbour]": callback_request(
+            "..trip_passage.figure...trip_input.pattern...trip_message.children..", [
+                ("trip_input", "value", ""), ("voyage_harbour", "value", harbour),
+                ("voyage_dates", "start_date", "{}-01-01".format(year)), ("voyage_dates", "end_date", "{}-12-31".format(year))],
+            ["voyage_harbour.value"]),
+    }
+
+    def call(body):
+        clear()
+        response = client.post("/_dash-update-component", json=body)
+        if response.status_code != 200:
+            raise RuntimeError("{} returned {}".format(body["output"], response.status_code))
+        return response.data
+
+    return {"callback." + name: (lambda body=body: call(body)) for name, body in requests.items()}
+
+
+def start_app():
+    '''
+    Imports the app, fed with a small generated dataset so its loader does
+    not read the real sources, and waits until it is ready.
+
+    Returns:
+        The app module.
+    '''
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    trips_path, detail_path = synthetic.write_csv(work_dir, 1000)
+    os.environ.update({"TRIPS_SOURCE": trips_path, "DETAIL_SOURCE": detail_path,
+                       "SNAPSHOT_DIR": os.path.join(work_dir, "snapshot"),
+                       "DELTA_DIR": os.path.join(work_dir, "deltas"), "APPEND_TOKEN": ""})
+
+    import app  # pylint: disable=import-outside-toplevel
+
+    while not app.loader.is_ready():
+        if app.loader.get_status()["status"] == "failed":
+            raise RuntimeError("the app failed to load its data")
+        time.sleep(0.05)
+
+    return app
+
+
+def run(sizes, repeat=10, seed=0, callbacks=True):
+    '''
+    Runs every benchmark at every size.
+
+    Args:
+        sizes: numbers of trips
+        repeat: number of timed runs of each step
+        seed: seed of the synthetic data
+        callbacks: also benchmark the callbacks of the app
+    Returns:
+        The results: the environment, and for each size the rows generated
+        and the measures of every step.
+    '''
+
+    app = start_app() if callbacks else None
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "repeat": repeat,
+        "sizes": {},
+    }
+
+    for size in sizes:
+        trips_raw, passages_raw = synthetic.generate_frames(size, seed)
+        steps = load_steps(trips_raw, passages_raw)
+        data = steps["dataset.build_dataset"]()
+        selection = get_selection(data)
+        steps.update(preprocess_steps(data, selection))
+        steps.update(chart_steps(data, selection))
+
+        if app is not None:
+            data["version"] = "benchmark-{}-{}".format(size, seed)
+            app.loader.set_dataset(data)
+
+            def clear():
+                app.figure_cache.clear()
+                app.response_cache.clear()
+            steps.update(callback_steps(app.server.test_client(), selection, clear))
+
+        measures = {}
+        for name, function in steps.items():
+            measures[name] = measure(function, repeat)
+            print("{:>12,} {:<58} p50 {:>10.2f} ms  peak {:>9.2f} MB".format(
+                size, name, measures[name]["p50_ms"], measures[name]["peak_mb"]), file=sys.stderr)
+
+        results["sizes"][str(size)] = {"trips": int(trips_raw.shape[0]), "passages": int(passages_raw.shape[0]),
+                                       "selection": selection, "steps": measures}
+
+    return results
+
+
+def compare(before, after, metric="p50_ms"):
+    '''
+    Compares two benchmark results.
+
+    Args:
+        before: results of the reference version, see run
+        after: results of the new version
+        metric: the measure compared
+    Returns:
+        dataframe of the measure before and after, and their ratio, for
+        every step and size found in both.
+    '''
+
+    rows = []
+    for size, measures in after["sizes"].items():
+        reference = before["sizes"].get(size, {}).get("steps", {})
+        for name, measure_after in measures["steps"].items():
+            if name in reference:
+                value_before = reference[name][metric]
+                rows.append((int(size), name, value_before, measure_after[metric],
+                             round(measure_after[metric] / value_before, 3) if value_before else None))
+
+    return pd.DataFrame(rows, columns=["Size", "Step", "Before", "After", "Ratio"])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing, the charts and the callbacks.")
+    parser.add_argument("--sizes", default="100000,1000000", help="numbers of trips, comma separated")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-callbacks", action="store_true", help="skip the callbacks of the app")
+    parser.add_argument("--output", help="JSON file of the results, printed if not given")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two JSON results")
+    parser.add_argument("--metric", default="p50_ms", help="measure compared, e.g. p90_ms or peak_mb")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before_file, open(args.compare[1]) as after_file:
+            print(compare(json.load(before_file), json.load(after_file), args.metric).to_string(index=False))
+        sys.exit(0)
+
+    results = run([int(size) for size in args.sizes.split(",")], args.repeat, args.seed, not args.no_callbacks)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1)
+    else:
+        print(json.dumps(results, indent=1))
@@ -0,0 +1,107 @@
+'''
+    Catalog of the regions, harbours and vessel types.
+
+    Built once per dataset from the count cube: the sorted harbours of each
+    region, the number of voyages of each harbour, and the dropdown options
+    ready to be sent, so the dropdowns are filled without dataframe work.
+    The catalog of new trips is merged into the previous one, see merge_catalogs.
+'''
+
+import cube
+
+
+def get_options(names):
+    '''
+    Args:
+        names: list of names
+    Returns:
+        The options of a dropdown listing the names.
+    '''
+
+    return [{'label': x, 'value': x} for x in names]
+
+
+def build_catalog(data_cube):
+    '''
+    Lists the harbours of each region, with their number of voyages.
+
+    Args:
+        data_cube: the count cube, see cube.py
+    Returns:
+        The catalog, a dict.
+    '''
+
+    rows = cube.select(data_cube, [cube.DEPARTURE, cube.ARRIVAL])
+    counts = cube.aggregate(data_cube, rows, ["region", "harbour"])
+
+    harbours = {}
+    totals = {}
+    for (region, harbour), total in counts.items():
+        if region < 0 or harbour < 0:
+            continue
+        region_name = data_cube["regions"][region]
+        harbour_name = data_cube["harbours"][harbour]
+        # the cube is sorted by code, the dictionaries by name: harbours come sorted.
+        harbours.setdefault(region_name, []).append(harbour_name)
+        totals.setdefault(region_name, {})[harbour_name] = int(total)
+
+    vessels = cube.aggregate(data_cube, rows, ["vessel"]).index
+    vessels = [data_cube["vessels"][vessel] for vessel in vessels if vessel >= 0]
+
+    return _make_catalog(harbours, totals, vessels)
+
+
+def _make_catalog(harbours, totals, vessels):
+    '''
+    Args:
+        harbours: region -> sorted names of its harbours
+        totals: region -> harbour -> number of voyages
+        vessels: sorted vessel types
+    Returns:
+        The catalog, see build_catalog.
+    '''
+
+    return {
+        "harbours": harbours,
+        "totals": totals,
+        "region_options": get_options(sorted(harbours)),
+        "harbour_options": {region: get_options(names) for region, names in harbours.items()},
+        "all_harbour_options": get_options(sorted({name for names in harbours.values() for name in names})),
+        "vessel_options": get_options(vessels),
+    }
+
+
+def merge_catalogs(catalog, other):
+    '''
+    Adds the harbours and the voyages of a catalog to another one, e.g. the
+    catalog of newly received trips to the catalog of the loaded ones.
+
+    Args:
+        catalog: a catalog
+        other: another catalog
+    Returns:
+        The merged catalog.
+    '''
+
+    totals = {region: dict(counts) for region, counts in catalog["totals"].items()}
+    for region, counts in other["totals"].items():
+        for harbour, total in counts.items():
+            region_totals = totals.setdefault(region, {})
+            region_totals[harbour] = region_totals.get(harbour, 0) + total
+
+    harbours = {region: sorted(counts) for region, counts in totals.items()}
+    vessels = sorted({option["value"] for option in catalog["vessel_options"] + other["vessel_options"]})
+
+    return _make_catalog(harbours, totals, vessels)
+
+
+def get_harbour_options(catalog, region):
+    '''
+    Args:
+        catalog: the catalog
+        region: name of a region
+    Returns:
+        The options of the harbour dropdown for the region.
+    '''
+
+    return catalog["harbour_options"].get(region, [])
@@ -0,0 +1,126 @@
+'''
+    Compact arrays in the figures sent to the browser.
+
+    The chart builders send their arrays in the fewest bytes the browser
+    can still read:
+      - evenly spaced dates as a start and a step (x0 and dx) instead of
+        one date string per point,
+      - counts as integers, and the values only drawn (e.g. the logarithm
+        coloring a heatmap) rounded to what the eye can tell apart,
+      - in the figures packed for the clientside callbacks (see
+        figures.pack_frequencies), the integer arrays as base64 typed
+        arrays, decoded in the browser (see assets/clientside.js).
+
+    The typed arrays are written like the ones of later plotly.js versions,
+    {"dtype": "u2", "bdata": "..."}, but the plotly.js of this Dash does
+    not read them: only the figures going through a clientside callback
+    can carry them.
+'''
+
+import base64
+
+import numpy as np
+
+
+MS_PER_DAY = 86400 * 1000
+
+# decimals of the values only used for the colors.
+COLOR_DECIMALS = 3
+
+# shortest array worth encoding, the smaller ones stay JSON lists.
+MIN_TYPED_LENGTH = 16
+
+# integer dtypes, from the smallest, with their name in the typed arrays.
+INTEGER_TYPES = ((np.uint8, "u1"), (np.int8, "i1"), (np.uint16, "u2"), (np.int16, "i2"),
+                 (np.uint32, "u4"), (np.int32, "i4"))
+
+
+def to_integers(values):
+    '''
+    Args:
+        values: numbers, e.g. counts held as floats
+    Returns:
+        numpy array of int64 if every value is a whole number, the values as
+        a float array otherwise.
+    '''
+
+    values = np.asarray(values, dtype=np.float64)
+    if np.isfinite(values).all() and (values == np.round(values)).all():
+        return values.astype(np.int64)
+
+    return values
+
+
+def round_colors(values, decimals=COLOR_DECIMALS):
+    '''
+    Args:
+        values: numbers only used for the colors, e.g. the z of a heatmap
+        decimals: decimals kept
+    Returns:
+        The rounded values, the infinite ones stay infinite (sent as null).
+    '''
+
+    return np.round(np.asarray(values, dtype=np.float64), decimals)
+
+
+def set_dates(trace, dates):
+    '''
+    Sets the dates of a trace, as a start and a step if they are evenly
+    spaced by a whole number of days (e.g. the daily counts).
+
+    Args:
+        trace: a plotly trace with an x axis of dates
+        dates: the dates, a datetime Series or array
+    '''
+
+    days = np.asarray(dates, dtype="M8[ns]").astype("M8[D]")
+    steps = np.diff(days.astype(np.int64))
+    if days.shape[0] == 0 or (steps.shape[0] > 0 and (steps != steps[0]).any()) or \
+            (np.asarray(dates, dtype="M8[ns]") != days).any():
+        trace.update(x=dates)
+        return
+
+    step = int(steps[0]) if steps.shape[0] > 0 else 1
+    trace.update(x0=str(days[0]), dx=step * MS_PER_DAY)
+
+
+def encode_array(values):
+    '''
+    Args:
+        values: integers
+    Returns:
+        The typed array, {"dtype", "bdata"}: the values in the smallest
+        integer type holding them, little-endian, in base64.
+    '''
+
+    values = np.asarray(values)
+    low, high = (values.min(), values.max()) if values.shape[0] else (0, 0)
+    for dtype, name in INTEGER_TYPES:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            break
+    else:
+        dtype, name = np.float64, "f8"
+    data = values.astype(np.dtype(dtype).newbyteorder("<")).tobytes()
+
+    return {"dtype": name, "bdata": base64.b64encode(data).decode("ascii")}
+
+
+def encode_traces(figure):
+    '''
+    Encodes the integer arrays of the traces of a figure as typed arrays.
+
+    Args:
+        figure: the figure as a dict, see go.Figure.to_plotly_json
+    Returns:
+        The figure, its traces updated in place.
+    '''
+
+    for trace in figure.get("data", []):
+        for name, values in trace.items():
+            if not isinstance(values, (list, tuple, np.ndarray)) or len(values) < MIN_TYPED_LENGTH:
+                continue
+            values = np.asarray(values)
+            if values.ndim == 1 and values.dtype.kind in "iu":
+                trace[name] = encode_array(values)
+
+    return figure
@@ -0,0 +1,297 @@
+'''
+    Precomputed voyage counts: the count cube.
+
+    The trips are counted once, at load, by direction, region, harbour,
+    vessel type and day. A departure is counted on its departure day in its
+    departure region and harbour, an arrival on its arrival day in its
+    arrival region and harbour. Only the non-empty cells are kept, sorted by
+    (direction, region, harbour, vessel type, day), so the cells of a
+    direction, a region or a harbour are contiguous and found by binary
+    search. Each cell also knows its month and year, to roll the days up.
+
+    The counts are sums, so the cube of new trips is merged into the cube
+    of the previous ones cell by cell (see merge_cubes), without counting
+    the previous trips again.
+'''
+
+import numpy as np
+import pandas as pd
+
+import encoding
+import metrics
+
+
+DEPARTURE = 0
+ARRIVAL = 1
+BOTH = 2
+
+NS_PER_DAY = 86400 * 10**9
+
+# direction -> columns of the trips it is counted on.
+DIRECTION_COLUMNS = {
+    DEPARTURE: ("Departure Date", "Departure Region", "Departure Hardour"),
+    ARRIVAL: ("Arrival Date", "Arrival Region", "Arrival Hardour"),
+}
+
+
+def get_directions(trip_direction):
+    '''
+    Args:
+        trip_direction: departure, arrival or both (0,1,2)
+    Returns:
+        The list of directions counted.
+    '''
+
+    return [DEPARTURE, ARRIVAL] if trip_direction == BOTH else [trip_direction]
+
+
+def to_days(dates):
+    '''
+    Converts dates to days since epoch (UTC).
+
+    Args:
+        dates: a datetime Series
+    Returns:
+        numpy int64 array of days.
+    '''
+
+    return dates.values.view("int64") // NS_PER_DAY
+
+
+def _make_cube(keys, counts, dims, first_day, regions, harbours, vessels):
+    '''
+    Unpacks the keys of the non-empty cells.
+
+    Args:
+        keys: sorted keys of the cells, packed over dims
+        counts: number of voyages of each cell
+        dims: sizes of (direction, region, harbour, vessel, day), codes shifted by one
+        first_day: day (since epoch) of the first day of the cube
+        regions: names of the regions, by code
+        harbours: names of the harbours, by code
+        vessels: names of the vessel types, by code
+    Returns:
+        The cube, see build_cube.
+    '''
+
+    direction, region, harbour, vessel, day = np.unravel_index(keys, dims)
+    dates = (day + first_day).astype("M8[D]")
+
+    return {
+        "keys": keys,
+        "strides": [int(np.prod(dims[position + 1:])) for position in range(len(dims))],
+        "direction": direction.astype(np.int8),
+        "region": region.astype(np.int32) - 1,
+        "harbour": harbour.astype(np.int32) - 1,
+        "vessel": vessel.astype(np.int32) - 1,
+        "day": dates,
+        "month": dates.astype("M8[M]"),
+        "year": dates.astype("M8[Y]").astype(np.int64) + 1970,
+        "counts": counts,
+        "regions": regions,
+        "harbours": harbours,
+        "vessels": vessels,
+        "codes": {
+            "region": {name: code for code, name in enumerate(regions)},
+            "harbour": {name: code for code, name in enumerate(harbours)},
+            "vessel": {name: code for code, name in enumerate(vessels)},
+        },
+    }
+
+
+def build_cube(trips_df):
+    '''
+    Counts the voyages by direction, region, harbour, vessel type and day.
+
+    Args:
+        trips_df: the trips, dates converted and names encoded
+    Returns:
+        The cube, a dict of numpy arrays with one value per non-empty cell,
+        and the names of the regions, harbours and vessel types.
+    '''
+
+    regions = list(trips_df["Departure Region"].cat.categories)
+    harbours = list(trips_df["Departure Hardour"].cat.categories)
+    vessels = list(trips_df["Vessel Type"].cat.categories)
+    vessel_codes = trips_df["Vessel Type"].cat.codes.to_numpy().astype(np.int64)
+
+    days = {direction: to_days(trips_df[columns[0]]) for direction, columns in DIRECTION_COLUMNS.items()}
+    first_day = min([day.min() for day in days.values() if day.shape[0]], default=0)
+    last_day = max([day.max() for day in days.values() if day.shape[0]], default=0)
+
+    # codes are shifted by one, so missing names (-1) get their own cells.
+    dims = (len(DIRECTION_COLUMNS), len(regions) + 1, len(harbours) + 1, len(vessels) + 1,
+            int(last_day - first_day) + 1)
+    keys = [np.ravel_multi_index((np.full(days[direction].shape[0], direction),
+                                  trips_df[region_column].cat.codes.to_numpy().astype(np.int64) + 1,
+                                  trips_df[harbour_column].cat.codes.to_numpy().astype(np.int64) + 1,
+                                  vessel_codes + 1,
+                                  days[direction] - first_day), dims)
+            for direction, (_, region_column, harbour_column) in DIRECTION_COLUMNS.items()]
+    keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+
+    return _make_cube(keys, counts, dims, first_day, regions, harbours, vessels)
+
+
+def merge_cubes(cube, other):
+    '''
+    Adds the counts of two cubes, e.g. the cube of the loaded trips and
+    the cube of newly received trips. Only the cells are merged, the trips
+    are not counted again. The names may differ: the merged cube uses
+    their sorted union.
+
+    Args:
+        cube: a count cube
+        other: another count cube
+    Returns:
+        The merged cube.
+    '''
+
+    names = {kind: sorted(set(cube[kind]) | set(other[kind])) for kind in ("regions", "harbours", "vessels")}
+    cubes = [part for part in (cube, other) if part["keys"].shape[0]]
+    days = [part["day"].astype(np.int64) for part in cubes]
+    first_day = min([day.min() for day in days], default=0)
+    last_day = max([day.max() for day in days], default=0)
+
+    dims = (len(DIRECTION_COLUMNS), len(names["regions"]) + 1, len(names["harbours"]) + 1,
+            len(names["vessels"]) + 1, int(last_day - first_day) + 1)
+    keys = []
+    for part, day in zip(cubes, days):
+        # codes of the part -> codes of the union, -1 (missing) is kept.
+        codes = [encoding.get_remap(part[kind], names[kind])[part[column]] + 1
+                 for kind, column in (("regions", "region"), ("harbours", "harbour"), ("vessels", "vessel"))]
+        keys.append(np.ravel_multi_index([part["direction"].astype(np.int64)] + codes + [day - first_day], dims))
+
+    keys, cells = np.unique(np.concatenate(keys) if keys else np.empty(0, dtype=np.int64), return_inverse=True)
+    counts = np.bincount(cells, weights=np.concatenate([part["counts"] for part in cubes] or [[]]),
+                         minlength=keys.shape[0]).astype(np.int64)
+
+    return _make_cube(keys, counts, dims, first_day, names["regions"], names["harbours"], names["vessels"])
+
+
+def select(cube, directions, region=None, harbour=None, vessel=None, year=None, days=None):
+    '''
+    Finds the cells matching the given values.
+
+    The direction, region and harbour are found by binary search on the
+    sorted cells, the vessel type, the year and the days filter the cells
+    found.
+
+    Args:
+        cube: the count cube
+        directions: list of directions
+        region: name of a region, all regions if None
+        harbour: name of a harbour of the region, all harbours if None
+        vessel: a vessel type, all types if None
+        year: a year, all years if None
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        numpy array with the positions of the cells.
+    '''
+
+    prefix = []
+    for kind, name in (("region", region), ("harbour", harbour)):
+        if name is None:
+            break
+        code = cube["codes"][kind].get(name)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        prefix.append(code + 1)
+
+    strides = cube["strides"]
+    rows = []
+    for direction in directions:
+        codes = [direction] + prefix
+        low = sum(code * stride for code, stride in zip(codes, strides))
+        start, stop = np.searchsorted(cube["keys"], [low, low + strides[len(codes) - 1]])
+        rows.append(np.arange(start, stop))
+    rows = np.concatenate(rows)
+
+    if vessel is not None:
+        code = cube["codes"]["vessel"].get(vessel, -2)
+        rows = rows[cube["vessel"][rows] == code]
+    if year is not None:
+        rows = rows[cube["year"][rows] == year]
+    if days is not None:
+        day = cube["day"][rows].astype(np.int64)
+        rows = rows[(day >= days[0]) & (day <= days[1])]
+
+    return rows
+
+
+def aggregate(cube, rows, by):
+    '''
+    Sums the counts of some cells by some of their values.
+
+    Args:
+        cube: the count cube
+        rows: positions of the cells, see select
+        by: list of values to group by, among "direction", "region",
+            "harbour", "vessel", "day", "month" and "year"
+    Returns:
+        Series of the counts, indexed by the values (sorted).
+    '''
+
+    metrics.add_rows(len(rows))
+    cells = pd.DataFrame({value: cube[value][rows] for value in by})
+    cells["Counts"] = cube["counts"][rows]
+
+    return cells.groupby(by, sort=True)["Counts"].sum()
+
+
+def build_harbour_years(cube):
+    '''
+    Counts the voyages of each harbour by year, the drill-down heatmap of
+    a region is drawn from them without looking at the cells again.
+
+    Args:
+        cube: the count cube
+    Returns:
+        dict with the "years" counted (sorted) and, for each region, its
+        "harbours" (sorted) and their "counts": array of shape (direction,
+        harbour, year).
+    '''
+
+    rows = select(cube, [DEPARTURE, ARRIVAL])
+    region, harbour, year = cube["region"][rows], cube["harbour"][rows], cube["year"][rows]
+    known = (region >= 0) & (harbour >= 0)
+    rows, region, harbour, year = rows[known], region[known], harbour[known], year[known]
+
+    years, year_positions = np.unique(year, return_inverse=True)
+    regions = {}
+    for code in np.unique(region):
+        in_region = region == code
+        harbour_codes, harbour_positions = np.unique(harbour[in_region], return_inverse=True)
+        counts = np.zeros((len(DIRECTION_COLUMNS), harbour_codes.shape[0], years.shape[0]), dtype=np.int64)
+        np.add.at(counts, (cube["direction"][rows[in_region]], harbour_positions, year_positions[in_region]),
+                  cube["counts"][rows[in_region]])
+        # the codes follow the sorted names, the harbours come sorted.
+        regions[cube["regions"][code]] = {"harbours": [cube["harbours"][harbour] for harbour in harbour_codes],
+                                          "counts": counts}
+
+    return {"years": years, "regions": regions}
+
+
+def merge_harbour_years(harbour_years, other):
+    '''
+    Adds the yearly counts of the harbours of two cubes, see build_harbour_years.
+
+    Args:
+        harbour_years: the yearly counts of the harbours of a cube
+        other: the yearly counts of the harbours of another cube
+    Returns:
+        The merged counts.
+    '''
+
+    years = np.union1d(harbour_years["years"], other["years"]).astype(np.int64)
+    regions = {}
+    for name in sorted(set(harbour_years["regions"]) | set(other["regions"])):
+        parts = [(part["regions"][name], part["years"]) for part in (harbour_years, other) if name in part["regions"]]
+        harbours = sorted(set().union(*[part["harbours"] for part, _ in parts]))
+        counts = np.zeros((len(DIRECTION_COLUMNS), len(harbours), years.shape[0]), dtype=np.int64)
+        for part, part_years in parts:
+            rows = encoding.get_remap(part["harbours"], harbours)[:len(part["harbours"])]
+            counts[:, rows[:, None], np.searchsorted(years, part_years)[None, :]] += part["counts"]
+        regions[name] = {"harbours": harbours, "counts": counts}
+
+    return {"years": years, "regions": regions}
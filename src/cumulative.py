@@ -0,0 +1,373 @@
+'''
+    Per-day cumulative counts: the voyages of any date range in constant time.
+
+    The voyages of each series of the count cube (a direction in a region,
+    in a harbour, or with a vessel type in a region) are summed day by day
+    into a cumulative array: one value per day of the data, plus a leading
+    zero. The voyages of a series between two days are the difference of
+    two of its values, whatever the number of trips, so a heatmap of any
+    date range reads two values per cell (see sum_by_year).
+
+    The trips are summed the same way by departure day for the summary
+    panel: their number, international voyages, duration and vessel types
+    (see get_stats).
+
+    The series are named, not coded, so the cumulative counts of new trips
+    are added to the loaded ones (see merge) without counting them again.
+'''
+
+import numpy as np
+
+import summary_stats
+
+
+NS_PER_DAY = 86400 * 10**9
+
+# name -> values of the cells identifying a series, the last one varies within a group.
+SERIES = {
+    "region": ("direction", "region"),
+    "harbour": ("direction", "region", "harbour"),
+    "vessel": ("direction", "vessel", "region"),
+}
+
+# value of a cell -> names of its codes in the cube.
+NAMES = {"region": "regions", "harbour": "harbours", "vessel": "vessels"}
+
+
+def _get_dtype(total):
+    '''
+    Returns:
+        The smallest integer type holding the sums, int32 or int64.
+    '''
+
+    return np.int32 if total <= np.iinfo(np.int32).max else np.int64
+
+
+def _accumulate(series, days, weights, count, size, dtype):
+    '''
+    Sums values by series and day, then cumulates them day by day.
+
+    Args:
+        series: series of each value, 0 to count - 1
+        days: day of each value from the first day, 0 to size - 1
+        weights: the values, 1 each if None
+        count: number of series
+        size: number of days
+        dtype: type of the sums
+    Returns:
+        array (count, size + 1): the sum of the values of each series before each day.
+    '''
+
+    sums = np.bincount(series * (size + 1) + days + 1, weights=weights, minlength=count * (size + 1))
+
+    return np.cumsum(sums.reshape(count, size + 1), axis=1).astype(dtype)
+
+
+def _shift(cumulative, offset, size):
+    '''
+    Args:
+        cumulative: cumulative sums, the last axis by day
+        offset: days between the first day of the sums and the first day of the result
+        size: number of days of the result
+    Returns:
+        The sums over the days of the result, the last sum is carried after their last day.
+    '''
+
+    days = cumulative.shape[-1] - 1
+    shifted = np.zeros(cumulative.shape[:-1] + (size + 1,), dtype=cumulative.dtype)
+    shifted[..., offset + 1:offset + days + 1] = cumulative[..., 1:]
+    shifted[..., offset + days + 1:] = cumulative[..., -1:]
+
+    return shifted
+
+
+def _get_groups(keys):
+    '''
+    Returns:
+        dict of the keys without their last value -> positions of the series
+        of the group, sorted by their last value.
+    '''
+
+    groups = {}
+    for position, key in enumerate(keys):
+        groups.setdefault(key[:-1], []).append(position)
+
+    return groups
+
+
+def build_series(cube, by):
+    '''
+    Builds the cumulative counts of the series of the cube.
+
+    Args:
+        cube: the count cube
+        by: values of the cells identifying a series, see SERIES
+    Returns:
+        dict with the "first_day" (since epoch) and the number of "days",
+        the "keys" of the series (direction and names), sorted, their
+        "groups" (see _get_groups) and the "cumulative" counts, array
+        (series, days + 1). The cells of unknown names are left out.
+    '''
+
+    known = np.ones(cube["keys"].shape[0], dtype=bool)
+    for value in by[1:]:
+        known &= cube[value] >= 0
+    rows = np.flatnonzero(known)
+
+    day = cube["day"].astype(np.int64)
+    first_day = int(day.min()) if day.shape[0] else 0
+    size = int(day.max()) - first_day + 1 if day.shape[0] else 0
+
+    codes, series = np.unique(np.stack([cube[value][rows].astype(np.int64) for value in by], axis=1),
+                              axis=0, return_inverse=True)
+    keys = [(int(code[0]),) + tuple(cube[NAMES[value]][code[position]] for position, value in enumerate(by[1:], 1))
+            for code in codes]
+    cumulative = _accumulate(series.reshape(-1), day[rows] - first_day, cube["counts"][rows], len(keys), size,
+                             _get_dtype(int(cube["counts"][rows].sum())))
+
+    return {"first_day": first_day, "days": size, "keys": keys, "groups": _get_groups(keys),
+            "cumulative": cumulative}
+
+
+def build_trips(columns):
+    '''
+    Builds the cumulative statistics of the trips by departure day.
+
+    Args:
+        columns: the columns of the trips, see summary_stats.get_columns
+    Returns:
+        dict with the "first_day" and the number of "days", and the
+        cumulative "count", "international" voyages, "duration_hours"
+        (arrays of days + 1) and "vessels" (array (vessel type, days + 1))
+        with the names of the "vessel_types". See summary_stats.compute_stats.
+    '''
+
+    day = columns["departure"] // NS_PER_DAY
+    first_day = int(day.min()) if day.shape[0] else 0
+    size = int(day.max()) - first_day + 1 if day.shape[0] else 0
+    day = day - first_day
+    single = np.zeros(day.shape[0], dtype=np.int64)
+    dtype = _get_dtype(2 * day.shape[0])
+
+    known = columns["vessel"] >= 0
+    duration = summary_stats.get_duration_hours(columns["departure"], columns["arrival"])
+    international = summary_stats.count_international(columns, columns["departure_region"],
+                                                      columns["arrival_region"])
+
+    return {
+        "first_day": first_day,
+        "days": size,
+        "count": _accumulate(single, day, None, 1, size, dtype)[0],
+        "international": _accumulate(single, day, international, 1, size, dtype)[0],
+        "duration_hours": _accumulate(single, day, duration, 1, size, np.float64)[0],
+        "vessels": _accumulate(columns["vessel"][known].astype(np.int64), day[known], None,
+                               len(columns["vessels"]), size, dtype),
+        "vessel_types": list(columns["vessels"]),
+    }
+
+
+def build(cube, columns):
+    '''
+    Args:
+        cube: the count cube
+        columns: the columns of the trips, see summary_stats.get_columns
+    Returns:
+        dict of the cumulative counts of each kind of series (see SERIES)
+        and of the "trips".
+    '''
+
+    tables = {name: build_series(cube, by) for name, by in SERIES.items()}
+    tables["trips"] = build_trips(columns)
+
+    return tables
+
+
+def _get_span(parts):
+    '''
+    Returns:
+        The first day and the number of days covering every part having days.
+    '''
+
+    parts = [part for part in parts if part["days"]]
+    if not parts:
+        return 0, 0
+    first_day = min(part["first_day"] for part in parts)
+
+    return first_day, max(part["first_day"] + part["days"] for part in parts) - first_day
+
+
+def merge_series(series, other):
+    '''
+    Adds the cumulative counts of the series of two cubes, see build_series.
+
+    Args:
+        series: the cumulative counts of the series of a cube
+        other: the cumulative counts of the series of another cube
+    Returns:
+        The merged cumulative counts.
+    '''
+
+    first_day, size = _get_span([series, other])
+    keys = sorted(set(series["keys"]) | set(other["keys"]))
+    positions = {key: position for position, key in enumerate(keys)}
+    total = sum(int(part["cumulative"][:, -1].sum()) for part in (series, other) if part["days"])
+
+    cumulative = np.zeros((len(keys), size + 1), dtype=_get_dtype(total))
+    for part in (series, other):
+        if part["days"]:
+            rows = [positions[key] for key in part["keys"]]
+            cumulative[rows] += _shift(part["cumulative"], part["first_day"] - first_day, size)
+
+    return {"first_day": first_day, "days": size, "keys": keys, "groups": _get_groups(keys),
+            "cumulative": cumulative}
+
+
+def merge_trips(trips, other):
+    '''
+    Adds the cumulative statistics of two sets of trips, see build_trips.
+
+    Args:
+        trips: the cumulative statistics of some trips
+        other: the cumulative statistics of other trips
+    Returns:
+        The merged cumulative statistics.
+    '''
+
+    first_day, size = _get_span([trips, other])
+    names = sorted(set(trips["vessel_types"]) | set(other["vessel_types"]))
+    total = trips["count"][-1] + other["count"][-1]
+    dtype = _get_dtype(2 * int(total))
+
+    merged = {"first_day": first_day, "days": size, "vessel_types": names,
+              "count": np.zeros(size + 1, dtype=dtype), "international": np.zeros(size + 1, dtype=dtype),
+              "duration_hours": np.zeros(size + 1), "vessels": np.zeros((len(names), size + 1), dtype=dtype)}
+    for part in (trips, other):
+        if not part["days"]:
+            continue
+        offset = part["first_day"] - first_day
+        for name in ("count", "international", "duration_hours"):
+            merged[name] += _shift(part[name], offset, size)
+        rows = [names.index(name) for name in part["vessel_types"]]
+        merged["vessels"][rows] += _shift(part["vessels"], offset, size)
+
+    return merged
+
+
+def merge(tables, other):
+    '''
+    Adds the cumulative counts of two sets of trips, see build.
+
+    Args:
+        tables: the cumulative counts of the loaded trips
+        other: the cumulative counts of new trips
+    Returns:
+        The merged cumulative counts.
+    '''
+
+    merged = {name: merge_series(tables[name], other[name]) for name in SERIES}
+    merged["trips"] = merge_trips(tables["trips"], other["trips"])
+
+    return merged
+
+
+def get_days(tables, value):
+    '''
+    Reads the days selected by the date range slider.
+
+    Args:
+        tables: the cumulative counts, see build
+        value: [first, last] days since epoch (inclusive), None for all the days
+    Returns:
+        (first, last) days within the data, None if they cover all of it.
+    '''
+
+    first_day, size = _get_span([tables["region"], tables["trips"]])
+    if not value or size == 0:
+        return None
+
+    first, last = max(int(min(value)), first_day), min(int(max(value)), first_day + size - 1)
+    if first <= first_day and last >= first_day + size - 1:
+        return None
+
+    return first, last
+
+
+def _get_positions(table, first, last):
+    '''
+    Returns:
+        The positions of the cumulative sums before the first day and after
+        the last day, within the days of the table.
+    '''
+
+    low = np.clip(np.asarray(first) - table["first_day"], 0, table["days"])
+    high = np.clip(np.asarray(last) - table["first_day"] + 1, 0, table["days"])
+
+    return low, np.maximum(high, low)
+
+
+def get_year_days(years):
+    '''
+    Args:
+        years: numpy array of years
+    Returns:
+        The first day (since epoch) of each year.
+    '''
+
+    return (np.asarray(years) - 1970).astype("M8[Y]").astype("M8[D]").astype(np.int64)
+
+
+def sum_by_year(table, prefixes, days):
+    '''
+    Counts the voyages of groups of series in each year of a date range,
+    reading two cumulative sums per series and year.
+
+    Args:
+        table: the cumulative counts of a kind of series, see build_series
+        prefixes: keys of the groups, without their last value, e.g.
+            [(0,), (1,)] for the departures and arrivals of each region;
+            the series with the same last value are added
+        days: (first, last) days since epoch, inclusive
+    Returns:
+        The names of the series (their last value, sorted), the years of
+        the range, and the counts, array (name, year).
+    '''
+
+    first, last = int(days[0]), int(days[1])
+    years = np.arange(np.datetime64(first, "D").astype("M8[Y]").astype(np.int64) + 1970,
+                      np.datetime64(last, "D").astype("M8[Y]").astype(np.int64) + 1971)
+    low, high = _get_positions(table, np.maximum(get_year_days(years), first),
+                               np.minimum(get_year_days(years + 1) - 1, last))
+
+    positions = [table["groups"].get(tuple(prefix), []) for prefix in prefixes]
+    names = sorted({table["keys"][position][-1] for group in positions for position in group})
+    rows = {name: row for row, name in enumerate(names)}
+    counts = np.zeros((len(names), years.shape[0]), dtype=np.int64)
+    for group in positions:
+        cumulative = table["cumulative"][group]
+        counts[[rows[table["keys"][position][-1]] for position in group]] += \
+            cumulative[:, high] - cumulative[:, low]
+
+    return names, years, counts
+
+
+def get_stats(trips, days):
+    '''
+    Computes the raw statistics of the trips departing in a date range,
+    reading two cumulative sums per statistic.
+
+    Args:
+        trips: the cumulative statistics of the trips, see build_trips
+        days: (first, last) days since epoch, inclusive
+    Returns:
+        The statistics, see summary_stats.compute_stats, and the names of
+        the vessel types.
+    '''
+
+    low, high = _get_positions(trips, *days)
+
+    return {
+        "count": int(trips["count"][high] - trips["count"][low]),
+        "international": int(trips["international"][high] - trips["international"][low]),
+        "duration_hours": float(trips["duration_hours"][high] - trips["duration_hours"][low]),
+        "vessels": trips["vessels"][:, high] - trips["vessels"][:, low],
+    }, trips["vessel_types"]
@@ -0,0 +1,126 @@
+'''
+    Builds the dataset used by the callbacks.
+
+    A dataset is a dict holding the trips and passages frames and the
+    values derived from them once (time index, count cube, passage index,
+    catalog of the harbours, per-day cumulative counts, origin-destination
+    flows, summary panel, dropdown lists). The trips are sorted by departure date. It is
+    identified by a version, the checksum of the snapshot it comes from.
+
+    New trips and passages are merged into a dataset (see merge_dataset):
+    only the new rows are counted, the result is a new dataset with a new
+    version, the previous one is left untouched.
+'''
+
+import catalog
+import cube
+import cumulative
+import encoding
+import flows
+import passage_index
+import summary_stats
+import time_index
+
+
+def build_dataset(trips_df_heat, detail_df, version, orders=None):
+    '''
+    Derives the time index, the count cube, the passage index, the catalog
+    of the harbours, the summary panel values and the dropdown lists.
+
+    Args:
+        trips_df_heat: the trips, dates converted and years filtered
+        detail_df: the passages of the trips
+        version: identifier of the data, e.g. the snapshot checksum
+        orders: the sorted columns of the tables, see snapshot.open_orders
+    Returns:
+        The dataset, a dict.
+    '''
+
+    orders = orders or {}
+    dates = time_index.build_index(trips_df_heat, orders.get("trips", {}).get("Arrival Date"))
+    trips_df_heat = dates["trips"]  # sorted by departure date
+    passages = passage_index.build_index(detail_df)
+    data_cube = cube.build_cube(trips_df_heat)
+    columns = summary_stats.get_columns(trips_df_heat)
+
+    data = {
+        "version": version,
+        "trips": trips_df_heat,
+        "time_index": dates,
+        "passages": passages["passages"],  # sorted by trip Id
+        "passage_index": passages,
+        "cube": data_cube,
+        "catalog": catalog.build_catalog(data_cube),
+        "harbour_years": cube.build_harbour_years(data_cube),
+        "cumulative": cumulative.build(data_cube, columns),
+        "flows": flows.build_flows(trips_df_heat),
+        "columns": columns,
+        # region, harbour, vessel
+        "regions_sorted": sorted(trips_df_heat["Departure Region"].unique()),
+        "vessel_type_sorted": sorted(trips_df_heat["Vessel Type"].unique()),
+    }
+
+    # summary panel: total_voyage0, total_voyage, international_trips, trip_duration, most_used_vessel
+    data["stats"] = summary_stats.compute_stats(columns)
+    data.update(summary_stats.format_stats(data["stats"], columns["vessels"]))
+
+    return data
+
+
+def merge_dataset(data, trips_df, detail_df, version):
+    '''
+    Adds new trips and passages to a dataset. The derived values are
+    updated from the new rows only: their counts are merged into the cube,
+    the catalog, the cumulative counts, the flows and the summary
+    statistics, and they are inserted in the sorted trips and passages.
+
+    Args:
+        data: the dataset, not modified
+        trips_df: the new trips, dates converted and years filtered, None if there are none
+        detail_df: the new passages, None if there are none
+        version: identifier of the new data
+    Returns:
+        The new dataset, a dict.
+    '''
+
+    trips, passages = data["trips"], data["passages"]
+    trips_df = trips.iloc[0:0].copy() if trips_df is None else trips_df
+    detail_df = passages.iloc[0:0].copy() if detail_df is None else detail_df
+    previous = encoding.get_dictionaries(trips, passages)
+    received = encoding.build_dictionaries(trips_df, detail_df)
+    dictionaries = {kind: sorted(set(names) | set(received[kind])) for kind, names in previous.items()}
+    if dictionaries != previous:
+        # new names: the codes of the loaded rows move, the frames are re-encoded.
+        trips = encoding.encode(trips.copy(deep=False), dictionaries)
+        passages = encoding.encode(passages.copy(deep=False), dictionaries)
+    trips_df = encoding.encode(trips_df, dictionaries)
+    detail_df = encoding.encode(detail_df, dictionaries)
+
+    dates = time_index.merge_index(dict(data["time_index"], trips=trips), trips_df)
+    passages = passage_index.merge_index(dict(data["passage_index"], passages=passages), detail_df)
+    new_cube = cube.build_cube(trips_df)
+    new_columns = summary_stats.get_columns(trips_df)
+    columns = summary_stats.get_columns(dates["trips"])
+
+    merged = {
+        "version": version,
+        "trips": dates["trips"],
+        "time_index": dates,
+        "passages": passages["passages"],
+        "passage_index": passages,
+        "cube": cube.merge_cubes(data["cube"], new_cube),
+        "catalog": catalog.merge_catalogs(data["catalog"], catalog.build_catalog(new_cube)),
+        "harbour_years": cube.merge_harbour_years(data["harbour_years"], cube.build_harbour_years(new_cube)),
+        "cumulative": cumulative.merge(data["cumulative"], cumulative.build(new_cube, new_columns)),
+        "flows": flows.merge_flows(data["flows"], flows.build_flows(trips_df)),
+        "columns": columns,
+        "regions_sorted": sorted(set(data["regions_sorted"]) | set(trips_df["Departure Region"].unique())),
+        "vessel_type_sorted": sorted(set(data["vessel_type_sorted"]) | set(trips_df["Vessel Type"].unique())),
+    }
+
+    merged["stats"], vessel_names = summary_stats.add_stats(data["stats"], data["columns"]["vessels"],
+                                                            summary_stats.compute_stats(new_columns),
+                                                            new_columns["vessels"])
+    merged.update(summary_stats.format_stats(merged["stats"], vessel_names))
+
+    return merged
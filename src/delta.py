@@ -0,0 +1,378 @@
+'''
+    Appends new trips and passages to the loaded data.
+
+    A delta is a CSV of new trips or of new passages, with the columns of
+    the sources. It is read like the sources (dates parsed, years filtered)
+    and merged into the current dataset (see dataset.merge_dataset): only
+    the new rows are processed, and the new dataset, with a new version,
+    replaces the current one without a restart.
+
+    The deltas are kept in their own directory, out of the snapshot (a
+    rebuild replaces the directory of the snapshot), in a directory per
+    checksum of the sources (see snapshot.sources_checksum): a new format
+    of the snapshot or a new year window keeps them. They are replayed
+    after the snapshot is loaded, so they survive a restart. When the
+    sources change, the deltas of the previous sources are carried over
+    and replayed on the new ones (see carry_over), never dropped: remove
+    their directory before restarting if the new sources hold their rows.
+    Each worker process applies the deltas saved by the others (see sync),
+    under a file lock, in the order they were saved.
+
+    Merging a delta copies the trips and passages: each worker then holds
+    its own copy of them in memory, instead of sharing the pages of the
+    memory-mapped snapshot. The deltas are folded into a new generation of
+    the snapshot (see fold), which the workers load again, memory-mapped:
+    the copies only live until then.
+'''
+
+import fcntl
+import hashlib
+import hmac
+import io
+import os
+import shutil
+
+import pandas as pd
+from flask import jsonify, request
+
+import dataset
+import encoding
+import preprocess
+import snapshot
+
+
+KINDS = ("trips", "passages")
+
+
+def read_delta(content, kind, start, end):
+    '''
+    Reads a delta.
+
+    Args:
+        content: the CSV, bytes
+        kind: "trips" or "passages"
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+    Returns:
+        The new rows, dates converted (and years filtered for trips).
+    '''
+
+    if kind == "trips":
+        trips = preprocess.convert_dates(pd.read_csv(io.BytesIO(content), usecols=preprocess.TRIP_COLUMNS))
+        return preprocess.filter_years(trips, start, end).reset_index(drop=True)
+
+    return preprocess.convert_dates(pd.read_csv(io.BytesIO(content), usecols=preprocess.PASSAGE_COLUMNS))
+
+
+def get_version(version, content):
+    '''
+    Args:
+        version: version of the data the delta is applied to
+        content: the delta, bytes
+    Returns:
+        The version of the data with the delta applied.
+    '''
+
+    return hashlib.sha256((version + hashlib.sha256(content).hexdigest()).encode()).hexdigest()
+
+
+def apply_delta(data, content, kind, start, end):
+    '''
+    Merges a delta into a dataset.
+
+    Args:
+        data: the dataset, not modified
+        content: the CSV of the delta, bytes
+        kind: "trips" or "passages"
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+    Returns:
+        The new dataset.
+    '''
+
+    rows = read_delta(content, kind, start, end)
+    trips_df, detail_df = (rows, None) if kind == "trips" else (None, rows)
+
+    return dataset.merge_dataset(data, trips_df, detail_df, get_version(data["version"], content))
+
+
+def get_sources(data):
+    '''
+    Args:
+        data: a dataset
+    Returns:
+        The checksum of the sources of the dataset, its version if it is not known.
+    '''
+
+    return data.get("sources") or data["version"]
+
+
+def get_directory(delta_dir, sources):
+    '''
+    Args:
+        delta_dir: directory of the deltas
+        sources: checksum of the sources the deltas apply to, see get_sources
+    Returns:
+        The directory of the deltas of those sources.
+    '''
+
+    return os.path.join(delta_dir, sources[:16])
+
+
+def save_delta(directory, content, kind):
+    '''
+    Writes a delta after the ones already saved, atomically.
+
+    Args:
+        directory: the directory of the deltas of the sources
+        content: the CSV of the delta, bytes
+        kind: "trips" or "passages"
+    Returns:
+        The path of the delta.
+    '''
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{:06d}-{}.csv".format(len(list_deltas(directory)), kind))
+    with open(path + ".tmp", "wb") as delta_file:
+        delta_file.write(content)
+    os.replace(path + ".tmp", path)
+
+    return path
+
+
+def list_deltas(directory):
+    '''
+    Args:
+        directory: the directory of the deltas of the sources
+    Returns:
+        list of (path, kind) of the saved deltas, in the order they were received.
+    '''
+
+    if not os.path.isdir(directory):
+        return []
+
+    deltas = []
+    for name in sorted(os.listdir(directory)):
+        kind = name[len("000000-"):-len(".csv")]
+        if name.endswith(".csv") and kind in KINDS:
+            deltas.append((os.path.join(directory, name), kind))
+
+    return deltas
+
+
+def _applied(data, merged):
+    '''
+    Args:
+        data: a dataset
+        merged: the dataset with one more delta applied
+    Returns:
+        The merged dataset, knowing its sources, the number of deltas
+        applied and how many of them its snapshot holds.
+    '''
+
+    merged["sources"] = get_sources(data)
+    merged["deltas"] = data.get("deltas", 0) + 1
+    merged["folded"] = data.get("folded", 0)
+
+    return merged
+
+
+def _move_deltas(directory, target):
+    '''
+    Moves the deltas of a directory after the ones of another, in the order
+    they were saved, and removes the directory.
+
+    Args:
+        directory: the directory of the deltas moved
+        target: the directory they are moved to
+    Returns:
+        The number of deltas moved.
+    '''
+
+    deltas = list_deltas(directory)
+    for path, kind in deltas:
+        os.makedirs(target, exist_ok=True)
+        name = "{:06d}-{}.csv".format(len(list_deltas(target)), kind)
+        shutil.move(path, os.path.join(target, name + ".tmp"))
+        os.replace(os.path.join(target, name + ".tmp"), os.path.join(target, name))
+    shutil.rmtree(directory, ignore_errors=True)
+
+    return len(deltas)
+
+
+def adopt(delta_dir, previous_dir):
+    '''
+    Moves the directories of deltas of another directory into the directory
+    of the deltas, e.g. the deltas older versions kept in the snapshot
+    directory, before a rebuild of the snapshot removes them. They are
+    carried over to the current sources afterwards, see carry_over.
+
+    Args:
+        delta_dir: directory of the deltas
+        previous_dir: the other directory, nothing is done if it does not exist
+    Returns:
+        The number of deltas moved.
+    '''
+
+    if not os.path.isdir(previous_dir) or os.path.abspath(previous_dir) == os.path.abspath(delta_dir):
+        return 0
+
+    moved = 0
+    for name in sorted(os.listdir(previous_dir)):
+        directory = os.path.join(previous_dir, name)
+        if list_deltas(directory):
+            with open(os.path.join(directory, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                moved += _move_deltas(directory, os.path.join(delta_dir, name))
+
+    return moved
+
+
+def carry_over(delta_dir, sources):
+    '''
+    Moves the deltas of other sources (the sources before they changed, or
+    the snapshots of older versions, which kept their deltas by snapshot
+    checksum) after the deltas of the current sources, oldest first, so
+    they are replayed instead of dropped. Runs under the lock of the
+    deltas of the current sources, the workers carry them over once.
+
+    Args:
+        delta_dir: directory of the deltas
+        sources: checksum of the current sources
+    Returns:
+        The number of deltas carried over.
+    '''
+
+    if not os.path.isdir(delta_dir):
+        return 0
+
+    directory = get_directory(delta_dir, sources)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        others = [os.path.join(delta_dir, name) for name in os.listdir(delta_dir)
+                  if os.path.join(delta_dir, name) != directory]
+        others = sorted((os.path.getmtime(list_deltas(other)[0][0]), other) for other in others if list_deltas(other))
+
+        carried = 0
+        for _, other in others:
+            with open(os.path.join(other, ".lock"), "w") as other_lock:
+                fcntl.flock(other_lock, fcntl.LOCK_EX)
+                carried += _move_deltas(other, directory)
+
+    return carried
+
+
+def sync(data, delta_dir, start, end):
+    '''
+    Applies the saved deltas of the sources not applied yet: all of them
+    after loading the snapshot, then the ones appended by other workers.
+
+    Args:
+        data: the dataset, not modified
+        delta_dir: directory of the deltas
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+    Returns:
+        The dataset with the deltas applied, the same dataset if there are none.
+    '''
+
+    directory = get_directory(delta_dir, get_sources(data))
+    for path, kind in list_deltas(directory)[data.get("deltas", 0):]:
+        with open(path, "rb") as delta_file:
+            content = delta_file.read()
+        data = _applied(data, apply_delta(data, content, kind, start, end))
+
+    return data
+
+
+def append(data, delta_dir, content, kind, start, end):
+    '''
+    Merges a delta into a dataset and saves it, to be replayed on restart
+    and by the other workers. The deltas saved by the other workers are
+    applied first.
+
+    Args:
+        data: the current dataset, not modified
+        delta_dir: directory of the deltas
+        content: the CSV of the delta, bytes
+        kind: "trips" or "passages"
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+    Returns:
+        The new dataset.
+    '''
+
+    directory = get_directory(delta_dir, get_sources(data))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        data = sync(data, delta_dir, start, end)
+        merged = _applied(data, apply_delta(data, content, kind, start, end))
+        save_delta(directory, content, kind)
+
+    return merged
+
+
+def fold(data, snapshot_dir, minimum=1):
+    '''
+    Writes a dataset with deltas applied as a new generation of the
+    snapshot (see snapshot.fold), once it holds enough deltas not folded
+    yet. The next loads open the merged trips and passages memory-mapped,
+    shared by the workers, and apply the deltas saved after it only.
+
+    Args:
+        data: the dataset
+        snapshot_dir: directory of the snapshot
+        minimum: number of deltas not folded yet needed to fold them
+    Returns:
+        True if a new generation was written.
+    '''
+
+    if data.get("deltas", 0) - data.get("folded", 0) < max(minimum, 1):
+        return False
+
+    generation = {"version": data["version"], "sources": get_sources(data), "deltas": data["deltas"]}
+
+    return snapshot.fold(snapshot_dir, {"trips": data["trips"], "passages": data["passages"]},
+                         encoding.get_dictionaries(data["trips"], data["passages"]), generation)
+
+
+def register_routes(server, get_dataset, apply, token):
+    '''
+    Adds the POST /api/append?kind=trips|passages endpoint to the Flask
+    server. The delta is the body of the request (or its "file" upload),
+    the token is given as "Authorization: Bearer <token>".
+
+    Args:
+        server: the Flask server of the Dash app
+        get_dataset: function returning the current dataset, None while loading
+        apply: function merging a delta (content, kind) into the current
+            dataset and making the result current, returns the new dataset
+        token: the token expected, the endpoint is disabled if it is empty
+    '''
+
+    @server.route("/api/append", methods=["POST"])
+    def append_delta():  # pylint: disable=unused-variable
+        if not token:
+            return jsonify({"error": "appending is disabled"}), 403
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), "Bearer " + token):
+            return jsonify({"error": "invalid token"}), 401
+
+        kind = request.args.get("kind", "trips")
+        if kind not in KINDS:
+            return jsonify({"error": "kind must be one of " + ", ".join(KINDS)}), 400
+        upload = request.files.get("file")
+        content = upload.read() if upload is not None else request.get_data()
+        if not content:
+            return jsonify({"error": "empty delta"}), 400
+
+        if get_dataset() is None:
+            return jsonify({"status": "loading"}), 503
+        try:
+            data = apply(content, kind)
+        except (ValueError, KeyError) as error:
+            return jsonify({"error": str(error)}), 400
+
+        return jsonify({"version": data["version"], "trips": int(data["trips"].shape[0]),
+                        "passages": int(data["passages"].shape[0])})
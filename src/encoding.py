@@ -0,0 +1,181 @@
+'''
+    Dictionary encoding of the repeated string columns.
+
+    Regions, harbours, vessel types and event types are mapped to small
+    integer codes through one dictionary per kind, shared by the trips and
+    the passages frames (e.g. "Departure Region", "Arrival Region" and
+    "Region" use the same region codes). The columns are stored as pandas
+    categoricals on top of those dictionaries, so filters compare integer
+    codes instead of strings.
+'''
+
+import numpy as np
+import pandas as pd
+
+
+# column name -> kind of dictionary it is encoded with.
+ENCODED_COLUMNS = {
+    "Departure Region": "region",
+    "Arrival Region": "region",
+    "Region": "region",
+    "Departure Hardour": "harbour",
+    "Arrival Hardour": "harbour",
+    "Hardour": "harbour",
+    "Vessel Type": "vessel",
+    "Event Type": "event",
+}
+
+
+def build_dictionaries(*dataframes):
+    '''
+    Builds the sorted dictionary of every kind from the given frames.
+
+    Args:
+        dataframes: frames containing some of the encoded columns
+    Returns:
+        dict of kind -> sorted list of names
+    '''
+
+    names = {kind: set() for kind in ENCODED_COLUMNS.values()}
+    for dataframe in dataframes:
+        for column, kind in ENCODED_COLUMNS.items():
+            if column in dataframe.columns:
+                names[kind].update(dataframe[column].dropna().unique())
+
+    return {kind: sorted(values) for kind, values in names.items()}
+
+
+def get_dictionaries(*dataframes):
+    '''
+    Reads the dictionaries back from encoded frames.
+
+    Args:
+        dataframes: frames with encoded columns
+    Returns:
+        dict of kind -> sorted list of names
+    '''
+
+    dictionaries = {}
+    for dataframe in dataframes:
+        for column, kind in ENCODED_COLUMNS.items():
+            if column in dataframe.columns and kind not in dictionaries:
+                dictionaries[kind] = list(dataframe[column].cat.categories)
+
+    return dictionaries
+
+
+def get_dtypes(dictionaries):
+    '''
+    Creates the categorical dtype of every kind.
+
+    Args:
+        dictionaries: dict of kind -> sorted list of names
+    Returns:
+        dict of kind -> pandas CategoricalDtype
+    '''
+
+    return {kind: pd.CategoricalDtype(values) for kind, values in dictionaries.items()}
+
+
+def encode(dataframe, dictionaries):
+    '''
+    Encodes the string columns of the frame with the shared dictionaries.
+
+    Args:
+        dataframe: The dataframe to process
+        dictionaries: dict of kind -> sorted list of names
+    Returns:
+        The dataframe with categorical columns.
+    '''
+
+    dtypes = get_dtypes(dictionaries)
+    for column, kind in ENCODED_COLUMNS.items():
+        if column in dataframe.columns:
+            dataframe[column] = dataframe[column].astype(dtypes[kind])
+
+    return dataframe
+
+
+def get_code(series, value):
+    '''
+    Looks up the code of a name in the dictionary of an encoded column.
+
+    Args:
+        series: an encoded column
+        value: a name, e.g. "Pacific Region"
+    Returns:
+        The code of the name, -1 if it is not in the dictionary.
+    '''
+
+    return series.cat.categories.get_indexer([value])[0]
+
+
+def equals(series, value):
+    '''
+    Compares an encoded column to a name, using the integer codes.
+
+    Args:
+        series: an encoded column
+        value: a name, e.g. "Pacific Region"
+    Returns:
+        A boolean numpy array.
+    '''
+
+    code = get_code(series, value)
+    codes = series.cat.codes.to_numpy()
+    if code < 0:
+        return np.zeros(codes.shape[0], dtype=bool)
+
+    return codes == code
+
+
+def get_remap(names, new_names):
+    '''
+    Maps the codes of a dictionary to the codes of a larger one, e.g. when
+    new names are received.
+
+    Args:
+        names: the names, by code
+        new_names: the names of the larger dictionary, by code
+    Returns:
+        numpy array of the new code of each code. It ends with -1, so
+        missing values (code -1) stay missing.
+    '''
+
+    remap = pd.Index(new_names).get_indexer(names)
+
+    return np.append(remap, -1).astype(np.int64)
+
+
+def memory_report(raw_df, encoded_df):
+    '''
+    Compares the memory used by each column before and after the encoding.
+
+    Args:
+        raw_df: the frame with string columns
+        encoded_df: the same frame with encoded columns
+    Returns:
+        dataframe with the bytes used before and after, and the bytes saved.
+    '''
+
+    before = raw_df.memory_usage(index=False, deep=True)
+    after = encoded_df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({"Before": before, "After": after}).loc[encoded_df.columns]
+    report["Saved"] = report.Before - report.After
+    report.loc["Total"] = report.sum()
+
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import preprocess
+
+    parser = argparse.ArgumentParser(description="Memory saved by the encoding of a CSV.")
+    parser.add_argument("csv")
+    args = parser.parse_args()
+
+    raw = preprocess.convert_dates(pd.read_csv(args.csv))
+    encoded = encode(raw.copy(), build_dictionaries(raw))
+    print(memory_report(raw, encoded).to_string())
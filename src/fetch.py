@@ -0,0 +1,441 @@
+'''
+    Downloads the source CSVs into a local cache.
+
+    The sources are downloaded concurrently, each one in byte ranges fetched
+    in parallel (when the server accepts ranges) and written in place in a
+    partial file. The ranges already written are recorded next to it, so
+    an interrupted download resumes where it stopped, as long as the remote
+    file did not change (same ETag and length). The length of each range
+    and of the file is checked, and the MD5 given by the server (the ETag
+    of S3, or Content-MD5) if any.
+
+    A url is downloaded under a file lock, so the processes (e.g. the
+    gunicorn workers) starting together download it once: the others wait
+    and find it in the cache.
+
+    The downloaded files are stored by the SHA-256 of their content, and
+    each url points to its file. A url already downloaded is served from
+    the cache without any request; it is checked again against the server
+    only once max_age seconds have passed.
+
+    python fetch.py URL... --cache-dir DIR downloads urls into the cache.
+'''
+
+import base64
+import concurrent.futures
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+CHUNK_SIZE = 8 << 20
+WORKERS = 4
+RETRIES = 3
+TIMEOUT = 30
+
+
+def is_url(source):
+    '''
+    Args:
+        source: path or url
+    Returns:
+        True if the source is an http(s) url.
+    '''
+
+    return source.startswith(("http://", "https://"))
+
+
+def get_paths(cache_dir, url):
+    '''
+    Args:
+        cache_dir: directory of the cache
+        url: url of a file
+    Returns:
+        dict with the paths of the reference of the url to its file, of
+        its partial download and the state of it, and of the lock held
+        while downloading it.
+    '''
+
+    name = hashlib.sha256(url.encode()).hexdigest()
+
+    return {
+        "ref": os.path.join(cache_dir, "refs", name + ".json"),
+        "partial": os.path.join(cache_dir, "partial", name),
+        "state": os.path.join(cache_dir, "partial", name + ".json"),
+        "lock": os.path.join(cache_dir, "partial", name + ".lock"),
+    }
+
+
+def get_object_path(cache_dir, digest):
+    '''
+    Args:
+        cache_dir: directory of the cache
+        digest: SHA-256 of a file, hex
+    Returns:
+        The path of the file in the cache.
+    '''
+
+    return os.path.join(cache_dir, "objects", digest[:2], digest)
+
+
+def get_digest(path):
+    '''
+    Args:
+        path: path of a file
+    Returns:
+        The SHA-256 of the file if it is in a cache (its name), else None.
+    '''
+
+    name = os.path.basename(path)
+    parent = os.path.basename(os.path.dirname(path))
+    grandparent = os.path.basename(os.path.dirname(os.path.dirname(path)))
+    if grandparent == "objects" and re.fullmatch("[0-9a-f]{64}", name) and name[:2] == parent:
+        return name
+
+    return None
+
+
+def _read_json(path):
+    '''
+    Returns:
+        The content of a JSON file, None if it does not exist or is invalid.
+    '''
+
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, content):
+    '''
+    Writes a JSON file atomically.
+    '''
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w") as json_file:
+        json.dump(content, json_file)
+    os.replace(tmp_path, path)
+
+
+def _request(url, method="GET", headers=None, timeout=TIMEOUT, retries=RETRIES):
+    '''
+    Sends a request, retrying with a backoff on network and server errors.
+
+    Args:
+        url: the url
+        method: the HTTP method
+        headers: dict of headers
+        timeout: timeout of each attempt, in seconds
+        retries: number of attempts after the first one
+    Returns:
+        The response, to be closed by the caller.
+    '''
+
+    for attempt in range(retries + 1):
+        try:
+            return urllib.request.urlopen(urllib.request.Request(url, method=method, headers=headers or {}),
+                                          timeout=timeout)
+        except urllib.error.HTTPError as error:
+            if error.code < 500 or attempt == retries:
+                raise
+        except OSError:
+            if attempt == retries:
+                raise
+        time.sleep(0.5 * 2 ** attempt)
+
+    return None
+
+
+def get_remote(url, timeout=TIMEOUT, retries=RETRIES):
+    '''
+    Asks the server about a file, without downloading it.
+
+    Args:
+        url: url of the file
+        timeout: timeout of the request, in seconds
+        retries: number of attempts after the first one
+    Returns:
+        dict with the "length" of the file (None if unknown), its "etag",
+        "last_modified", "md5" (hex, None if not given) and whether the
+        server accepts "ranges".
+    '''
+
+    with _request(url, "HEAD", timeout=timeout, retries=retries) as response:
+        headers = response.headers
+        length = headers.get("Content-Length")
+        etag = headers.get("ETag")
+
+        md5 = None
+        if headers.get("Content-MD5"):
+            md5 = base64.b64decode(headers["Content-MD5"]).hex()
+        elif etag and re.fullmatch('"[0-9a-f]{32}"', etag):
+            # S3 objects uploaded in one part: the ETag is the MD5 of the content.
+            md5 = etag.strip('"')
+
+        return {
+            "length": int(length) if length is not None else None,
+            "etag": etag,
+            "last_modified": headers.get("Last-Modified"),
+            "md5": md5,
+            "ranges": headers.get("Accept-Ranges") == "bytes",
+        }
+
+
+def _fetch_range(url, path, start, stop, remote, timeout, retries):
+    '''
+    Downloads a byte range of a file into the same range of the partial file.
+
+    Args:
+        url: url of the file
+        path: path of the partial file, of the length of the file
+        start: first byte (inclusive)
+        stop: last byte (exclusive)
+        remote: the file on the server, see get_remote
+        timeout: timeout of the requests, in seconds
+        retries: number of attempts after the first one
+    '''
+
+    headers = {"Range": "bytes={}-{}".format(start, stop - 1)}
+    if remote["etag"]:
+        # the whole file is sent back if it changed: the range is rejected below.
+        headers["If-Range"] = remote["etag"]
+
+    for attempt in range(retries + 1):
+        try:
+            with _request(url, headers=headers, timeout=timeout, retries=0) as response:
+                content_range = response.headers.get("Content-Range", "")
+                if response.status != 206 or not content_range.startswith("bytes {}-{}/".format(start, stop - 1)):
+                    raise ValueError("{} changed during the download".format(url))
+                content = response.read()
+            if len(content) != stop - start:
+                raise OSError("{}: got {} bytes of range {}-{}".format(url, len(content), start, stop - 1))
+            break
+        except OSError:
+            if attempt == retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+    with open(path, "r+b") as partial_file:
+        partial_file.seek(start)
+        partial_file.write(content)
+
+
+def _download_ranges(url, paths, remote, chunk_size, workers, timeout, retries):
+    '''
+    Downloads a file in ranges, in parallel, resuming a previous download
+    of the same file.
+
+    Args:
+        url: url of the file
+        paths: the paths of the url, see get_paths
+        remote: the file on the server, see get_remote
+        chunk_size: size of the ranges, in bytes
+        workers: number of ranges downloaded at a time
+        timeout: timeout of the requests, in seconds
+        retries: number of attempts after the first one
+    '''
+
+    length = remote["length"]
+    chunks = [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+    state = _read_json(paths["state"])
+    if state is None or state["etag"] != remote["etag"] or state["length"] != length \
+            or state["chunk_size"] != chunk_size or not os.path.exists(paths["partial"]):
+        state = {"etag": remote["etag"], "length": length, "chunk_size": chunk_size, "done": []}
+        with open(paths["partial"], "wb") as partial_file:
+            partial_file.truncate(length)
+        _write_json(paths["state"], state)
+
+    done = set(state["done"])
+    lock = threading.Lock()
+
+    def fetch_chunk(position):
+        _fetch_range(url, paths["partial"], *chunks[position], remote, timeout, retries)
+        with lock:
+            done.add(position)
+            state["done"] = sorted(done)
+            _write_json(paths["state"], state)
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        for future in [executor.submit(fetch_chunk, position)
+                       for position in range(len(chunks)) if position not in done]:
+            future.result()
+
+
+def _download_whole(url, paths, timeout, retries):
+    '''
+    Downloads a file in one request, when the server does not accept ranges.
+
+    Args:
+        url: url of the file
+        paths: the paths of the url, see get_paths
+        timeout: timeout of the request, in seconds
+        retries: number of attempts after the first one
+    '''
+
+    with _request(url, timeout=timeout, retries=retries) as response, open(paths["partial"], "wb") as partial_file:
+        shutil.copyfileobj(response, partial_file, 1 << 20)
+
+
+def _hash_file(path):
+    '''
+    Returns:
+        The SHA-256 and the MD5 of a file, hex.
+    '''
+
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b""):
+            sha256.update(block)
+            md5.update(block)
+
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def _download(url, cache_dir, paths, chunk_size, workers, timeout, retries):
+    '''
+    Downloads a file into the cache, see download. Runs under the lock of the url.
+
+    Args:
+        url: url of the file
+        cache_dir: directory of the cache
+        paths: the paths of the url, see get_paths
+        chunk_size: size of the ranges downloaded in parallel, in bytes
+        workers: number of ranges downloaded at a time
+        timeout: timeout of the requests, in seconds
+        retries: number of attempts of each request after the first one
+    Returns:
+        The path of the file in the cache.
+    '''
+
+    remote = get_remote(url, timeout, retries)
+
+    ref = _read_json(paths["ref"])
+    if ref is not None and os.path.exists(get_object_path(cache_dir, ref["sha256"])) \
+            and (ref["etag"], ref["length"]) == (remote["etag"], remote["length"]) and remote["etag"]:
+        # not changed since it was downloaded.
+        ref["checked"] = time.time()
+        _write_json(paths["ref"], ref)
+        return get_object_path(cache_dir, ref["sha256"])
+
+    if remote["ranges"] and remote["length"]:
+        _download_ranges(url, paths, remote, chunk_size, workers, timeout, retries)
+    else:
+        _download_whole(url, paths, timeout, retries)
+
+    size = os.path.getsize(paths["partial"])
+    sha256, md5 = _hash_file(paths["partial"])
+    if (remote["length"] is not None and size != remote["length"]) or (remote["md5"] and md5 != remote["md5"]):
+        os.remove(paths["partial"])
+        if os.path.exists(paths["state"]):
+            os.remove(paths["state"])
+        raise ValueError("{}: the download does not match the length or the checksum of the file".format(url))
+
+    object_path = get_object_path(cache_dir, sha256)
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    os.replace(paths["partial"], object_path)
+    if os.path.exists(paths["state"]):
+        os.remove(paths["state"])
+    _write_json(paths["ref"], {"url": url, "sha256": sha256, "length": size, "etag": remote["etag"],
+                               "last_modified": remote["last_modified"], "checked": time.time()})
+
+    return object_path
+
+
+def download(url, cache_dir, chunk_size=CHUNK_SIZE, workers=WORKERS, timeout=TIMEOUT, retries=RETRIES):
+    '''
+    Downloads a file into the cache, and points the url to it. The partial
+    file, its state and the reference of the url are only written under
+    the lock of the url: a process downloading it while another one is
+    waits for it, then finds the file in the cache.
+
+    Args:
+        url: url of the file
+        cache_dir: directory of the cache
+        chunk_size: size of the ranges downloaded in parallel, in bytes
+        workers: number of ranges downloaded at a time
+        timeout: timeout of the requests, in seconds
+        retries: number of attempts of each request after the first one
+    Returns:
+        The path of the file in the cache.
+    '''
+
+    paths = get_paths(cache_dir, url)
+    os.makedirs(os.path.dirname(paths["partial"]), exist_ok=True)
+    with open(paths["lock"], "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return _download(url, cache_dir, paths, chunk_size, workers, timeout, retries)
+
+
+def fetch(source, cache_dir, max_age=None, **options):
+    '''
+    Returns a local copy of a source, downloading it if needed.
+
+    Args:
+        source: path or http(s) url
+        cache_dir: directory of the cache
+        max_age: seconds after which a cached url is checked against the
+            server, never if None
+        options: see download
+    Returns:
+        The path of the local copy, the source itself if it is a path.
+    '''
+
+    if not is_url(source):
+        return source
+
+    ref = _read_json(get_paths(cache_dir, source)["ref"])
+    if ref is not None and os.path.exists(get_object_path(cache_dir, ref["sha256"])):
+        if max_age is None or time.time() - ref["checked"] < max_age:
+            return get_object_path(cache_dir, ref["sha256"])
+        try:
+            return download(source, cache_dir, **options)
+        except (OSError, ValueError):
+            # the server can not be reached: the cached copy is used.
+            return get_object_path(cache_dir, ref["sha256"])
+
+    return download(source, cache_dir, **options)
+
+
+def fetch_all(sources, cache_dir, max_age=None, **options):
+    '''
+    Returns local copies of sources, downloaded concurrently.
+
+    Args:
+        sources: paths or http(s) urls
+        cache_dir: directory of the cache
+        max_age: see fetch
+        options: see download
+    Returns:
+        The paths of the local copies, in the order of the sources.
+    '''
+
+    with concurrent.futures.ThreadPoolExecutor(max(len(sources), 1)) as executor:
+        futures = [executor.submit(fetch, source, cache_dir, max_age, **options) for source in sources]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download files into the local cache.")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--cache-dir", default="./assets/data/cache")
+    parser.add_argument("--max-age", type=float, default=None, help="seconds before checking a cached url again")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    for url, path in zip(args.urls, fetch_all(args.urls, args.cache_dir, args.max_age,
+                                               chunk_size=args.chunk_size, workers=args.workers)):
+        print("{} -> {}".format(url, path))
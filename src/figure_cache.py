@@ -0,0 +1,163 @@
+'''
+    Memoized figures.
+
+    The figures are cached by callback inputs and dataset version, so a
+    figure is built once per version of the data. The cache is bounded,
+    the least recently used figure is evicted first. Hits and misses are
+    counted and exposed on /stats/figure-cache.
+'''
+
+import collections
+import threading
+
+from flask import jsonify
+
+
+MAX_SIZE = 512
+
+
+def new_cache(max_size=MAX_SIZE):
+    '''
+    Creates an empty cache.
+
+    Args:
+        max_size: maximum number of entries
+    Returns:
+        The cache, a dict.
+    '''
+
+    return {
+        "entries": collections.OrderedDict(),
+        "max_size": max_size,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "lock": threading.Lock(),
+    }
+
+
+_figures = new_cache()
+
+
+def make_key(name, version, *inputs):
+    '''
+    Builds the key of a figure.
+
+    Args:
+        name: name of the figure, e.g. the callback
+        version: version of the dataset the figure is built from
+        inputs: the callback inputs
+    Returns:
+        The key, a tuple.
+    '''
+
+    return (name, version) + tuple(inputs)
+
+
+def get(key, cache=None):
+    '''
+    Looks up an entry, and marks it as the most recently used.
+
+    Args:
+        key: key of the entry
+        cache: the cache, the figure cache if None
+    Returns:
+        The cached value, None if it is missing.
+    '''
+
+    cache = cache if cache is not None else _figures
+    with cache["lock"]:
+        value = cache["entries"].get(key)
+        if value is None:
+            cache["misses"] += 1
+            return None
+        cache["entries"].move_to_end(key)
+        cache["hits"] += 1
+
+    return value
+
+
+def put(key, value, cache=None):
+    '''
+    Stores an entry, evicting the least recently used ones if the cache is full.
+
+    Args:
+        key: key of the entry
+        value: the value to store
+        cache: the cache, the figure cache if None
+    '''
+
+    cache = cache if cache is not None else _figures
+    with cache["lock"]:
+        cache["entries"][key] = value
+        cache["entries"].move_to_end(key)
+        while len(cache["entries"]) > cache["max_size"]:
+            cache["entries"].popitem(last=False)
+            cache["evictions"] += 1
+
+
+def get_or_build(key, build, cache=None):
+    '''
+    Returns the cached value of a key, building and storing it on a miss.
+
+    Args:
+        key: key of the entry, see make_key
+        build: function returning the value
+        cache: the cache, the figure cache if None
+    Returns:
+        The value.
+    '''
+
+    value = get(key, cache)
+    if value is None:
+        value = build()
+        put(key, value, cache)
+
+    return value
+
+
+def get_stats(cache=None):
+    '''
+    Args:
+        cache: the cache, the figure cache if None
+    Returns:
+        dict with the size and the counters of the cache.
+    '''
+
+    cache = cache if cache is not None else _figures
+    with cache["lock"]:
+        lookups = cache["hits"] + cache["misses"]
+        return {
+            "size": len(cache["entries"]),
+            "max_size": cache["max_size"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "evictions": cache["evictions"],
+            "hit_ratio": round(cache["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def clear(cache=None):
+    '''
+    Removes every entry of a cache, the counters are kept.
+
+    Args:
+        cache: the cache, the figure cache if None
+    '''
+
+    cache = cache if cache is not None else _figures
+    with cache["lock"]:
+        cache["entries"].clear()
+
+
+def register_routes(server):
+    '''
+    Adds the /stats/figure-cache endpoint to the Flask server.
+
+    Args:
+        server: the Flask server of the Dash app
+    '''
+
+    @server.route("/stats/figure-cache")
+    def figure_cache_stats():  # pylint: disable=unused-variable
+        return jsonify(get_stats())
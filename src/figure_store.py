@@ -0,0 +1,112 @@
+'''
+    Figures serialized ahead of time, on disk.
+
+    The figures are written by the warm-up command (see prerender.py), one
+    gzipped JSON file per figure, under the version of the dataset they
+    are built from: <store>/<version>/<name>/<digest of the inputs>.json.gz.
+    The app reads them on a figure cache miss (see figures.get_cached),
+    so a figure prerendered for the current data is never built again.
+    The figures of the other versions are never read, prune removes them.
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+import plotly.utils
+
+
+def get_path(store_dir, key):
+    '''
+    Args:
+        store_dir: directory of the store
+        key: key of the figure, see figure_cache.make_key
+    Returns:
+        The path of the file of the figure.
+    '''
+
+    name, version, inputs = key[0], key[1], key[2:]
+    digest = hashlib.sha256(json.dumps(inputs, cls=plotly.utils.PlotlyJSONEncoder).encode()).hexdigest()
+
+    return os.path.join(store_dir, version, name, digest + ".json.gz")
+
+
+def load(store_dir, key):
+    '''
+    Reads a figure from the store.
+
+    Args:
+        store_dir: directory of the store, nothing is read if None
+        key: key of the figure, see figure_cache.make_key
+    Returns:
+        The figure as a dict, None if it is not stored.
+    '''
+
+    if store_dir is None:
+        return None
+
+    try:
+        with gzip.open(get_path(store_dir, key), "rt", encoding="utf-8") as figure_file:
+            return json.load(figure_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save(store_dir, key, figure):
+    '''
+    Writes a figure in the store. The file is written aside and renamed,
+    the app never reads a partial figure.
+
+    Args:
+        store_dir: directory of the store
+        key: key of the figure, see figure_cache.make_key
+        figure: the figure, or a dict of figures (see figures.pack_frequencies)
+    Returns:
+        The size of the file, in bytes.
+    '''
+
+    path = get_path(store_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    content = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder).encode()
+
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as figure_file:
+        figure_file.write(gzip.compress(content, compresslevel=6))
+    os.replace(tmp_path, path)
+
+    return os.path.getsize(path)
+
+
+def contains(store_dir, key):
+    '''
+    Args:
+        store_dir: directory of the store
+        key: key of the figure, see figure_cache.make_key
+    Returns:
+        True if the figure is stored.
+    '''
+
+    return os.path.exists(get_path(store_dir, key))
+
+
+def prune(store_dir, version):
+    '''
+    Removes the figures of the other versions of the dataset.
+
+    Args:
+        store_dir: directory of the store
+        version: the version kept
+    Returns:
+        The versions removed.
+    '''
+
+    if not os.path.isdir(store_dir):
+        return []
+
+    removed = sorted(name for name in os.listdir(store_dir) if name != version)
+    for name in removed:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+    return removed
@@ -0,0 +1,456 @@
+'''
+    Builds the figures displayed by the callbacks.
+
+    Each builder takes the dataset and the callback inputs, and does not
+    depend on the Dash app, so the figures can be built ahead of time.
+    The heatmaps have a small, finite set of inputs: they are all built
+    when the data is loaded and served from the figure cache.
+
+    The drill-downs have a finite set of inputs too, the cells of the
+    heatmaps and the bars of the harbours (see get_input_space): the
+    warm-up command builds them all into the figure store (see
+    prerender.py and figure_store.py), read on a figure cache miss.
+
+    The builders of the heatmaps and their drill-downs take the days of the
+    date range slider last: None for all the days, the figures prebuilt,
+    or (first, last) days since epoch.
+    The heatmaps of a range are read from the cumulative counts (see
+    cumulative.py), the drill-downs keep the cells of the range.
+'''
+
+import numpy as np
+
+import bar_charts
+import compact
+import cube
+import cumulative
+import dot_charts
+import flows
+import figure_cache
+import figure_store
+import heatmap
+import line_charts
+import metrics
+import preprocess
+import sankey_charts
+
+
+# height of the heatmap of the harbours of a region, and of each of its rows.
+HARBOUR_HEAT_HEIGHT = 450
+HARBOUR_ROW_HEIGHT = 18
+
+# directory of the figure store, None if there is none, see set_store.
+_store = {"dir": None}
+
+
+def _get_total(dataset, days):
+    '''
+    Returns:
+        The number of voyages in the date range, the percentages of the
+        heatmaps are shares of it.
+    '''
+
+    if days is None:
+        return dataset["total_voyage0"]
+
+    return cumulative.get_stats(dataset["cumulative"]["trips"], days)[0]["count"]
+
+
+def get_region_heat(dataset, direction_chosen, days=None):
+    '''
+    Builds the heatmap of the voyages by region and year.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        direction_chosen: departure, arrival or both (0,1,2)
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The heatmap.
+    '''
+
+    with metrics.phase("data"):
+        if days is None:
+            yearly_df = preprocess.summarize_yearly_counts(dataset["cube"], direction_chosen)  # 0 means Departure
+            data = preprocess.restructure_df(yearly_df)
+        else:
+            data = preprocess.get_yearly_counts_in_range(
+                dataset["cumulative"]["region"],
+                [(direction,) for direction in cube.get_directions(direction_chosen)], days, "Region")
+
+    with metrics.phase("figure"):
+        return heatmap.get_figure(data, direction_chosen, _get_total(dataset, days))
+
+
+def get_vessel_heat(dataset, vessel_chosen, days=None):
+    '''
+    Builds the heatmap of the voyages using a type of vessel.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        vessel_chosen: one type of vessel
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The heatmap.
+    '''
+
+    trip_direction = 2  # display depart + arrive
+
+    with metrics.phase("data"):
+        if days is None:
+            yearly_df = preprocess.summarize_yearly_counts(dataset["cube"], trip_direction, vessel_chosen)
+            data = preprocess.restructure_df(yearly_df)
+        else:
+            data = preprocess.get_yearly_counts_in_range(
+                dataset["cumulative"]["vessel"],
+                [(direction, vessel_chosen) for direction in cube.get_directions(trip_direction)], days, "Region")
+
+    with metrics.phase("figure"):
+        return heatmap.get_figure(data, trip_direction, _get_total(dataset, days))
+
+
+def get_harbour_heat(dataset, region, direction_chosen, days=None):
+    '''
+    Builds the heatmap of the voyages of each harbour of a region by year,
+    from the yearly counts built at load: its cost does not depend on the
+    number of cells of the region.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        region: name of the region
+        direction_chosen: departure, arrival or both (0,1,2)
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The heatmap, its height grows with the number of harbours.
+    '''
+
+    with metrics.phase("data"):
+        if days is None:
+            data = preprocess.get_harbour_yearly_counts(dataset["harbour_years"], region, direction_chosen)
+        else:
+            data = preprocess.get_yearly_counts_in_range(
+                dataset["cumulative"]["harbour"],
+                [(direction, region) for direction in cube.get_directions(direction_chosen)], days, "Harbour")
+
+    with metrics.phase("figure"):
+        fig = heatmap.get_figure(data, direction_chosen, _get_total(dataset, days), level="Harbour")
+        fig.update_layout(title_text="{} - {}".format(fig.layout.title.text, region),
+                          height=max(HARBOUR_HEAT_HEIGHT, HARBOUR_ROW_HEIGHT * data.shape[0] + 150))
+
+    return fig
+
+
+def get_region_frequencies(dataset, region, year, direction_chosen, days=None):
+    '''
+    Builds the daily and monthly charts of a cell of the region heatmap.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        region: name of the region
+        year: year
+        direction_chosen: departure, arrival or both (0,1,2)
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The daily line chart and the monthly bar chart, packed.
+    '''
+
+    with metrics.phase("data"):
+        # daily trip line chart
+        line_data = preprocess.get_data_by_freq(dataset["cube"], region, year, direction_chosen, "daily", days)
+
+        # monthly trip bar chart
+        bar_data = preprocess.get_data_by_freq(dataset["cube"], region, year, direction_chosen, "monthly", days)
+
+    with metrics.phase("figure"):
+        line_fig = line_charts.get_region_figure(line_data, region, year, direction_chosen)
+        bar_fig = bar_charts.get_region_figure(bar_data, region, year, direction_chosen)
+
+    return pack_frequencies(line_fig, bar_fig)
+
+
+def get_harbour_bar(dataset, region, harbour, days=None):
+    '''
+    Builds the stacked bar of the departures and arrivals of a harbour by year.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        region: name of the region
+        harbour: name of a harbour of the region
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The stacked bar, a message if the harbour has no voyage.
+    '''
+
+    with metrics.phase("data"):
+        stack_bar_data = preprocess.prepare_data_by_harbour(dataset["cube"], region, harbour, days)
+
+    if stack_bar_data.shape[0] < 1:
+        return bar_charts.get_empty_figure()
+
+    with metrics.phase("figure"):
+        return bar_charts.get_harbour_figure_year(stack_bar_data, region, harbour)
+
+
+def get_harbour_frequencies(dataset, region, harbour, trip_direction, year, days=None):
+    '''
+    Builds the daily and monthly charts of a bar of the harbour stacked bar.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        region: name of the region
+        harbour: name of a harbour of the region
+        trip_direction: departure or arrival (0,1)
+        year: year
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The daily line chart and the monthly bar chart, packed.
+    '''
+
+    with metrics.phase("data"):
+        # daily trip line chart
+        line_data = preprocess.prepare_day_month_data_by_harbour(dataset["cube"], region, harbour,
+                                                                 trip_direction, year, "daily", days)
+
+        # monthly trip bar chart
+        bar_data = preprocess.prepare_day_month_data_by_harbour(dataset["cube"], region, harbour,
+                                                                trip_direction, year, "monthly", days)
+
+    with metrics.phase("figure"):
+        line_fig = line_charts.get_region_figure(line_data, region, year, trip_direction, harbour=harbour)
+        bar_fig = bar_charts.get_region_figure(bar_data, region, year, trip_direction, harbour=harbour)
+
+    return pack_frequencies(line_fig, bar_fig)
+
+
+def get_vessel_dots(dataset, vessel_chosen, region, year, days=None):
+    '''
+    Builds the dot plot of the voyages of a type of vessel in the harbours
+    of a region, for a cell of the vessel heatmap.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        vessel_chosen: one type of vessel
+        region: name of the region
+        year: year
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The dot plot.
+    '''
+
+    with metrics.phase("data"):
+        dotplot_data = preprocess.get_vessel_harbour(dataset["cube"], vessel_chosen, region, year, days)
+
+    if dotplot_data.empty:
+        return dot_charts.get_empty_figure()
+
+    with metrics.phase("figure"):
+        return dot_charts.get_vesselport_figure(dotplot_data, region, year)
+
+
+def get_flows(dataset, level, vessel_chosen, region, years):
+    '''
+    Builds the Sankey diagram of the voyages between regions or harbours,
+    from the flows counted at load (see flows.py): its cost does not
+    depend on the number of trips.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        level: "region" or "harbour"
+        vessel_chosen: one type of vessel, all types if None
+        region: the voyages leaving from or arriving in this region, all if None
+        years: (first, last) departure years (inclusive)
+    Returns:
+        The Sankey diagram, a message if there is no voyage.
+    '''
+
+    with metrics.phase("data"):
+        flow_data = flows.get_flows(dataset["flows"], level, tuple(years), vessel_chosen, region)
+
+    if flow_data.shape[0] < 1:
+        return sankey_charts.get_empty_figure()
+
+    with metrics.phase("figure"):
+        title = "VOYAGES BETWEEN {}S, {} to {}".format(level.upper(), *years)
+        if vessel_chosen is not None:
+            title += " - {}".format(vessel_chosen)
+        if region is not None:
+            title += " - {}".format(region)
+        return sankey_charts.get_flow_figure(flow_data, title)
+
+
+BUILDERS = {
+    "region_heat": get_region_heat,
+    "vessel_heat": get_vessel_heat,
+    "harbour_heat": get_harbour_heat,
+    "region_frequencies": get_region_frequencies,
+    "harbour_bar": get_harbour_bar,
+    "harbour_frequencies": get_harbour_frequencies,
+    "vessel_dots": get_vessel_dots,
+    "flows": get_flows,
+}
+
+
+# builder -> figure shown when the clicked cell or bar has no voyage, or nothing is clicked.
+EMPTY_FIGURES = {
+    "region_frequencies": lambda: pack_frequencies(line_charts.get_empty_figure("region_page"),
+                                                   line_charts.get_empty_figure("region_page")),
+    "harbour_bar": bar_charts.get_empty_figure,
+    "harbour_frequencies": lambda: pack_frequencies(line_charts.get_empty_figure("harbour_page"),
+                                                    line_charts.get_empty_figure("harbour_page")),
+    "vessel_dots": dot_charts.get_empty_figure,
+}
+
+
+def get_default_region(dataset):
+    '''
+    Args:
+        dataset: the dataset, see dataset.py
+    Returns:
+        The region with the most voyages, its harbours are shown before
+        a region is clicked. None if there is no region.
+    '''
+
+    totals = dataset["catalog"]["totals"]
+
+    return max(sorted(totals), key=lambda name: sum(totals[name].values()), default=None)
+
+
+def set_store(store_dir):
+    '''
+    Sets the figure store read on a figure cache miss.
+
+    Args:
+        store_dir: directory of the store, see figure_store.py, None for no store
+    '''
+
+    _store["dir"] = store_dir
+
+
+def _load_or_build(name, dataset, inputs):
+    '''
+    Returns:
+        The figure from the figure store, built if it is not stored, and
+        where it came from: "store" or "miss".
+    '''
+
+    figure = figure_store.load(_store["dir"], figure_cache.make_key(name, dataset["version"], *inputs))
+    if figure is not None:
+        return figure, "store"
+
+    return BUILDERS[name](dataset, *inputs), "miss"
+
+
+def get_cached(name, dataset, *inputs):
+    '''
+    Returns a figure from the figure cache, reading it from the figure
+    store or building it on a miss.
+
+    Args:
+        name: name of the builder, see BUILDERS
+        dataset: the dataset, see dataset.py
+        inputs: the inputs of the builder
+    Returns:
+        The figure, a dict if it was read from the store.
+    '''
+
+    key = figure_cache.make_key(name, dataset["version"], *inputs)
+    figure = figure_cache.get(key)
+    if figure is not None:
+        metrics.add_figure_lookup("hit")
+        return figure
+
+    figure, result = _load_or_build(name, dataset, inputs)
+    metrics.add_figure_lookup(result)
+    figure_cache.put(key, figure)
+
+    return figure
+
+
+def get_input_space(dataset):
+    '''
+    Enumerates the inputs of every figure the callbacks can show: the
+    heatmaps, and the drill-downs of their cells and of the harbour bars
+    having voyages (the empty ones show a message, see app.py), over all
+    the days: the figures of a date range and the flows are built on
+    request.
+
+    Args:
+        dataset: the dataset, see dataset.py
+    Yields:
+        (name of the builder, inputs) of each figure.
+    '''
+
+    for name, inputs in _get_full_input_space(dataset):
+        yield name, inputs + (None,)
+
+
+def _get_full_input_space(dataset):
+    '''
+    Yields:
+        (name of the builder, inputs but the days) of each figure over
+        all the days, see get_input_space.
+    '''
+
+    harbour_years = dataset["harbour_years"]
+    years = [int(year) for year in harbour_years["years"]]
+
+    for direction in (0, 1, 2):
+        yield "region_heat", (direction,)
+    for vessel in dataset["vessel_type_sorted"]:
+        yield "vessel_heat", (vessel,)
+
+    for region, counts in harbour_years["regions"].items():
+        for direction in (0, 1, 2):
+            yield "harbour_heat", (region, direction)
+        # (direction, harbour, year) -> the region has voyages that year.
+        by_year = counts["counts"].sum(axis=1)
+        for direction, voyages in ((0, by_year[0]), (1, by_year[1]), (2, by_year.sum(axis=0))):
+            for position in np.flatnonzero(voyages):
+                yield "region_frequencies", (region, years[position], direction)
+        for number, harbour in enumerate(counts["harbours"]):
+            yield "harbour_bar", (region, harbour)
+            for direction, position in zip(*np.nonzero(counts["counts"][:, number])):
+                yield "harbour_frequencies", (region, harbour, int(direction), years[position])
+
+    data_cube = dataset["cube"]
+    rows = cube.select(data_cube, [cube.DEPARTURE, cube.ARRIVAL])
+    for vessel, region, year in cube.aggregate(data_cube, rows, ["vessel", "region", "year"]).index:
+        if vessel >= 0 and region >= 0:
+            yield "vessel_dots", (data_cube["vessels"][vessel], data_cube["regions"][region], int(year))
+
+
+def prefill_heatmaps(dataset):
+    '''
+    Puts every heatmap of a dataset in the figure cache, read from the
+    figure store or built.
+
+    Args:
+        dataset: the dataset, see dataset.py
+    '''
+
+    inputs = [("region_heat", (direction, None)) for direction in (0, 1, 2)] + \
+        [("vessel_heat", (vessel, None)) for vessel in dataset["vessel_type_sorted"]]
+    for name, heat_inputs in inputs:
+        key = figure_cache.make_key(name, dataset["version"], *heat_inputs)
+        figure_cache.put(key, _load_or_build(name, dataset, heat_inputs)[0])
+
+
+def pack_frequencies(daily_fig, monthly_fig):
+    '''
+    Packs the daily and the monthly figures of a selection in one payload,
+    the toggle picks one of them in the browser (see assets/clientside.js).
+    Their common layout template is sent once, their integer arrays as
+    typed arrays (see compact.py).
+
+    Args:
+        daily_fig: the figure of the daily counts
+        monthly_fig: the figure of the monthly counts
+    Returns:
+        dict with the "daily" and "monthly" figures, without template, and the "template".
+    '''
+
+    daily = compact.encode_traces(daily_fig.to_plotly_json())
+    monthly = compact.encode_traces(monthly_fig.to_plotly_json())
+    template = daily["layout"].pop("template", None)
+    monthly["layout"].pop("template", None)
+
+    return {"daily": daily, "monthly": monthly, "template": template}
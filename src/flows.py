@@ -0,0 +1,268 @@
+'''
+    Origin-destination flows: the voyages between regions and between
+    harbours.
+
+    The trips are counted once, at load, by departure year, vessel type,
+    origin and destination, at two levels: region to region, and harbour
+    to harbour (each harbour with its region). The codes of a trip are
+    packed into one integer key and the keys are counted with a bincount
+    over their unique values: only the non-empty pairs are kept, most
+    harbour pairs never see a voyage. The pairs are sorted by (year, vessel
+    type, origin, destination), so the pairs of a year and a vessel type
+    are contiguous and found by binary search: the matrix of any filter
+    (years, vessel type, region) sums a few slices, see get_flows.
+
+    The counts are sums, so the flows of new trips are merged into the
+    flows of the previous ones pair by pair (see merge_flows).
+
+    The flows page draws them as a Sankey diagram, /api/flows returns them.
+'''
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+import encoding
+
+
+# level -> (kind of the names, columns of the origin, columns of the destination), region first.
+LEVELS = {
+    "region": ("regions", ("Departure Region",), ("Arrival Region",)),
+    "harbour": ("harbours", ("Departure Region", "Departure Hardour"), ("Arrival Region", "Arrival Hardour")),
+}
+
+
+def _get_dims(years, names, level):
+    '''
+    Returns:
+        The sizes of (year, vessel, origin codes, destination codes) of the
+        keys of a level, codes shifted by one.
+    '''
+
+    sizes = (len(names["regions"]) + 1,) if level == "region" else \
+        (len(names["regions"]) + 1, len(names["harbours"]) + 1)
+
+    return (years, len(names["vessels"]) + 1) + sizes + sizes
+
+
+def _make_pairs(keys, counts, dims):
+    '''
+    Unpacks the keys of the non-empty pairs of a level.
+
+    Args:
+        keys: sorted keys of the pairs, packed over dims
+        counts: number of voyages of each pair
+        dims: sizes of the packed codes, see _get_dims
+    Returns:
+        dict with the "keys", "dims" and "counts" of the pairs, and the
+        codes of their "year" (from the first year), "vessel", "origin"
+        and "destination" (and "origin_region" and "destination_region"
+        for the harbours), -1 if missing.
+    '''
+
+    codes = np.unravel_index(keys, dims)
+    pairs = {"keys": keys, "dims": dims, "counts": counts,
+             "year": codes[0].astype(np.int32), "vessel": codes[1].astype(np.int32) - 1}
+    if len(dims) == 4:
+        pairs["origin"], pairs["destination"] = codes[2].astype(np.int32) - 1, codes[3].astype(np.int32) - 1
+    else:
+        pairs["origin_region"], pairs["origin"] = codes[2].astype(np.int32) - 1, codes[3].astype(np.int32) - 1
+        pairs["destination_region"], pairs["destination"] = \
+            codes[4].astype(np.int32) - 1, codes[5].astype(np.int32) - 1
+
+    return pairs
+
+
+def _count(keys, weights=None):
+    '''
+    Returns:
+        The unique keys, sorted, and the sum of the weights (1 each if None) of each.
+    '''
+
+    keys, pairs = np.unique(keys, return_inverse=True)
+    counts = np.bincount(pairs.reshape(-1), weights=weights, minlength=keys.shape[0])
+
+    return keys, counts.astype(np.int64)
+
+
+def build_flows(trips_df):
+    '''
+    Counts the voyages by departure year, vessel type, origin and
+    destination, between regions and between harbours.
+
+    Args:
+        trips_df: the trips, dates converted and names encoded
+    Returns:
+        The flows, a dict with the "first_year", the number of "years",
+        the names of the "regions", "harbours" and "vessels", and the
+        non-empty pairs of each level, see _make_pairs.
+    '''
+
+    names = {"regions": list(trips_df["Departure Region"].cat.categories),
+             "harbours": list(trips_df["Departure Hardour"].cat.categories),
+             "vessels": list(trips_df["Vessel Type"].cat.categories)}
+    year = trips_df["Departure Date"].values.astype("M8[Y]").astype(np.int64) + 1970
+    first_year = int(year.min()) if year.shape[0] else 0
+    years = int(year.max()) - first_year + 1 if year.shape[0] else 1
+
+    flows = dict(names, first_year=first_year, years=years)
+    vessel = trips_df["Vessel Type"].cat.codes.to_numpy().astype(np.int64) + 1
+    for level, (_, origin_columns, destination_columns) in LEVELS.items():
+        dims = _get_dims(years, names, level)
+        codes = [year - first_year, vessel] + [trips_df[column].cat.codes.to_numpy().astype(np.int64) + 1
+                                               for column in origin_columns + destination_columns]
+        flows[level] = _make_pairs(*_count(np.ravel_multi_index(codes, dims)), dims)
+
+    return flows
+
+
+def merge_flows(flows, other):
+    '''
+    Adds the flows of two sets of trips, e.g. the loaded trips and newly
+    received ones. Only the pairs are merged, the trips are not counted
+    again. The names may differ: the merged flows use their sorted union.
+
+    Args:
+        flows: the flows of some trips
+        other: the flows of other trips
+    Returns:
+        The merged flows.
+    '''
+
+    names = {kind: sorted(set(flows[kind]) | set(other[kind])) for kind in ("regions", "harbours", "vessels")}
+    parts = [part for part in (flows, other) if part["region"]["keys"].shape[0]]
+    first_year = min([part["first_year"] for part in parts], default=0)
+    years = max([part["first_year"] + part["years"] for part in parts], default=first_year + 1) - first_year
+
+    merged = dict(names, first_year=first_year, years=years)
+    for level, (kind, origin_columns, _) in LEVELS.items():
+        dims = _get_dims(years, names, level)
+        # codes of each part -> codes of the union, shifted by one, -1 (missing) is kept.
+        kinds = ["regions", kind][:len(origin_columns)]
+        keys = []
+        for part in parts:
+            pairs = part[level]
+            remaps = {name: encoding.get_remap(part[name], names[name]) + 1 for name in names}
+            values = [pairs["year"] + part["first_year"] - first_year, remaps["vessels"][pairs["vessel"]]]
+            for end in ("origin", "destination"):
+                columns = [end + "_region", end] if len(kinds) == 2 else [end]
+                values += [remaps[name][pairs[column]] for name, column in zip(kinds, columns)]
+            keys.append(np.ravel_multi_index(values, dims))
+        keys, counts = _count(np.concatenate(keys) if keys else np.empty(0, dtype=np.int64),
+                              np.concatenate([part[level]["counts"] for part in parts] or [[]]))
+        merged[level] = _make_pairs(keys, counts, dims)
+
+    return merged
+
+
+def get_years(flows):
+    '''
+    Returns:
+        The first and last departure years counted.
+    '''
+
+    return flows["first_year"], flows["first_year"] + flows["years"] - 1
+
+
+def select(flows, level, years=None, vessel=None):
+    '''
+    Finds the pairs of some years and a vessel type, by binary search.
+
+    Args:
+        flows: the flows, see build_flows
+        level: "region" or "harbour"
+        years: (first, last) departure years (inclusive), all years if None
+        vessel: a vessel type, all types if None
+    Returns:
+        numpy array with the positions of the pairs.
+    '''
+
+    pairs = flows[level]
+    first, last = get_years(flows) if years is None else years
+    first, last = max(first, flows["first_year"]), min(last, get_years(flows)[1])
+    if vessel is not None and vessel not in flows["vessels"]:
+        return np.empty(0, dtype=np.int64)
+
+    vessel_stride = int(np.prod(pairs["dims"][2:]))
+    year_stride = pairs["dims"][1] * vessel_stride
+    if vessel is None:
+        lows = [year * year_stride for year in range(first - flows["first_year"], last - flows["first_year"] + 1)]
+        size = year_stride
+    else:
+        code = flows["vessels"].index(vessel) + 1
+        lows = [year * year_stride + code * vessel_stride
+                for year in range(first - flows["first_year"], last - flows["first_year"] + 1)]
+        size = vessel_stride
+
+    bounds = np.searchsorted(pairs["keys"], np.array([[low, low + size] for low in lows], dtype=np.int64)
+                             .reshape(-1, 2))
+    return np.concatenate([np.arange(start, stop) for start, stop in bounds] or [np.empty(0, dtype=np.int64)])
+
+
+def get_flows(flows, level, years=None, vessel=None, region=None):
+    '''
+    Computes the origin-destination matrix of a filter, as its non-empty
+    pairs.
+
+    Args:
+        flows: the flows, see build_flows
+        level: "region" or "harbour"
+        years: (first, last) departure years (inclusive), all years if None
+        vessel: a vessel type, all types if None
+        region: the voyages leaving from or arriving in this region, all if None
+    Returns:
+        dataframe with the Origin, the Destination and the Counts of the
+        voyages, sorted by decreasing counts. The unknown names are left out.
+    '''
+
+    pairs = flows[level]
+    rows = select(flows, level, years, vessel)
+    if region is not None:
+        code = flows["regions"].index(region) if region in flows["regions"] else -2
+        columns = ("origin", "destination") if level == "region" else ("origin_region", "destination_region")
+        rows = rows[(pairs[columns[0]][rows] == code) | (pairs[columns[1]][rows] == code)]
+    rows = rows[(pairs["origin"][rows] >= 0) & (pairs["destination"][rows] >= 0)]
+
+    # the same pair over several years or vessel types is summed.
+    size = len(flows[LEVELS[level][0]])
+    keys, counts = _count(pairs["origin"][rows].astype(np.int64) * size + pairs["destination"][rows],
+                          pairs["counts"][rows])
+    names = np.array(flows[LEVELS[level][0]], dtype=object)
+    flow_data = pd.DataFrame({"Origin": names[keys // size], "Destination": names[keys % size], "Counts": counts})
+
+    return flow_data.sort_values(by=["Counts", "Origin", "Destination"], ascending=[False, True, True],
+                                 ignore_index=True)
+
+
+def register_routes(server, get_dataset):
+    '''
+    Adds the /api/flows endpoint to the Flask server. It returns the
+    voyages between the regions (level=region, the default) or the
+    harbours (level=harbour), for the optional parameters vessel_type,
+    region, start and end (years).
+
+    Args:
+        server: the Flask server of the Dash app
+        get_dataset: function returning the current dataset, None while loading
+    '''
+
+    @server.route("/api/flows")
+    def flows():  # pylint: disable=unused-variable
+        dataset = get_dataset()
+        if dataset is None:
+            return jsonify({"status": "loading"}), 503
+
+        level = request.args.get("level", "region")
+        if level not in LEVELS:
+            return jsonify({"error": "level is region or harbour"}), 400
+
+        years = None
+        if "start" in request.args or "end" in request.args:
+            years = (request.args.get("start", 0, type=int), request.args.get("end", 9999, type=int))
+
+        flow_data = get_flows(dataset["flows"], level, years, request.args.get("vessel_type"),
+                              request.args.get("region"))
+
+        return jsonify({"level": level,
+                        "flows": [{"origin": origin, "destination": destination, "voyages": int(counts)}
+                                  for origin, destination, counts in flow_data.itertuples(index=False)]})
@@ -4,9 +4,10 @@ import plotly.graph_objects as go
 from template import THEME
 import hover_template
 import numpy as np
+import compact
 
 
-def get_figure(data, direction, total_voyage):
+def get_figure(data, direction, total_voyage, level="Region"):
     '''
     Generates a heatmap from the given dataset.
 
@@ -14,6 +15,7 @@ def get_figure(data, direction, total_voyage):
         data: The data to display
         direction: departure, arrival or both
         total_voyage: total number of voyage
+        level: what the rows are, "Region" or "Harbour"
     Returns:
         The figure to be displayed.
     '''
@@ -25,12 +27,12 @@ def get_figure(data, direction, total_voyage):
 
 
     fig = go.Figure(data=go.Heatmap(
-        z=np.log10(data),
+        z=compact.round_colors(np.log10(data)),
         x=xticklabel,
         y=yticklabel,
         colorbar_title="Voyage<br>(powers of 10)",
         customdata=round(data / total_voyage * 100, 2),
-        text = data
+        text = compact.to_integers(data)
     ))
 
 
@@ -38,15 +40,15 @@ def get_figure(data, direction, total_voyage):
 
     if direction == 0:
         fig.update_traces(colorscale=THEME["departure_colorscales"])
-        fig.update_layout(title_text="DEPARTURE BY REGION and YEAR")
+        fig.update_layout(title_text="DEPARTURE BY {} and YEAR".format(level.upper()))
     elif direction == 1:
         fig.update_traces(colorscale=THEME["arrival_colorscales"])
-        fig.update_layout(title_text="ARRIVAL BY REGION and YEAR")
+        fig.update_layout(title_text="ARRIVAL BY {} and YEAR".format(level.upper()))
     else:
-        fig.update_layout(title_text="VOYAGE BY REGION and YEAR")
+        fig.update_layout(title_text="VOYAGE BY {} and YEAR".format(level.upper()))
 
     fig.update_traces(
-        hovertemplate = hover_template.get_heatmap_hover_template()
+        hovertemplate = hover_template.get_heatmap_hover_template(level)
     )
 
     return fig
@@ -2,11 +2,11 @@
     templates for the tooltips.
 '''
 
-def get_heatmap_hover_template():
+def get_heatmap_hover_template(level="Region"):
     '''
     template for the hover tooltips in the heatmap.
     the tooltip includes:
-        Region name
+        Region (or Harbour) name
         year
         Voyage: number of voyage
         %:  (number of voyage in a region in a year) / (total voyage)
@@ -14,7 +14,7 @@ def get_heatmap_hover_template():
     '''
 
     hovertext = [
-            "<span style='font-family:Open Sans; font-size:16px'> <b>Region: </b>%{y}</span>",
+            "<span style='font-family:Open Sans; font-size:16px'> <b>" + level + ": </b>%{y}</span>",
             "<span style='font-family:Open Sans'> <b>Year: </b> %{x}</span>",
             "<span style='font-family:Open Sans'> <b>Voyage: </b> %{text} (%{customdata}%)</span> ",
             "<extra></extra>"
@@ -118,6 +118,20 @@ def get_map_hover_template():
     return template
 
 
+def get_overlay_map_hover_template():
+
+    '''
+    template for hover tooltip of the map of several trips.
+    the tooltip includes the trip Id (the meta of its trace),
+    then the same values as the itinerary map.
+
+    '''
+
+    trip = "<span style='font-family:Open Sans'> <b>Trip: </b>%{meta}</span>"
+
+    return trip + "<br>" + get_map_hover_template()
+
+
 def get_vesselport_hover_template():
     '''
     template for hover tooltip of the dot plot.
@@ -136,3 +150,24 @@ def get_vesselport_hover_template():
 
     return template
 
+
+
+def get_flow_hover_template():
+    '''
+    template for hover tooltip of the links of the Sankey diagram.
+    the tooltip includes:
+        Origin and destination
+        voyage: Number of voyage
+        %:  (number of voyage between them) / (total voyage shown)
+    '''
+
+    hovertext = [
+            "<span style='font-family:Open Sans'> <b>From: </b>%{source.label}</span>",
+            "<span style='font-family:Open Sans'> <b>To: </b>%{target.label}</span>",
+            "<span style='font-family:Open Sans'> <b>Voyage: </b> %{value} (%{customdata}%)</span>",
+            "<extra></extra>"
+        ]
+
+    template = "<br>".join(hovertext)
+
+    return template
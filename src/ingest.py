@@ -0,0 +1,122 @@
+'''
+    Streaming ingestion of the source CSVs.
+
+    The sources (up to the full TRIP_NEW.csv and TRIP_DETAIL_NEW.csv) are
+    read in chunks of a bounded number of rows. Each chunk keeps only the
+    columns used by the app, gets its dates parsed and the year window
+    applied, so the memory used depends on the chunk size, not on the size
+    of the file. The chunks are consumed one at a time, e.g. by the
+    snapshot writer (see snapshot.py).
+'''
+
+import numpy as np
+import pandas as pd
+
+import encoding
+import preprocess
+
+
+CHUNK_SIZE = 250000
+
+
+def read_chunks(source, columns, chunksize=CHUNK_SIZE):
+    '''
+    Reads a CSV in chunks, keeping only some columns.
+
+    Args:
+        source: path or url of the CSV
+        columns: the columns to keep
+        chunksize: number of rows per chunk
+    Returns:
+        An iterator of dataframes.
+    '''
+
+    return pd.read_csv(source, usecols=columns, chunksize=chunksize)
+
+
+def stream_trips(source, start, end, chunksize=CHUNK_SIZE):
+    '''
+    Reads the trips in chunks, with dates parsed and years filtered.
+
+    Args:
+        source: path or url of the trips CSV
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+        chunksize: number of rows per chunk
+    Yields:
+        The retained trips of each chunk.
+    '''
+
+    for chunk in read_chunks(source, preprocess.TRIP_COLUMNS, chunksize):
+        chunk = preprocess.convert_dates(chunk)
+        yield preprocess.filter_years(chunk, start, end)
+
+
+def stream_passages(source, chunksize=CHUNK_SIZE):
+    '''
+    Reads the passages in chunks.
+
+    Args:
+        source: path or url of the passages CSV
+        chunksize: number of rows per chunk
+    Yields:
+        The passages of each chunk.
+    '''
+
+    for chunk in read_chunks(source, preprocess.PASSAGE_COLUMNS, chunksize):
+        yield preprocess.convert_dates(chunk)
+
+
+def new_dictionaries():
+    '''
+    Returns:
+        Empty growing dictionaries, kind -> {name: code}.
+    '''
+
+    return {kind: {} for kind in set(encoding.ENCODED_COLUMNS.values())}
+
+
+def encode_chunk(chunk, dictionaries):
+    '''
+    Replaces the names of a chunk by codes. New names get the next free
+    code, so the codes of the previous chunks do not change.
+
+    Args:
+        chunk: The dataframe to process
+        dictionaries: growing dictionaries, kind -> {name: code}, updated
+    Returns:
+        The chunk with int32 code columns (-1 for missing values).
+    '''
+
+    for column, kind in encoding.ENCODED_COLUMNS.items():
+        if column not in chunk.columns:
+            continue
+        codes = dictionaries[kind]
+        for name in chunk[column].dropna().unique():
+            codes.setdefault(name, len(codes))
+        chunk[column] = pd.Index(list(codes)).get_indexer(chunk[column]).astype(np.int32)
+
+    return chunk
+
+
+def sort_dictionaries(dictionaries):
+    '''
+    Sorts the growing dictionaries once all the chunks are read.
+
+    Args:
+        dictionaries: growing dictionaries, kind -> {name: code}
+    Returns:
+        The sorted dictionaries (kind -> sorted list of names) and, for each
+        kind, the array mapping a growing code to its sorted code.
+    '''
+
+    sorted_dictionaries = {}
+    remaps = {}
+    for kind, codes in dictionaries.items():
+        names = sorted(codes)
+        remap = np.empty(len(codes), dtype=np.int32)
+        remap[[codes[name] for name in names]] = np.arange(len(names), dtype=np.int32)
+        sorted_dictionaries[kind] = names
+        remaps[kind] = remap
+
+    return sorted_dictionaries, remaps
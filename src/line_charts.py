@@ -1,6 +1,7 @@
 
 import plotly.graph_objects as go
 import hover_template
+import compact
 
 from template import THEME
 
@@ -51,10 +52,12 @@ def get_region_figure(line_data, region, year, trip_direction, harbour=""):
 
     total_counts = line_data.Counts.sum()
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=line_data.Date, y=line_data.Counts,
+    fig.add_trace(go.Scatter(y=compact.to_integers(line_data.Counts),
                              mode="lines",
                              customdata=round(line_data.Counts / total_counts * 100, 2)
                              ))
+    # a start and a step instead of 365 dates.
+    compact.set_dates(fig.data[0], line_data.Date)
 
     num_xticks = len(line_data.Date.dt.month.unique())
 
@@ -65,6 +68,7 @@ def get_region_figure(line_data, region, year, trip_direction, harbour=""):
 
     fig.update_layout(
         xaxis_tickformat='%d %b',
+        xaxis_type='date',
         yaxis_title="Number of voyages",
         xaxis_title=""
     )
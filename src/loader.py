@@ -0,0 +1,193 @@
+'''
+    Loads the datasets in a background thread.
+
+    The server starts accepting requests right away, the callbacks ask the
+    loader for the dataset and show a placeholder while it is not ready.
+    /healthz tells if the process is alive, /readyz if the dataset is loaded.
+'''
+
+import threading
+import time
+import traceback
+
+from flask import jsonify
+
+
+# seconds before a failed reload is tried again, doubled after each failure up to MAX_RELOAD_BACKOFF.
+RELOAD_BACKOFF = 30
+MAX_RELOAD_BACKOFF = 3600
+
+_state = {
+    "status": "starting",  # starting, loading, ready or failed
+    "dataset": None,
+    "error": None,
+    "started": None,
+    "loaded": None,
+    "reload": {"status": None, "error": None, "failures": 0, "retry": None},  # status: None, loading or failed
+}
+_lock = threading.Lock()
+
+
+def _load(build):
+    '''
+    Builds the dataset and records the outcome.
+
+    Args:
+        build: function returning the dataset
+    '''
+
+    try:
+        dataset = build()
+    except Exception:  # pylint: disable=broad-except
+        with _lock:
+            _state["status"] = "failed"
+            _state["error"] = traceback.format_exc()
+        print(_state["error"])
+        return
+
+    set_dataset(dataset)
+
+
+def start(build):
+    '''
+    Starts building the dataset in a background thread.
+
+    Args:
+        build: function returning the dataset
+    Returns:
+        The loading thread.
+    '''
+
+    with _lock:
+        _state["status"] = "loading"
+        _state["started"] = time.time()
+
+    thread = threading.Thread(target=_load, args=(build,), name="dataset-loader", daemon=True)
+    thread.start()
+
+    return thread
+
+
+def _reload(build):
+    '''
+    Builds a new dataset and records the outcome apart from the served one.
+
+    Args:
+        build: function returning the dataset
+    '''
+
+    try:
+        dataset = build()
+    except Exception:  # pylint: disable=broad-except
+        with _lock:
+            state = _state["reload"]
+            state["status"] = "failed"
+            state["error"] = traceback.format_exc()
+            state["failures"] += 1
+            state["retry"] = time.time() + min(RELOAD_BACKOFF * 2 ** (state["failures"] - 1), MAX_RELOAD_BACKOFF)
+        print(state["error"])
+        return
+
+    with _lock:
+        _state["reload"] = {"status": None, "error": None, "failures": 0, "retry": None}
+    set_dataset(dataset)
+
+
+def reload(build):
+    '''
+    Starts building a dataset replacing the served one in a background
+    thread, unless one is being built or the last one failed less than its
+    backoff ago.
+
+    Args:
+        build: function returning the dataset
+    Returns:
+        The loading thread, None if skipped.
+    '''
+
+    with _lock:
+        state = _state["reload"]
+        if state["status"] == "loading" or (state["retry"] is not None and time.time() < state["retry"]):
+            return None
+        state["status"] = "loading"
+
+    thread = threading.Thread(target=_reload, args=(build,), name="dataset-reloader", daemon=True)
+    thread.start()
+
+    return thread
+
+
+def set_dataset(dataset):
+    '''
+    Makes a dataset the current one.
+
+    Args:
+        dataset: the dataset, a dict (see dataset.py)
+    '''
+
+    with _lock:
+        _state["dataset"] = dataset
+        _state["status"] = "ready"
+        _state["error"] = None
+        _state["loaded"] = time.time()
+
+
+def get_dataset():
+    '''
+    Returns:
+        The current dataset, None while it is loading.
+    '''
+
+    return _state["dataset"]
+
+
+def is_ready():
+    '''
+    Returns:
+        True once a dataset is loaded.
+    '''
+
+    return _state["dataset"] is not None
+
+
+def get_status():
+    '''
+    Returns:
+        dict describing the state of the loader.
+    '''
+
+    with _lock:
+        dataset = _state["dataset"]
+        status = {"status": _state["status"],
+                  "version": dataset["version"] if dataset is not None else None}
+        if _state["started"] is not None:
+            status["load_seconds"] = round((_state["loaded"] or time.time()) - _state["started"], 2)
+        if _state["error"] is not None:
+            status["error"] = _state["error"].strip().splitlines()[-1]
+        state = _state["reload"]
+        if state["status"] is not None:
+            status["reload"] = {"status": state["status"], "failures": state["failures"]}
+            if state["error"] is not None:
+                status["reload"]["error"] = state["error"].strip().splitlines()[-1]
+                status["reload"]["retry_seconds"] = max(round(state["retry"] - time.time(), 2), 0)
+
+    return status
+
+
+def register_routes(server):
+    '''
+    Adds the /healthz and /readyz endpoints to the Flask server.
+
+    Args:
+        server: the Flask server of the Dash app
+    '''
+
+    @server.route("/healthz")
+    def healthz():  # pylint: disable=unused-variable
+        status = get_status()
+        return jsonify(status), 500 if status["status"] == "failed" else 200
+
+    @server.route("/readyz")
+    def readyz():  # pylint: disable=unused-variable
+        status = get_status()
+        return jsonify(status), 200 if is_ready() else 503
@@ -0,0 +1,269 @@
+'''
+    Latency and payload metrics of the callbacks.
+
+    Each callback request is measured: its wall time, split into the time
+    spent preparing the data and building the figures (see phase), the
+    number of cube cells and passages it read (see add_rows), the size of
+    the response, and whether it was served by the response cache, the
+    figure cache or the figure store. The measures are kept as histograms
+    per callback and exported in the Prometheus text format on /metrics.
+
+    The metrics are kept per process: with several workers, each one is
+    scraped, or the scrapes are summed.
+'''
+
+import contextlib
+import json
+import threading
+import time
+
+from flask import Response, g, request
+
+
+# upper bounds of the buckets.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROWS_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000, 10000000)
+BYTES_BUCKETS = (1000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000)
+
+PHASES = ("data", "figure")
+
+# name -> (type, help, label names, buckets).
+METRICS = {
+    "dash_callback_duration_seconds": ("histogram", "Wall time of the callback requests, by phase.",
+                                       ("callback", "phase"), SECONDS_BUCKETS),
+    "dash_callback_rows_scanned": ("histogram", "Cube cells and passages read by a callback.",
+                                   ("callback",), ROWS_BUCKETS),
+    "dash_callback_response_bytes": ("histogram", "Size of the serialized callback responses, uncompressed.",
+                                     ("callback",), BYTES_BUCKETS),
+    "dash_callback_requests_total": ("counter", "Callback requests, by response cache outcome.",
+                                     ("callback", "cache"), None),
+    "dash_callback_figure_cache_total": ("counter", "Figure cache lookups of the callbacks.",
+                                         ("callback", "result"), None),
+}
+
+_values = {name: {} for name in METRICS}
+_lock = threading.Lock()
+
+# the measures of the request handled by the thread.
+_current = threading.local()
+
+
+def new_histogram(buckets):
+    '''
+    Args:
+        buckets: upper bounds of the buckets, increasing
+    Returns:
+        An empty histogram, a dict.
+    '''
+
+    return {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+
+
+def observe(name, labels, value):
+    '''
+    Records a value in a histogram, or adds it to a counter.
+
+    Args:
+        name: name of the metric, see METRICS
+        labels: the label values, a tuple
+        value: the value measured, the increment of a counter
+    '''
+
+    kind, _, _, buckets = METRICS[name]
+    with _lock:
+        if kind == "counter":
+            _values[name][labels] = _values[name].get(labels, 0) + value
+            return
+
+        histogram = _values[name].setdefault(labels, new_histogram(buckets))
+        for position, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][position] += 1
+                break
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def start(callback):
+    '''
+    Starts measuring a callback request in this thread.
+
+    Args:
+        callback: name of the callback
+    '''
+
+    _current.measures = {"callback": callback, "started": time.perf_counter(),
+                         "phases": dict.fromkeys(PHASES, 0.0), "rows": 0, "figure_cache": []}
+
+
+def stop():
+    '''
+    Stops measuring the callback request of this thread.
+
+    Returns:
+        The measures: the callback, its wall time, the time of each phase,
+        the rows read and the figure cache lookups. None if nothing was measured.
+    '''
+
+    measures = getattr(_current, "measures", None)
+    _current.measures = None
+    if measures is not None:
+        measures["seconds"] = time.perf_counter() - measures.pop("started")
+
+    return measures
+
+
+@contextlib.contextmanager
+def phase(name):
+    '''
+    Counts the time of a block in a phase of the current callback request.
+    Outside of a request, nothing is recorded.
+
+    Args:
+        name: "data" or "figure"
+    '''
+
+    measures = getattr(_current, "measures", None)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if measures is not None:
+            measures["phases"][name] += time.perf_counter() - started
+
+
+def add_rows(count):
+    '''
+    Counts rows read by the current callback request.
+
+    Args:
+        count: number of rows
+    '''
+
+    measures = getattr(_current, "measures", None)
+    if measures is not None:
+        measures["rows"] += int(count)
+
+
+def add_figure_lookup(result):
+    '''
+    Records a figure cache lookup of the current callback request.
+
+    Args:
+        result: "hit" if the figure was cached, "store" if it was read
+            from the figure store, "miss" if it was built
+    '''
+
+    measures = getattr(_current, "measures", None)
+    if measures is not None:
+        measures["figure_cache"].append(result)
+
+
+def record(measures, size, cache):
+    '''
+    Adds the measures of a callback request to the metrics.
+
+    Args:
+        measures: the measures, see stop
+        size: size of the response in bytes, None if no body was sent
+        cache: the response cache outcome, "hit", "miss" or "none"
+    '''
+
+    callback = measures["callback"]
+    observe("dash_callback_duration_seconds", (callback, "total"), measures["seconds"])
+    for name, seconds in measures["phases"].items():
+        observe("dash_callback_duration_seconds", (callback, name), seconds)
+    observe("dash_callback_rows_scanned", (callback,), measures["rows"])
+    if size is not None:
+        observe("dash_callback_response_bytes", (callback,), size)
+    observe("dash_callback_requests_total", (callback, cache), 1)
+    for result in measures["figure_cache"]:
+        observe("dash_callback_figure_cache_total", (callback, result), 1)
+
+
+def _format_labels(names, values, extra=""):
+    '''
+    Returns:
+        The labels of a sample, e.g. {callback="a",phase="data"}.
+    '''
+
+    labels = ['{}={}'.format(name, json.dumps(str(value))) for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+
+    return "{" + ",".join(labels) + "}"
+
+
+def render():
+    '''
+    Returns:
+        The metrics, in the Prometheus text format.
+    '''
+
+    lines = []
+    with _lock:
+        for name, (kind, description, label_names, _) in METRICS.items():
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for labels, value in sorted(_values[name].items()):
+                if kind == "counter":
+                    lines.append("{}{} {}".format(name, _format_labels(label_names, labels), value))
+                    continue
+                cumulated = 0
+                for bound, count in zip(value["buckets"], value["counts"]):
+                    cumulated += count
+                    lines.append("{}_bucket{} {}".format(
+                        name, _format_labels(label_names, labels, 'le="{}"'.format(bound)), cumulated))
+                lines.append("{}_bucket{} {}".format(
+                    name, _format_labels(label_names, labels, 'le="+Inf"'), value["count"]))
+                lines.append("{}_sum{} {}".format(name, _format_labels(label_names, labels), repr(value["sum"])))
+                lines.append("{}_count{} {}".format(name, _format_labels(label_names, labels), value["count"]))
+
+    return "\n".join(lines) + "\n"
+
+
+def clear():
+    '''
+    Resets every metric.
+    '''
+
+    with _lock:
+        for values in _values.values():
+            values.clear()
+
+
+def register_routes(server, get_callback, path="/_dash-update-component"):
+    '''
+    Measures the callback requests and adds the /metrics endpoint. Must be
+    registered before the response cache, to measure its hits too.
+
+    Args:
+        server: the Flask server of the Dash app
+        get_callback: function returning the name of the callback of an output
+        path: the url of the Dash callbacks
+    '''
+
+    @server.before_request
+    def start_measure():  # pylint: disable=unused-variable
+        if request.method != "POST" or request.path != path:
+            return
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and "output" in body:
+            start(get_callback(body["output"]))
+
+    @server.after_request
+    def record_measure(response):  # pylint: disable=unused-variable
+        measures = stop()
+        if measures is None:
+            return response
+        # the response cache gzips the responses it stores, and knows their size.
+        size = g.get("response_size")
+        if size is None and not response.direct_passthrough and "Content-Encoding" not in response.headers:
+            size = response.calculate_content_length()
+        record(measures, size, g.get("response_cache", "none"))
+
+        return response
+
+    @server.route("/metrics")
+    def metrics():  # pylint: disable=unused-variable
+        return Response(render(), mimetype="text/plain; version=0.0.4")
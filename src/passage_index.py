@@ -0,0 +1,172 @@
+'''
+    Index of the passages by trip Id.
+
+    The passages are sorted by trip Id once (stable, so the passages of a
+    trip keep their order; the snapshot stores them sorted), then each trip Id is mapped to the contiguous
+    range of its passages. Retrieving a trip is a binary search and a slice
+    of the sorted passages, no scan of the whole frame. New passages are
+    inserted in the sorted passages, see merge_index.
+'''
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import time_index
+
+
+def build_index(detail_df):
+    '''
+    Sorts the passages by trip Id and finds the range of each trip.
+
+    Args:
+        detail_df: the passages of the trips
+    Returns:
+        The index, a dict with the sorted passages, the sorted trip Ids
+        and the offsets of their passages.
+    '''
+
+    passages = detail_df
+    if not time_index.is_sorted(detail_df.Id.to_numpy()):
+        order = np.argsort(detail_df.Id.to_numpy(), kind="stable")
+        passages = detail_df.iloc[order].reset_index(drop=True)
+
+    return _index_sorted(passages)
+
+
+def _index_sorted(passages):
+    '''
+    Args:
+        passages: the passages, sorted by trip Id
+    Returns:
+        The index, see build_index.
+    '''
+
+    ids = passages.Id.to_numpy()
+    starts = np.flatnonzero(np.append(True, ids[1:] != ids[:-1])) if ids.shape[0] else np.empty(0, dtype=np.int64)
+    trip_ids = ids[starts]
+
+    return {
+        "passages": passages,
+        "trip_ids": trip_ids,
+        "offsets": np.append(starts, passages.shape[0]),
+        # hash table of the Ids, for membership tests.
+        "lookup": pd.Index(trip_ids),
+    }
+
+
+def merge_index(index, detail_df):
+    '''
+    Inserts new passages in the index. The new passages are sorted, then
+    merged with the sorted passages; the passages of a trip already known
+    keep their order and the new ones follow them.
+
+    Args:
+        index: the passage index
+        detail_df: the new passages, encoded with the same dictionaries as the index
+    Returns:
+        The passage index of all the passages.
+    '''
+
+    order = np.argsort(detail_df.Id.to_numpy(), kind="stable")
+    detail_df = detail_df.iloc[order].reset_index(drop=True)
+    size, new_size = index["passages"].shape[0], detail_df.shape[0]
+
+    positions = time_index.get_insert_positions(index["passages"].Id.to_numpy(), detail_df.Id.to_numpy())
+    take = np.empty(size + new_size, dtype=np.int64)
+    take[np.delete(np.arange(size + new_size), positions)] = np.arange(size)
+    take[positions] = size + np.arange(new_size)
+    passages = pd.concat([index["passages"], detail_df], ignore_index=True).take(take).reset_index(drop=True)
+
+    return _index_sorted(passages)
+
+
+def has_trip(index, trip_id):
+    '''
+    Tells if a trip has passages, in constant time.
+
+    Args:
+        index: the passage index
+        trip_id: a trip Id
+    Returns:
+        True if the trip has passages.
+    '''
+
+    return trip_id is not None and trip_id in index["lookup"]
+
+
+def has_trips(index, trip_ids):
+    '''
+    Tells which trips have passages, with one binary search.
+
+    Args:
+        index: the passage index
+        trip_ids: numpy array of trip Ids
+    Returns:
+        A boolean numpy array.
+    '''
+
+    trip_ids = np.asarray(trip_ids, dtype=np.int64)
+    if not index["trip_ids"].shape[0]:
+        return np.zeros(trip_ids.shape[0], dtype=bool)
+    positions = np.minimum(np.searchsorted(index["trip_ids"], trip_ids), index["trip_ids"].shape[0] - 1)
+
+    return index["trip_ids"][positions] == trip_ids
+
+
+def get_trip(index, trip_id):
+    '''
+    Retrieves the passages of a trip.
+
+    Args:
+        index: the passage index
+        trip_id: a trip Id
+    Returns:
+        dataframe of the passages of the trip, a slice of the sorted
+        passages. Empty if the Id is unknown.
+    '''
+
+    trip_ids = index["trip_ids"]
+    if trip_id is None:
+        return index["passages"].iloc[0:0]
+
+    position = np.searchsorted(trip_ids, trip_id)
+    if position == trip_ids.shape[0] or trip_ids[position] != trip_id:
+        return index["passages"].iloc[0:0]
+
+    offsets = index["offsets"]
+    metrics.add_rows(offsets[position + 1] - offsets[position])
+
+    return index["passages"].iloc[offsets[position]:offsets[position + 1]]
+
+
+def get_trips(index, trip_ids):
+    '''
+    Retrieves the passages of several trips at once: one binary search of
+    all the Ids, and one gather of their passages.
+
+    Args:
+        index: the passage index
+        trip_ids: trip Ids, duplicates are ignored
+    Returns:
+        dict with the "ids" found (in the order given), the "missing" ones,
+        the "passages" of the trips found, one trip after the other, and the
+        "offsets" of each trip in them.
+    '''
+
+    ids = pd.unique(np.asarray(trip_ids, dtype=np.int64))
+    found = has_trips(index, ids)
+    positions = np.searchsorted(index["trip_ids"], ids[found])
+
+    starts = index["offsets"][positions]
+    sizes = index["offsets"][positions + 1] - starts
+    offsets = np.append(0, np.cumsum(sizes))
+    rows = np.repeat(starts - offsets[:-1], sizes) + np.arange(offsets[-1])
+    metrics.add_rows(rows.shape[0])
+
+    return {
+        "ids": ids[found],
+        "missing": ids[~found],
+        "passages": index["passages"].iloc[rows],
+        "offsets": offsets,
+    }
@@ -1,7 +1,21 @@
 
+import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
 import hover_template
+import trip_geometry
+
+
+ZOOM = 5
+
+# about a meter.
+DECIMALS = 5
+
+# size of the map, in pixels, when fitting the zoom to the trips.
+WIDTH, HEIGHT = 1000, 450
+MAX_FIT_ZOOM = 10
+
+# above this number of trips, the legend would hide the map.
+MAX_LEGEND = 20
 
 
 def get_empty_figure():
@@ -30,33 +44,100 @@ def get_empty_figure():
 
 
 
-def get_passage_map(atrip):
+def get_passage_map(atrip, geometry=None, zoom=ZOOM):
     '''
     Generates a map showing the itinerary of a trip.
 
+    The itinerary is simplified for the zoom of the map (see
+    trip_geometry.py): only the passages needed to draw it within a
+    pixel, and every event, are sent.
+
     Args:
-        A dataframe of a trip.
+        atrip: A dataframe of a trip.
+        geometry: the geometry of the trip, built if None
+        zoom: zoom level of the map
     Returns:
         A map based on the input data.
 
     '''
 
-    lats = atrip.Latitude
-    longs = atrip.Longitude
-    fig = px.scatter_mapbox(atrip, lat=lats, lon=longs,
-                            hover_data=[atrip.Hardour, atrip.Region, atrip["Event Type"], atrip["Rank Number"]],
-                            zoom=5
-                            )
-    fig.update_layout(mapbox_style="carto-positron"  # "stamen-toner",
-                      )
+    if geometry is None:
+        geometry = trip_geometry.build_geometry(atrip)
+    positions = trip_geometry.simplify(geometry, zoom)
+    kept = atrip.iloc[positions]
+
+    fig = go.Figure(go.Scattermapbox(
+        lat=kept.Latitude.to_numpy(dtype=np.float64).round(DECIMALS),
+        lon=kept.Longitude.to_numpy(dtype=np.float64).round(DECIMALS),
+        customdata=np.stack([kept.Hardour.astype(str), kept.Region.astype(str),
+                             kept["Event Type"].astype(str)], axis=-1),
+        mode="lines+markers",
+        hovertemplate=hover_template.get_map_hover_template(),
+    ))
+    # centered on all the passages, like before the simplification.
+    fig.update_layout(mapbox=dict(style="carto-positron",  # "stamen-toner",
+                                  center=dict(lat=round(float(geometry["latitude"].mean()), DECIMALS),
+                                              lon=round(float(geometry["longitude"].mean()), DECIMALS)),
+                                  zoom=zoom))
+
+    fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
 
-    fig.update_traces(mode="lines+markers")
 
-    fig.update_traces(
-        hovertemplate=hover_template.get_map_hover_template()
-    )
+    return fig
 
-    fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
 
+def get_fit_zoom(latitudes, longitudes):
+    '''
+    Args:
+        latitudes: numpy array of the positions shown
+        longitudes: numpy array of the positions shown
+    Returns:
+        The zoom level showing all the positions, by half levels.
+    '''
+
+    x, y = trip_geometry.project(latitudes, longitudes)
+    spans = max(np.ptp(x), 1e-6), max(np.ptp(y), 1e-6)
+    zoom = np.log2(min(WIDTH / spans[0], HEIGHT / spans[1]) * 360 / 256)
+
+    return float(np.clip(np.floor(zoom * 2) / 2, 0, MAX_FIT_ZOOM))
+
+
+def get_overlay_map(batch, positions, zoom):
+    '''
+    Generates a map of the itineraries of several trips, one trace per trip.
+
+    Args:
+        batch: the passages of the trips, see passage_index.get_trips
+        positions: the positions of the passages drawn in each trip, see
+            trip_geometry.simplify_many
+        zoom: zoom level of the map
+    Returns:
+        The map.
+    '''
+
+    fig = go.Figure()
+    offsets = batch["offsets"]
+    for number, (trip_id, kept) in enumerate(zip(batch["ids"], positions)):
+        atrip = batch["passages"].iloc[offsets[number]:offsets[number + 1]].iloc[kept]
+        fig.add_trace(go.Scattermapbox(
+            lat=atrip.Latitude.to_numpy(dtype=np.float64).round(DECIMALS),
+            lon=atrip.Longitude.to_numpy(dtype=np.float64).round(DECIMALS),
+            customdata=np.stack([atrip.Hardour.astype(str), atrip.Region.astype(str),
+                                 atrip["Event Type"].astype(str)], axis=-1),
+            mode="lines+markers",
+            name=str(trip_id),
+            meta=str(trip_id),
+            hovertemplate=hover_template.get_overlay_map_hover_template(),
+        ))
+
+    latitudes = batch["passages"].Latitude.to_numpy(dtype=np.float64)
+    longitudes = batch["passages"].Longitude.to_numpy(dtype=np.float64)
+    fig.update_layout(mapbox=dict(style="carto-positron",
+                                  center=dict(lat=round((latitudes.min() + latitudes.max()) / 2, DECIMALS),
+                                              lon=round((longitudes.min() + longitudes.max()) / 2, DECIMALS)),
+                                  zoom=zoom),
+                      showlegend=len(fig.data) <= MAX_LEGEND)
+
+    fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
 
     return fig
@@ -1,31 +1,54 @@
 
+import numpy as np
 import pandas as pd
 import warnings
 warnings.filterwarnings("ignore")
 
+import cube
+import cumulative
+import encoding
+import summary_stats
+import time_index
 
-def convert_dates(dataframe):
+
+# the columns used by the app, the others are dropped.
+TRIP_COLUMNS = ['Id',
+                'Departure Date', 'Departure Hardour', 'Departure Region',
+                'Arrival Date', 'Arrival Hardour', 'Arrival Region', 'Vessel Type']
+PASSAGE_COLUMNS = ['Id', 'Latitude', 'Longitude', 'Hardour', 'Region', 'Event Type', 'Rank Number']
+
+
+def convert_dates(dataframe, dictionaries=None):
     '''
-    Converts the dates in the dataframe to datetime objects.
+    Converts the dates in the dataframe to datetime objects and
+    encodes the regions, harbours and vessel types with integer codes.
 
     Args:
-        dataframe: The dataframe to process
+        dataframe: The dataframe to process, trips or passages
+        dictionaries: the shared dictionaries (see encoding.py),
+            no encoding if None
     Returns:
         The processed dataframe with datetime-formatted dates.
     '''
 
-    my_df = dataframe[['Id',
-                       'Departure Date', 'Departure Hardour', 'Departure Region',
-                       'Arrival Date', 'Arrival Hardour', 'Arrival Region', 'Vessel Type']]
-    my_df["Departure Date"] = pd.to_datetime(dataframe["Departure Date"], utc=True)
-    my_df["Arrival Date"] = pd.to_datetime(dataframe["Arrival Date"], utc=True)
+    if "Departure Date" in dataframe.columns:
+        my_df = dataframe[TRIP_COLUMNS]
+        my_df["Departure Date"] = pd.to_datetime(dataframe["Departure Date"], utc=True)
+        my_df["Arrival Date"] = pd.to_datetime(dataframe["Arrival Date"], utc=True)
+    else:
+        my_df = dataframe[PASSAGE_COLUMNS].copy()
+
+    if dictionaries is not None:
+        my_df = encoding.encode(my_df, dictionaries)
+
     return my_df
 
 
 def filter_years(dataframe, start, end):
     '''
     Filters the elements of the dataframe by date, making sure
-    they fall in the desired range.
+    they fall in the desired range: both the departure and the arrival
+    are between the start and the end years.
 
     Args:
         dataframe: The dataframe to process
@@ -35,54 +58,42 @@ def filter_years(dataframe, start, end):
         The dataframe filtered by date.
     '''
 
-    gt_start_depart = dataframe["Departure Date"].dt.year >= start
-    lt_end_depart = dataframe["Departure Date"].dt.year <= end
-    start_end_depart = gt_start_depart & lt_end_depart
-    dataframe1 = dataframe.loc[start_end_depart]
+    # compare int64 nanoseconds with the bounds, no year extraction.
+    low, high = time_index.get_year_bounds(start, end)
+    departure = dataframe["Departure Date"].values.view("int64")
+    arrival = dataframe["Arrival Date"].values.view("int64")
 
-    gt_start_arrival = dataframe["Arrival Date"].dt.year >= start
-    lt_end_arrival = dataframe["Arrival Date"].dt.year <= end
-    start_end_arrival = gt_start_arrival & lt_end_arrival
-    my_df = dataframe.loc[start_end_arrival]
+    start_end_depart = (departure >= low) & (departure < high)
+    start_end_arrival = (arrival >= low) & (arrival < high)
+    my_df = dataframe.loc[start_end_depart & start_end_arrival]
 
     return my_df
 
 
-def summarize_yearly_counts(dataframe, trip_direction):
+def summarize_yearly_counts(data_cube, trip_direction, vessel_chosen=None):
     '''
     Summarize the data by region and year.
 
     Args:
-        dataframe: The dataframe to process
+        data_cube: the count cube, see cube.py
         trip_direction: departure, arrival, both, 0,1,2
+        vessel_chosen: one type of vessel, all types if None
     Returns:
         The processed dataframe with column 'Counts'
         containing the number of voyage.
 
     '''
 
-    my_df = dataframe.copy()
-    if trip_direction == 0:
-        # group by year_end on the column "Departure Date", keep Departure Region.
-        my_df = my_df.groupby([pd.Grouper(key="Departure Date", freq="1Y"),
-                               "Departure Region"]).agg(Counts=pd.NamedAgg(column="Departure Region", aggfunc="count"))
-    elif trip_direction == 1:
-        my_df = my_df.groupby([pd.Grouper(key="Arrival Date", freq="1Y"),
-                               "Arrival Region"]).agg(Counts=pd.NamedAgg(column="Arrival Region", aggfunc="count"))
-    else:
-        my_df0 = my_df.groupby([pd.Grouper(key="Departure Date", freq="1Y"),
-                               "Departure Region"]).agg(Counts=pd.NamedAgg(column="Departure Region", aggfunc="count"))
-        my_df1 = my_df.groupby([pd.Grouper(key="Arrival Date", freq="1Y"),
-                               "Arrival Region"]).agg(Counts=pd.NamedAgg(column="Arrival Region", aggfunc="count"))
-        my_df0.index.rename(["Date", "Region"], inplace=True)
-        my_df1.index.rename(["Date", "Region"], inplace=True)
-        my_df0.reset_index(inplace=True)
-        my_df1.reset_index(inplace=True)
-        my_dff = my_df0.append(my_df1)
-        my_df = my_dff.groupby(['Date', 'Region']).agg(Counts2=pd.NamedAgg(column="Counts", aggfunc="sum"))
-        my_df.rename(columns = {"Counts2":"Counts"}, inplace=True)
-
-    my_df.index.rename(["Date", "Region"], inplace=True)
+    rows = cube.select(data_cube, cube.get_directions(trip_direction), vessel=vessel_chosen)
+    counts = cube.aggregate(data_cube, rows, ["year", "region"])
+    counts = counts.loc[counts.index.get_level_values("region") >= 0]
+
+    years = counts.index.get_level_values("year").to_numpy()
+    regions = counts.index.get_level_values("region").to_numpy()
+    my_df = pd.DataFrame({"Counts": counts.to_numpy()},
+                         index=pd.MultiIndex.from_arrays([_year_end(years),
+                                                          np.array(data_cube["regions"], dtype=object)[regions]],
+                                                         names=["Date", "Region"]))
 
     return my_df
 
@@ -106,56 +117,119 @@ def restructure_df(yearly_df):
     return my_df
 
 
-def get_data_by_freq(dataframe, region, year, trip_direction, freq):
+def get_harbour_yearly_counts(harbour_years, region, trip_direction):
     '''
-    gets the amount of daily or monthly voyages in a given region and year.
+    Gets the number of voyages of each harbour of a region by year, in the
+    format of restructure_df, from the counts built at load.
 
     Args:
-        dataframe: The dataframe to process
+        harbour_years: the yearly counts of the harbours, see cube.build_harbour_years
         region: name
-        year: year
-        trip_direction: departure, arrival or both (0,1,2)
-        freq: daily or monthly
+        trip_direction: departure, arrival, both, 0,1,2
     Returns:
-        The number of voyage defined by the parameters.
+        dataframe with index = harbour, columns = each year (last day).
+    '''
+
+    counts = harbour_years["regions"].get(region)
+    if counts is None:
+        return pd.DataFrame(index=pd.Index([], name="Harbour"))
+
+    values = counts["counts"].sum(axis=0) if trip_direction == 2 else counts["counts"][trip_direction]
+    my_df = pd.DataFrame(values, index=pd.Index(counts["harbours"], name="Harbour"),
+                         columns=[date.date() for date in _year_end(harbour_years["years"])])
+
+    return my_df
+
+
+def get_yearly_counts_in_range(series, prefixes, days, level):
+    '''
+    Gets the number of voyages of some series by year within a date range,
+    in the format of restructure_df, from the cumulative counts built at
+    load: two values are read per cell, whatever the range.
+
+    Args:
+        series: the cumulative counts of a kind of series, see cumulative.build_series
+        prefixes: the groups of series of the rows, see cumulative.sum_by_year
+        days: (first, last) days since epoch, inclusive
+        level: name of the rows, e.g. "Region" or "Harbour"
+    Returns:
+        dataframe with index = the rows having voyages in the range,
+        columns = each year having voyages (last day).
+    '''
+
+    names, years, counts = cumulative.sum_by_year(series, prefixes, days)
+    rows, columns = counts.any(axis=1), counts.any(axis=0)
+    my_df = pd.DataFrame(counts[rows][:, columns].astype(np.float64),
+                         index=pd.Index(np.array(names, dtype=object)[rows], name=level),
+                         columns=[date.date() for date in _year_end(years[columns])])
+
+    return my_df
+
+
+def _year_start(years):
+    '''
+    Returns:
+        The first day of each year, UTC.
+    '''
 
+    return pd.DatetimeIndex((np.asarray(years) - 1970).astype("M8[Y]")).tz_localize("UTC")
+
+
+def _year_end(years):
+    '''
+    Returns:
+        The last day of each year, UTC.
+    '''
+
+    return _year_start(np.asarray(years) + 1) - pd.Timedelta(days=1)
+
+
+def _count_by_freq(data_cube, rows, freq):
+    '''
+    Counts the voyages of some cells of the cube by day or month, the days
+    or months without voyage between the first and the last one are zeros.
+
+    Args:
+        data_cube: the count cube
+        rows: positions of the cells
+        freq: daily or monthly
+    Returns:
+        Series of the counts indexed by date (naive, UTC).
     '''
 
     # define the options of frequency:  daily and monthly.
     frequencies = {"daily" : "1D", "monthly": "MS"}
-    interval = frequencies[freq]
+    periods = {"daily": "day", "monthly": "month"}
 
-    if trip_direction == 0:
-        df_year_region = dataframe.loc[(dataframe["Departure Date"].dt.year == year) & (dataframe["Departure Region"] == region)]
-        df_freq = df_year_region.groupby(pd.Grouper(key="Departure Date", freq=interval)) \
-            .agg(Counts=pd.NamedAgg(column="Departure Region", aggfunc="count"))
+    counts = cube.aggregate(data_cube, rows, [periods[freq]])
+    counts.index = pd.DatetimeIndex(counts.index.to_numpy().astype("M8[ns]"), name="Date")
+    if counts.shape[0]:
+        counts = counts.reindex(pd.date_range(counts.index[0], counts.index[-1], freq=frequencies[freq],
+                                              name="Date"), fill_value=0)
 
-    if trip_direction == 1:
-        df_year_region = dataframe.loc[(dataframe["Arrival Date"].dt.year == year) & (dataframe["Arrival Region"] == region)]
-        df_freq = df_year_region.groupby(pd.Grouper(key="Arrival Date", freq=interval)) \
-            .agg(Counts=pd.NamedAgg(column="Arrival Region", aggfunc="count"))
+    return counts
 
-    if trip_direction == 2:
-        df_year_region0 = dataframe.loc[(dataframe["Departure Date"].dt.year == year) & (dataframe["Departure Region"] == region)]
-        df_freq0 = df_year_region0.groupby(pd.Grouper(key="Departure Date", freq=interval)) \
-            .agg(Counts=pd.NamedAgg(column="Departure Region", aggfunc="count"))
-        df_year_region1 = dataframe.loc[(dataframe["Arrival Date"].dt.year == year) & (dataframe["Arrival Region"] == region)]
-        df_freq1 = df_year_region1.groupby(pd.Grouper(key="Arrival Date", freq=interval)) \
-            .agg(Counts=pd.NamedAgg(column="Arrival Region", aggfunc="count"))
 
-        df_freq0.index.rename("Date", inplace=True)
-        df_freq1.index.rename("Date", inplace=True)
-        df_freq0.reset_index(inplace=True)
-        df_freq1.reset_index(inplace=True)
+def get_data_by_freq(data_cube, region, year, trip_direction, freq, days=None):
+    '''
+    gets the amount of daily or monthly voyages in a given region and year.
 
-        my_df = df_freq0.append(df_freq1)
-        df_freq = my_df.groupby('Date').agg(Counts2=pd.NamedAgg(column="Counts", aggfunc="sum"))
-        df_freq.rename(columns = {"Counts2":"Counts"}, inplace=True)
+    Args:
+        data_cube: the count cube, see cube.py
+        region: name
+        year: year
+        trip_direction: departure, arrival or both (0,1,2)
+        freq: daily or monthly
+        days: (first, last) days since epoch (inclusive), all days if None
+    Returns:
+        The number of voyage defined by the parameters.
 
+    '''
 
-    df_freq.index.rename("Date", inplace=True)
+    rows = cube.select(data_cube, cube.get_directions(trip_direction), region=region, year=year,
+                       days=days)
+    df_freq = _count_by_freq(data_cube, rows, freq).to_frame("Counts")
     df_freq.reset_index(inplace=True)
-    df_freq.Date = df_freq.Date.dt.date.astype('datetime64')
 
     return df_freq
 
@@ -172,9 +246,9 @@ def all_region_harbour(dataframe):
     '''
 
     deprhs = dataframe[["Departure Region", "Departure Hardour"]].groupby(
-        ["Departure Region", "Departure Hardour"]).count().reset_index()
+        ["Departure Region", "Departure Hardour"], observed=True).count().sort_index().reset_index()
     arrvrhs = dataframe[["Arrival Region", "Arrival Hardour"]].groupby(
-        ["Arrival Region", "Arrival Hardour"]).count().reset_index()
+        ["Arrival Region", "Arrival Hardour"], observed=True).count().sort_index().reset_index()
     deprhs.rename(columns={"Departure Region": "Region", "Departure Hardour": "Harbour"}, inplace=True)
     arrvrhs.rename(columns={"Arrival Region": "Region", "Arrival Hardour": "Harbour"}, inplace=True)
     rh = deprhs.append(arrvrhs)
@@ -195,8 +269,8 @@ def get_depart_by_harbour(dataframe, region, harbour):
 
     '''
 
-    depart_hb_rg = dataframe.loc[(dataframe["Departure Region"] == region) &
-                                     (dataframe["Departure Hardour"] == harbour)]
+    depart_hb_rg = dataframe.loc[encoding.equals(dataframe["Departure Region"], region) &
+                                 encoding.equals(dataframe["Departure Hardour"], harbour)]
     depart_hb_rg = depart_hb_rg[['Id', 'Departure Date']]
     depart_hb_rg["Direction"] = "Departure"
     depart_hb_rg.rename(columns={"Departure Date": "Date"}, inplace=True)
@@ -217,8 +291,8 @@ def get_arrive_by_harbour(dataframe, region, harbour):
 
     '''
 
-    arrv_hb_rg = dataframe.loc[(dataframe["Arrival Region"] == region) &
-                                   (dataframe["Arrival Hardour"] == harbour)]
+    arrv_hb_rg = dataframe.loc[encoding.equals(dataframe["Arrival Region"], region) &
+                               encoding.equals(dataframe["Arrival Hardour"], harbour)]
     arrv_hb_rg = arrv_hb_rg[['Id', 'Arrival Date']]
     arrv_hb_rg["Direction"] = "Arrival"
     arrv_hb_rg.rename(columns={"Arrival Date": "Date"}, inplace=True)
@@ -226,47 +300,53 @@ def get_arrive_by_harbour(dataframe, region, harbour):
     return arrv_hb_rg
 
 
-def prepare_day_month_data_by_harbour(dataframe, year, freq):
+def prepare_day_month_data_by_harbour(data_cube, region, harbour, trip_direction, year, freq, days=None):
     '''
     Summarize the number of daily or monthly voyages.
 
     Args:
-        dataframe: The dataframe to process
+        data_cube: the count cube, see cube.py
+        region: name
+        harbour: name
+        trip_direction: departure or arrival (0,1)
         year
         freq: daily or monthly
+        days: (first, last) days since epoch (inclusive), all days if None
     Returns:
         dataframe contains the number of daily or monthly voyage.
 
     '''
 
-    frequencies = {"daily" : "1D", "monthly": "MS"}
-    interval = frequencies[freq]
-
-    dataframe = dataframe.loc[dataframe.Date.dt.year == year]
-    harb_data = dataframe.groupby([pd.Grouper(key="Date", freq=interval)]
-                                       ).agg(Counts=pd.NamedAgg(column="Id", aggfunc="count"))
+    rows = cube.select(data_cube, [trip_direction], region=region, harbour=harbour, year=year, days=days)
+    harb_data = _count_by_freq(data_cube, rows, freq).tz_localize("UTC").to_frame("Counts")
     harb_data.reset_index(inplace=True)
 
     return harb_data
 
 
-def prepare_data_by_harbour(depart_hb_rg, arrv_hb_rg):
+def prepare_data_by_harbour(data_cube, region, harbour, days=None):
     '''
     Summarize both departure and arrivals in a harbour of a region.
 
     Args:
-        depart_hb_rg: dataframe contains departures in a harbour of a region
-        arrv_hb_rg: dataframe contains arrivals in the same harbour
+        data_cube: the count cube, see cube.py
+        region: name
+        harbour: name
+        days: (first, last) days since epoch (inclusive), all days if None
     Returns:
         dataframe contains voyages in the harbour of the region.
 
     '''
 
-    trip_hb_rg = depart_hb_rg.append(arrv_hb_rg)
+    rows = cube.select(data_cube, [cube.DEPARTURE, cube.ARRIVAL], region=region, harbour=harbour, days=days)
+    counts = cube.aggregate(data_cube, rows, ["year", "direction"])
 
-    stack_bar_data = trip_hb_rg.groupby([pd.Grouper(key="Date", freq="1YS"), "Direction"]
-                                        ).agg(Counts=pd.NamedAgg(column="Id", aggfunc="count"))
-    stack_bar_data.reset_index(inplace=True)
+    stack_bar_data = pd.DataFrame({
+        "Date": _year_start(counts.index.get_level_values("year")),
+        "Direction": np.array(["Departure", "Arrival"])[counts.index.get_level_values("direction")],
+        "Counts": counts.to_numpy()
+    })
+    stack_bar_data.sort_values(by=["Date", "Direction"], inplace=True, ignore_index=True)
 
     return stack_bar_data
 
@@ -283,7 +363,7 @@ def get_harbours_by_region(regions_harbours, region):
 
     '''
 
-    harbour_by_region = regions_harbours.loc[regions_harbours.Region == region]["Harbour"].unique()
+    harbour_by_region = regions_harbours.loc[encoding.equals(regions_harbours.Region, region)]["Harbour"].unique()
 
     return harbour_by_region
 
@@ -301,29 +381,16 @@ def get_international_trips(trips_df):
     '''
 
     total_voyage = trips_df.shape[0]
-    east_water = trips_df.loc[(trips_df["Departure Region"] == "East Canadian Water Region") |
-                              (trips_df["Arrival Region"] == "East Canadian Water Region")].shape[0]
-    west_water = trips_df.loc[(trips_df["Arrival Region"] == "West Canadian Water Region") |
-                              (trips_df["Departure Region"] == "West Canadian Water Region")].shape[0]
+    east_water = (encoding.equals(trips_df["Departure Region"], "East Canadian Water Region") |
+                  encoding.equals(trips_df["Arrival Region"], "East Canadian Water Region")).sum()
+    west_water = (encoding.equals(trips_df["Arrival Region"], "West Canadian Water Region") |
+                  encoding.equals(trips_df["Departure Region"], "West Canadian Water Region")).sum()
     international = east_water + west_water
     percentage = round(international / total_voyage * 100, 2)
     percentage = "{:,}".format(percentage) + "%"
     return percentage
 
 
-def get_hours(td):
-  """
-  Utility to calculate the duration of trips
-
-  Args:
-    td: timedelta
-
-  Return: number of hours
-  """
-
-  return td.days * 24 + round(td.seconds/3600,2)
-
-
 def get_trip_duration(trips_df, total_voyage):
     '''
     calculate the average duration of a trip
@@ -337,8 +404,8 @@ def get_trip_duration(trips_df, total_voyage):
 
     '''
 
-    duration = trips_df['Arrival Date'] - trips_df['Departure Date']
-    duration_hour = duration.apply(get_hours)
+    duration_hour = summary_stats.get_duration_hours(trips_df['Departure Date'].values.view("int64"),
+                                                     trips_df['Arrival Date'].values.view("int64"))
     total_duration_hour = duration_hour.sum()
     avg_duration_hour = round(total_duration_hour / total_voyage, 2)
     avg_duration_hour = "{:,}".format(avg_duration_hour)
@@ -346,34 +413,28 @@ def get_trip_duration(trips_df, total_voyage):
     return avg_duration_hour
 
 
-def get_vessel_harbour(trips_df_heat, vessel_chosen, region, year):
+def get_vessel_harbour(data_cube, vessel_chosen, region, year, days=None):
     '''
     Given a region, calculate the number of voyages using a certain type vessel by harbour.
 
     Args:
-        trips_df_heat: The dataframe to process
+        data_cube: the count cube, see cube.py
         vessel_chosen: one type of vessel
         region: name
         year: name
+        days: (first, last) days since epoch (inclusive), all days if None
     Returns:
         dataframe contains number of voyages in each harbour of the given region.
 
     '''
 
-    trips_vessel = trips_df_heat.loc[trips_df_heat["Vessel Type"] == vessel_chosen]
-
-    trips_vessel_depart = trips_vessel.loc[(trips_vessel["Departure Date"].dt.year == year) &
-                                           (trips_vessel["Departure Region"] == region)][["Departure Hardour"]]
-    trips_vessel_depart.rename(columns={"Departure Hardour": "Harbour"}, inplace=True)
-
-    trips_vessel_arrive = trips_vessel.loc[(trips_vessel["Arrival Date"].dt.year == year) &
-                                           (trips_vessel["Arrival Region"] == region)][["Arrival Hardour"]]
-    trips_vessel_arrive.rename(columns={"Arrival Hardour": "Harbour"}, inplace=True)
+    rows = cube.select(data_cube, [cube.DEPARTURE, cube.ARRIVAL], region=region, vessel=vessel_chosen, year=year,
+                       days=days)
+    counts = cube.aggregate(data_cube, rows, ["harbour"])
+    counts = counts.loc[counts.index >= 0]
 
-    trips_vessel_rh = trips_vessel_depart.append(trips_vessel_arrive)
-    trips_vessel_rh = trips_vessel_rh.groupby(["Harbour"]
-                                              ).agg(Counts=pd.NamedAgg(column="Harbour", aggfunc="count"),
-                                                    ).reset_index()
+    trips_vessel_rh = pd.DataFrame({"Harbour": np.array(data_cube["harbours"], dtype=object)[counts.index],
+                                    "Counts": counts.to_numpy()})
 
     trips_vessel_rh_dot_data = trips_vessel_rh.sort_values(by="Counts")
 
@@ -0,0 +1,162 @@
+'''
+    Warm-up command: prerenders every figure of the dashboard into the
+    figure store (see figure_store.py), so even the first click after a
+    deploy is served without building a figure.
+
+    The inputs of the callbacks are finite (see figures.get_input_space):
+    the directions, the vessel types, the cells of the heatmaps and the
+    bars of the harbours. They are split in chunks built by a pool of
+    processes, forked once the dataset is loaded so they share it. The
+    figures already stored for the current version of the dataset are
+    skipped, an interrupted run is resumed by running it again; the
+    figures of the other versions are removed at the end.
+
+    A delta (see delta.py) changes the version of the dataset: its figures
+    are built on demand until the command runs again.
+
+    python prerender.py --workers 8
+'''
+
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import time
+
+import figure_cache
+import figure_store
+import figures
+
+
+CHUNK_SIZE = 32
+WORKERS = os.cpu_count() or 1
+
+# the dataset the workers build the figures from, set before they are forked.
+_shared = {"dataset": None}
+
+
+def _run(function, tasks, args):
+    '''
+    Runs a function on a chunk of tasks, with the dataset, in a worker.
+    '''
+
+    return function(_shared["dataset"], tasks, *args)
+
+
+def map_chunks(dataset, function, tasks, args=(), workers=WORKERS, chunk_size=CHUNK_SIZE):
+    '''
+    Runs a function on chunks of tasks in a pool of processes, forked once
+    the dataset is set so they share it.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        function: called with the dataset, a chunk of tasks and args, a
+            function of a module so it can be sent to the workers
+        tasks: list of tasks
+        args: the other arguments of the function
+        workers: number of processes, the chunks are run in this process if 1
+        chunk_size: number of tasks sent to a process at a time
+    Returns:
+        The list of the results of the chunks.
+    '''
+
+    chunks = [tasks[start:start + chunk_size] for start in range(0, len(tasks), chunk_size)]
+
+    _shared["dataset"] = dataset
+    if workers <= 1:
+        return [function(dataset, chunk, *args) for chunk in chunks]
+
+    context = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+        return list(pool.map(_run, itertools.repeat(function), chunks, itertools.repeat(args)))
+
+
+def _render(dataset, tasks, store_dir, force):
+    '''
+    Builds figures and writes them in the store, in a worker.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        tasks: list of (name of the builder, inputs), see figures.get_input_space
+        store_dir: directory of the store
+        force: True to build the figures already stored again
+    Returns:
+        dict with the number of figures "written" and "skipped", and the "bytes" written.
+    '''
+
+    result = {"written": 0, "skipped": 0, "bytes": 0}
+    for name, inputs in tasks:
+        key = figure_cache.make_key(name, dataset["version"], *inputs)
+        if not force and figure_store.contains(store_dir, key):
+            result["skipped"] += 1
+            continue
+        result["bytes"] += figure_store.save(store_dir, key, figures.BUILDERS[name](dataset, *inputs))
+        result["written"] += 1
+
+    return result
+
+
+def prerender(dataset, store_dir, workers=WORKERS, chunk_size=CHUNK_SIZE, force=False):
+    '''
+    Prerenders every figure of a dataset into the store.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        store_dir: directory of the store
+        workers: number of processes, the figures are built in this process if 1
+        chunk_size: number of figures sent to a process at a time
+        force: True to build the figures already stored again
+    Returns:
+        dict with the number of "figures", how many were "written" and
+        "skipped", the "bytes" written, the "seconds" it took and the
+        versions "pruned".
+    '''
+
+    started = time.perf_counter()
+    tasks = list(figures.get_input_space(dataset))
+    results = map_chunks(dataset, _render, tasks, (store_dir, force), workers, chunk_size)
+
+    summary = {name: sum(result[name] for result in results) for name in ("written", "skipped", "bytes")}
+    summary.update({
+        "figures": len(tasks),
+        "seconds": round(time.perf_counter() - started, 2),
+        "pruned": figure_store.prune(store_dir, dataset["version"]),
+    })
+
+    return summary
+
+
+def load_app():
+    '''
+    Imports the app, with the sources and directories of its environment,
+    and waits until its dataset is loaded.
+
+    Returns:
+        The app module.
+    '''
+
+    import app  # pylint: disable=import-outside-toplevel
+
+    while not app.loader.is_ready():
+        if app.loader.get_status()["status"] == "failed":
+            raise RuntimeError("the app failed to load its data")
+        time.sleep(0.05)
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prerender every figure of the dashboard into the figure store.")
+    parser.add_argument("--store", default=None, help="directory of the store, FIGURE_STORE of the app by default")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="build the figures already stored again")
+    args = parser.parse_args()
+
+    dashboard = load_app()
+    summary = prerender(dashboard.loader.get_dataset(), args.store or dashboard.FIGURE_STORE,
+                        args.workers, args.chunk_size, args.force)
+    print("{figures} figures: {written} written ({bytes} bytes), {skipped} already stored, "
+          "in {seconds} s".format(**summary))
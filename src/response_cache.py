@@ -0,0 +1,171 @@
+'''
+    Cached callback responses.
+
+    The responses of the callbacks are the serialized figures. They are
+    cached gzipped, by callback, inputs and dataset version: a request seen
+    before is answered from the cache before Dash dispatches it, so no
+    figure is built and nothing is serialized. Each response carries an
+    ETag, a request sending it back in If-None-Match gets a 304.
+
+    The callbacks polling the loader (see app.py) depend on the state of
+    the process, not only on their inputs: they are never cached.
+'''
+
+import gzip
+import hashlib
+import json
+
+from flask import Response, g, jsonify, request
+
+import figure_cache
+
+
+MAX_SIZE = 256
+
+# callbacks with one of these outputs are not cached.
+EXCLUDED_OUTPUTS = ("loading-poll", "dataset-version")
+
+_responses = figure_cache.new_cache(MAX_SIZE)
+
+
+def make_key(body, version):
+    '''
+    Builds the key of a callback request.
+
+    Args:
+        body: the JSON body of the request (output, inputs, state, changedPropIds)
+        version: version of the dataset
+    Returns:
+        The key, a hex digest.
+    '''
+
+    request_id = json.dumps([body.get(name) for name in ("output", "inputs", "state", "changedPropIds")],
+                            sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256((version + request_id).encode()).hexdigest()
+
+
+def is_cacheable(body):
+    '''
+    Args:
+        body: the JSON body of a callback request
+    Returns:
+        True if the response only depends on the request and the data.
+    '''
+
+    return isinstance(body, dict) and "output" in body and \
+        not any(output in body["output"] for output in EXCLUDED_OUTPUTS)
+
+
+def make_entry(data):
+    '''
+    Args:
+        data: the serialized response, bytes
+    Returns:
+        The cache entry: the ETag, the gzipped response and its size.
+    '''
+
+    return {
+        "etag": hashlib.sha256(data).hexdigest()[:32],
+        "gzip": gzip.compress(data, compresslevel=6),
+        "size": len(data),
+    }
+
+
+def respond(entry, response=None):
+    '''
+    Sends a cached response, gzipped if the client accepts it.
+
+    Args:
+        entry: the cache entry, see make_entry
+        response: the response to fill, a new one if None
+    Returns:
+        The response, a 304 if the client already has it.
+    '''
+
+    if request.if_none_match.contains(entry["etag"]):
+        response = Response(status=304)
+    elif "gzip" in request.accept_encodings:
+        response = response or Response(mimetype="application/json")
+        response.set_data(entry["gzip"])
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = response or Response(gzip.decompress(entry["gzip"]), mimetype="application/json")
+
+    response.set_etag(entry["etag"])
+    response.vary.add("Accept-Encoding")
+
+    return response
+
+
+def get_stats():
+    '''
+    Returns:
+        dict with the size and the counters of the cache, and the bytes stored.
+    '''
+
+    stats = figure_cache.get_stats(_responses)
+    with _responses["lock"]:
+        stats["bytes"] = sum(len(entry["gzip"]) for entry in _responses["entries"].values())
+
+    return stats
+
+
+def clear():
+    '''
+    Removes every cached response, the counters are kept.
+    '''
+
+    figure_cache.clear(_responses)
+
+
+def register_routes(server, get_dataset, path="/_dash-update-component"):
+    '''
+    Serves the callback requests from the cache, stores the responses of
+    the other ones, and adds the /stats/response-cache endpoint.
+
+    Args:
+        server: the Flask server of the Dash app
+        get_dataset: function returning the current dataset, None while loading
+        path: the url of the Dash callbacks
+    '''
+
+    @server.before_request
+    def serve_cached_response():  # pylint: disable=unused-variable
+        if request.method != "POST" or request.path != path:
+            return None
+        dataset = get_dataset()
+        body = request.get_json(silent=True)
+        if dataset is None or not is_cacheable(body):
+            return None
+
+        key = make_key(body, dataset["version"])
+        entry = figure_cache.get(key, _responses)
+        if entry is not None:
+            g.response_cache, g.response_size = "hit", entry["size"]
+            return respond(entry)
+
+        g.response_cache = "miss"
+        g.response_key = key
+        g.response_version = dataset["version"]
+        return None
+
+    @server.after_request
+    def store_response(response):  # pylint: disable=unused-variable
+        key = g.pop("response_key", None)
+        if key is None or response.status_code != 200 or response.direct_passthrough:
+            return response
+        # the dataset may have been replaced while the callback ran.
+        dataset = get_dataset()
+        if dataset is None or dataset["version"] != g.pop("response_version", None):
+            return response
+
+        entry = make_entry(response.get_data())
+        figure_cache.put(key, entry, _responses)
+        g.response_size = entry["size"]
+
+        return respond(entry, response)
+
+    @server.route("/stats/response-cache")
+    def response_cache_stats():  # pylint: disable=unused-variable
+        return jsonify(get_stats())
@@ -0,0 +1,74 @@
+
+import numpy as np
+import plotly.graph_objects as go
+import hover_template
+from template import THEME
+
+
+# links drawn, the largest ones: the harbour pairs are too many to read.
+MAX_LINKS = 40
+
+
+def get_empty_figure():
+    '''
+    Returns the figure to display when there is no voyage to show.
+    '''
+
+    fig = go.Figure()
+    fig.update_layout(
+        showlegend=False,
+        xaxis={"visible": False},
+        yaxis={"visible": False},
+        dragmode=False,
+        annotations=[
+            dict(
+                xref="paper",
+                yref="paper",
+                text="No voyage for this selection.",
+                showarrow=False,
+                align="center",
+            )
+        ]
+    )
+
+    return fig
+
+
+def get_flow_figure(flow_data, title):
+    '''
+    Generates a Sankey diagram of the voyages between origins (left) and
+    destinations (right), so the voyages staying in a region or a
+    harbour are drawn too.
+
+    Args:
+        flow_data: dataframe with the Origin, Destination and Counts, sorted
+            by decreasing counts, see flows.get_flows
+        title: title of the figure
+    Returns:
+        A figure based on input data.
+    '''
+
+    shown = flow_data.head(MAX_LINKS)
+    origins = list(dict.fromkeys(shown.Origin))
+    destinations = list(dict.fromkeys(shown.Destination))
+    source = [origins.index(origin) for origin in shown.Origin]
+    target = [len(origins) + destinations.index(destination) for destination in shown.Destination]
+
+    fig = go.Figure(go.Sankey(
+        arrangement="snap",
+        node=dict(label=origins + destinations,
+                  color=[THEME["line_bar_color_depart"]] * len(origins) +
+                  [THEME["line_bar_color_arrival"]] * len(destinations),
+                  pad=12, thickness=14),
+        link=dict(source=source, target=target, value=shown.Counts.to_numpy(),
+                  customdata=np.round(shown.Counts.to_numpy() / flow_data.Counts.sum() * 100, 2),
+                  hovertemplate=hover_template.get_flow_hover_template()),
+    ))
+
+    if flow_data.shape[0] > MAX_LINKS:
+        title += " ({} largest of {} routes)".format(MAX_LINKS, flow_data.shape[0])
+
+    fig.update_layout(title_text=title, height=max(500, 22 * max(len(origins), len(destinations))),
+                      font_family=THEME["font_family"])
+
+    return fig
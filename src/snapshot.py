@@ -0,0 +1,678 @@
+'''
+    Local columnar snapshot of the trips and passages datasets.
+
+    The source CSVs are converted once into one raw binary file per column
+    (typed, memory-mappable) plus a manifest.json describing the columns.
+    Dates are stored already parsed (int64 nanoseconds since epoch, UTC),
+    regions, harbours and vessel types as their integer codes (see
+    encoding.py, the dictionaries are kept in the manifest) and the trips
+    are stored already filtered to the year window, so opening the snapshot
+    skips both the download and the CSV parsing.
+
+    The snapshot is built by streaming the sources in chunks (see ingest.py),
+    sorted by chunks merged on disk (see _argsort), so building it needs a
+    few chunks of memory whatever the size of the sources, and it is rebuilt
+    only when the checksum of the sources changes.
+
+    The tables are stored in the order the app uses them: trips by departure
+    date, passages by trip Id, with the arrival dates of the trips also
+    stored sorted next to the positions sorting them. Opened shared, the
+    columns are memory-mapped read-only and the frames are built on top of
+    them without copies: every gunicorn worker uses the same pages of the
+    page cache, so adding workers costs almost no memory.
+'''
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+import encoding
+import fetch
+import ingest
+
+
+FORMAT_VERSION = 5
+MANIFEST = "manifest.json"
+
+# table -> column its rows are sorted by (stable).
+SORT_COLUMNS = {"trips": "Departure Date", "passages": "Id"}
+# table -> columns also stored sorted, with the positions of the rows sorting them.
+ORDER_COLUMNS = {"trips": ["Arrival Date"]}
+# smallest number of rows read at a time from each sorted run, see _argsort.
+MERGE_BLOCK = 4096
+
+
+def source_checksum(source):
+    '''
+    Computes a checksum identifying the content of a source file.
+
+    Local files are hashed, the files downloaded in the cache (see
+    fetch.py) are named by their hash already. For remote files, the ETag,
+    size and modification date returned by a HEAD request are hashed
+    instead, so that the file does not need to be downloaded.
+
+    Args:
+        source: path or http(s) url of a CSV file
+    Returns:
+        The hex checksum, or None if the source can not be reached.
+    '''
+
+    if fetch.get_digest(source) is not None:
+        return fetch.get_digest(source)
+
+    digest = hashlib.sha256()
+    try:
+        if source.startswith(("http://", "https://")):
+            request = urllib.request.Request(source, method="HEAD")
+            with urllib.request.urlopen(request, timeout=10) as response:
+                for header in ("ETag", "Content-Length", "Last-Modified"):
+                    digest.update(str(response.headers.get(header)).encode())
+        else:
+            with open(source, "rb") as source_file:
+                for block in iter(lambda: source_file.read(1 << 20), b""):
+                    digest.update(block)
+    except OSError:
+        return None
+
+    return digest.hexdigest()
+
+
+def sources_checksum(trips_source, detail_source):
+    '''
+    Combines the checksums of both sources. It identifies the data, whatever
+    the format of the snapshot or the year window: the deltas are kept by
+    it (see delta.py).
+
+    Args:
+        trips_source: path or url of the trips CSV
+        detail_source: path or url of the passages CSV
+    Returns:
+        The hex checksum, or None if a source can not be reached.
+    '''
+
+    checksums = [source_checksum(trips_source), source_checksum(detail_source)]
+    if None in checksums:
+        return None
+
+    return hashlib.sha256("|".join(checksums).encode()).hexdigest()
+
+
+def snapshot_checksum(sources, start, end):
+    '''
+    Combines the checksum of the sources, the year window and the format.
+
+    Args:
+        sources: checksum of the sources, see sources_checksum
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+    Returns:
+        The hex checksum, or None if the sources can not be reached (sources is None).
+    '''
+
+    if sources is None:
+        return None
+
+    key = "|".join([str(FORMAT_VERSION), str(start), str(end), sources])
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def read_manifest(snapshot_dir):
+    '''
+    Reads the manifest of a snapshot.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+    Returns:
+        The manifest as a dict, or None if there is no valid snapshot.
+    '''
+
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("format") != FORMAT_VERSION:
+        return None
+
+    return manifest
+
+
+def _column_values(series):
+    '''
+    Converts a column to the values stored in the snapshot.
+
+    Args:
+        series: the column to convert
+    Returns:
+        The kind of the column and its values, a numpy array.
+    '''
+
+    if series.name in encoding.ENCODED_COLUMNS:
+        # streamed chunks hold the codes already (see ingest.encode_chunk).
+        if pd.api.types.is_categorical_dtype(series):
+            return "category", series.cat.codes.to_numpy()
+        return "category", series.to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is not None:
+            series = series.dt.tz_convert("UTC")
+        return "datetime", series.values.view("int64")
+    if pd.api.types.is_numeric_dtype(series):
+        return "number", series.to_numpy()
+
+    return "string", series.fillna("").astype(str).to_numpy().astype("U")
+
+
+def _code_dtype(size):
+    '''
+    Returns:
+        The smallest integer type holding the codes of a dictionary of that size.
+    '''
+
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+
+def _read_values(path, dtype, rows, shared):
+    '''
+    Reads the values of a file of the snapshot.
+
+    Args:
+        path: the file
+        dtype: numpy type of the values
+        rows: number of values
+        shared: memory-map the file read-only if True, else read it in memory
+    Returns:
+        numpy array of the values.
+    '''
+
+    if not rows:
+        return np.empty(0, dtype=dtype)
+    if shared:
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    return np.fromfile(path, dtype=dtype, count=rows)
+
+
+def _read_column(path, column, rows, dtypes, shared=False):
+    '''
+    Opens one column of a snapshot, without copying its values.
+
+    Args:
+        path: file of the column
+        column: the manifest entry describing the column
+        rows: number of rows
+        dtypes: the categorical dtypes of the encoded columns
+        shared: memory-map the column read-only if True, else read it in memory
+    Returns:
+        The values of the column, a numpy or pandas array.
+    '''
+
+    values = _read_values(path, np.dtype(column["dtype"]), rows, shared)
+
+    if column["kind"] == "datetime":
+        return pd.arrays.DatetimeArray(values.view("M8[ns]"), dtype=pd.DatetimeTZDtype(tz="UTC"))
+    if column["kind"] == "category":
+        dtype = dtypes[encoding.ENCODED_COLUMNS[column["name"]]]
+        return pd.Categorical.from_codes(values, dtype=dtype)
+
+    return values
+
+
+def _begin(snapshot_dir):
+    '''
+    Creates the temporary directory a new snapshot is written to.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+    Returns:
+        The temporary directory.
+    '''
+
+    tmp_dir = snapshot_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    return tmp_dir
+
+
+def _append_table(tmp_dir, tables, table_name, dataframe):
+    '''
+    Appends rows to a table of the snapshot being written.
+
+    Args:
+        tmp_dir: directory of the snapshot being written
+        tables: the manifest entries of the tables, updated
+        table_name: name of the table
+        dataframe: the rows to append
+    '''
+
+    if table_name not in tables:
+        os.makedirs(os.path.join(tmp_dir, table_name))
+        tables[table_name] = {
+            "rows": 0,
+            "columns": [{"name": column_name, "file": os.path.join(table_name, "{:03d}.bin".format(position))}
+                        for position, column_name in enumerate(dataframe.columns)]
+        }
+
+    table = tables[table_name]
+    for column in table["columns"]:
+        kind, values = _column_values(dataframe[column["name"]])
+        if "dtype" not in column:
+            column["kind"] = kind
+            column["dtype"] = values.dtype.str
+        elif values.dtype.str != column["dtype"]:
+            if not np.can_cast(values.dtype, column["dtype"]):
+                raise ValueError("column {} changed from {} to {}".format(column["name"], column["dtype"],
+                                                                           values.dtype.str))
+            values = values.astype(column["dtype"])
+
+        with open(os.path.join(tmp_dir, column["file"]), "ab") as column_file:
+            np.ascontiguousarray(values).tofile(column_file)
+
+    table["rows"] += int(dataframe.shape[0])
+
+
+def _remap_codes(tmp_dir, tables, remaps):
+    '''
+    Rewrites the code columns of streamed tables: the codes given while
+    streaming are replaced by the codes of the sorted dictionaries, stored
+    in the smallest integer type.
+
+    Args:
+        tmp_dir: directory of the snapshot being written
+        tables: the manifest entries of the tables, updated
+        remaps: kind -> array mapping a streamed code to its sorted code
+    '''
+
+    for table in tables.values():
+        for column in table["columns"]:
+            if column["kind"] != "category":
+                continue
+            remap = remaps[encoding.ENCODED_COLUMNS[column["name"]]]
+            dtype = _code_dtype(remap.shape[0])
+            path = os.path.join(tmp_dir, column["file"])
+            codes = np.fromfile(path, dtype=column["dtype"], count=0) if not table["rows"] else \
+                np.memmap(path, dtype=column["dtype"], mode="r", shape=(table["rows"],))
+            with open(path + ".remap", "wb") as remap_file:
+                for start in range(0, table["rows"], ingest.CHUNK_SIZE):
+                    block = codes[start:start + ingest.CHUNK_SIZE]
+                    np.where(block < 0, -1, remap[block]).astype(dtype).tofile(remap_file)
+            del codes
+            os.replace(path + ".remap", path)
+            column["dtype"] = dtype.str
+
+
+def _argsort(values, values_path, positions_path, chunksize=None):
+    '''
+    Sorts a column of the snapshot being written (stable) with a bounded
+    memory: each chunk of rows is sorted in memory into a run, then the runs
+    are merged, a block of each at a time. The runs are sorted by (value,
+    position), so every value up to the smallest last value of the blocks
+    is final and written out before the next blocks are read.
+
+    Args:
+        values: the values, memory-mapped
+        values_path: file the sorted values are written to
+        positions_path: file the positions sorting the values are written to, int64
+        chunksize: number of rows of a run, ingest.CHUNK_SIZE if None
+    '''
+
+    chunksize = chunksize or ingest.CHUNK_SIZE
+    rows = values.shape[0]
+    bounds = [(start, min(start + chunksize, rows)) for start in range(0, rows, chunksize)]
+    with open(values_path + ".runs", "wb") as values_file, open(positions_path + ".runs", "wb") as positions_file:
+        for start, stop in bounds:
+            block = np.asarray(values[start:stop])
+            order = np.argsort(block, kind="stable")
+            block[order].tofile(values_file)
+            (order + start).astype(np.int64).tofile(positions_file)
+
+    run_values = _read_values(values_path + ".runs", values.dtype, rows, True)
+    run_positions = _read_values(positions_path + ".runs", np.dtype(np.int64), rows, True)
+    # the blocks of all the runs hold about a chunk, at least MERGE_BLOCK rows each.
+    size = max(chunksize // max(len(bounds), 1), MERGE_BLOCK)
+    cursors = [start for start, _ in bounds]
+    blocks = [(np.empty(0, dtype=values.dtype), np.empty(0, dtype=np.int64)) for _ in bounds]
+    with open(values_path, "wb") as values_file, open(positions_path, "wb") as positions_file:
+        while True:
+            for run, (_, stop) in enumerate(bounds):
+                if not blocks[run][0].shape[0] and cursors[run] < stop:
+                    end = min(cursors[run] + size, stop)
+                    blocks[run] = (np.asarray(run_values[cursors[run]:end]),
+                                   np.asarray(run_positions[cursors[run]:end]))
+                    cursors[run] = end
+            runs = [run for run in range(len(bounds)) if blocks[run][0].shape[0]]
+            if not runs:
+                break
+
+            last_value, last_position = min((blocks[run][0][-1], blocks[run][1][-1]) for run in runs)
+            parts = []
+            for run in runs:
+                block_values, block_positions = blocks[run]
+                low = int(np.searchsorted(block_values, last_value, side="left"))
+                high = int(np.searchsorted(block_values, last_value, side="right"))
+                count = low + int(np.searchsorted(block_positions[low:high], last_position, side="right"))
+                parts.append((block_values[:count], block_positions[:count]))
+                blocks[run] = (block_values[count:], block_positions[count:])
+
+            # the runs are in the order of the positions: a stable sort keeps the equal values in order.
+            merged_values = np.concatenate([part[0] for part in parts])
+            merged_positions = np.concatenate([part[1] for part in parts])
+            order = np.argsort(merged_values, kind="stable")
+            merged_values[order].tofile(values_file)
+            merged_positions[order].tofile(positions_file)
+
+    del run_values, run_positions
+    os.remove(values_path + ".runs")
+    os.remove(positions_path + ".runs")
+
+
+def _is_sorted(order):
+    '''
+    Returns:
+        True if the positions sorting a column keep its rows in place, read a chunk at a time.
+    '''
+
+    return all(np.array_equal(order[start:start + ingest.CHUNK_SIZE],
+                              np.arange(start, min(start + ingest.CHUNK_SIZE, order.shape[0])))
+               for start in range(0, order.shape[0], ingest.CHUNK_SIZE))
+
+
+def _sort_tables(tmp_dir, tables):
+    '''
+    Sorts the rows of the tables (see SORT_COLUMNS) and stores the sorted
+    columns of ORDER_COLUMNS, one column at a time. The sorts are external
+    (see _argsort) and the columns are reordered a chunk at a time, reading
+    the others memory-mapped: the memory used is bounded by a few chunks,
+    not by the number of rows.
+
+    Args:
+        tmp_dir: directory of the snapshot being written
+        tables: the manifest entries of the tables, updated
+    '''
+
+    for table_name, table in tables.items():
+        columns = {column["name"]: column for column in table["columns"]}
+        rows = table["rows"]
+
+        def read(column):
+            return _read_values(os.path.join(tmp_dir, column["file"]), np.dtype(column["dtype"]), rows, True)
+
+        def write(values, order, file_name):
+            with open(os.path.join(tmp_dir, file_name + ".sorted"), "wb") as sorted_file:
+                for start in range(0, rows, ingest.CHUNK_SIZE):
+                    values[order[start:start + ingest.CHUNK_SIZE]].tofile(sorted_file)
+            os.replace(os.path.join(tmp_dir, file_name + ".sorted"), os.path.join(tmp_dir, file_name))
+
+        if table_name in SORT_COLUMNS and rows:
+            key = columns[SORT_COLUMNS[table_name]]
+            path = os.path.join(tmp_dir, key["file"])
+            _argsort(read(key), path + ".sorted", path + ".order")
+            order = _read_values(path + ".order", np.dtype(np.int64), rows, True)
+            if _is_sorted(order):
+                os.remove(path + ".sorted")
+            else:
+                for column in table["columns"]:
+                    if column is not key:
+                        write(read(column), order, column["file"])
+                os.replace(path + ".sorted", path)
+            del order
+            os.remove(path + ".order")
+
+        table["orders"] = {}
+        for column_name in ORDER_COLUMNS.get(table_name, []):
+            column = columns[column_name]
+            name = os.path.splitext(column["file"])[0]
+            entry = {"positions": name + ".positions.bin", "values": name + ".sorted.bin"}
+            _argsort(read(column), os.path.join(tmp_dir, entry["values"]), os.path.join(tmp_dir, entry["positions"]))
+            table["orders"][column_name] = entry
+
+
+def _commit(snapshot_dir, tmp_dir, manifest):
+    '''
+    Writes the manifest and replaces the previous snapshot by the new one.
+    Renaming the directory makes sure a reader never sees a half-written snapshot.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        tmp_dir: directory of the snapshot being written
+        manifest: the manifest of the new snapshot
+    '''
+
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+
+    old_dir = snapshot_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(snapshot_dir):
+        os.rename(snapshot_dir, old_dir)
+    os.rename(tmp_dir, snapshot_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def write_snapshot(snapshot_dir, tables, dictionaries, checksum, sources=None, version=None, deltas=0):
+    '''
+    Writes dataframes already in memory as a new snapshot.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        tables: dict of table name -> dataframe, encoded with the dictionaries
+        dictionaries: the dictionaries the tables are encoded with
+        checksum: checksum of the snapshot, see snapshot_checksum
+        sources: checksum of the sources the tables were built from, see sources_checksum
+        version: version of the data, the checksum if None
+        deltas: number of deltas of the sources folded in the tables, see fold
+    '''
+
+    tmp_dir = _begin(snapshot_dir)
+    manifest = {"format": FORMAT_VERSION, "checksum": checksum, "sources": sources, "version": version,
+                "deltas": deltas, "created": time.time(), "dictionaries": dictionaries, "tables": {}}
+    for table_name, dataframe in tables.items():
+        _append_table(tmp_dir, manifest["tables"], table_name, dataframe)
+
+    _sort_tables(tmp_dir, manifest["tables"])
+    _commit(snapshot_dir, tmp_dir, manifest)
+
+
+def build_snapshot(snapshot_dir, trips_source, detail_source, start, end, checksum,
+                   chunksize=ingest.CHUNK_SIZE, sources=None):
+    '''
+    Streams the source CSVs into a new snapshot, one chunk at a time,
+    so the memory used does not depend on the size of the sources.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        trips_source: path or url of the trips CSV
+        detail_source: path or url of the passages CSV
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+        checksum: checksum of the snapshot, see snapshot_checksum
+        chunksize: number of rows read at a time
+        sources: checksum of the sources, see sources_checksum
+    '''
+
+    tmp_dir = _begin(snapshot_dir)
+    manifest = {"format": FORMAT_VERSION, "checksum": checksum, "sources": sources, "created": time.time(),
+                "tables": {}}
+    dictionaries = ingest.new_dictionaries()
+
+    for chunk in ingest.stream_trips(trips_source, start, end, chunksize):
+        _append_table(tmp_dir, manifest["tables"], "trips", ingest.encode_chunk(chunk, dictionaries))
+    for chunk in ingest.stream_passages(detail_source, chunksize):
+        _append_table(tmp_dir, manifest["tables"], "passages", ingest.encode_chunk(chunk, dictionaries))
+
+    manifest["dictionaries"], remaps = ingest.sort_dictionaries(dictionaries)
+    _remap_codes(tmp_dir, manifest["tables"], remaps)
+    _sort_tables(tmp_dir, manifest["tables"])
+    _commit(snapshot_dir, tmp_dir, manifest)
+
+
+def fold(snapshot_dir, tables, dictionaries, generation):
+    '''
+    Writes the tables of the sources of the snapshot with deltas applied
+    (see delta.fold) as a new generation of the snapshot, under the lock of
+    the builds. The snapshot keeps its checksum: it is opened as is until
+    the sources change.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        tables: dict of table name -> dataframe, encoded with the dictionaries
+        dictionaries: the dictionaries the tables are encoded with
+        generation: the "version" of the data, the checksum of its "sources"
+            and the number of "deltas" applied, see get_generation
+    Returns:
+        True if it was written, False if the snapshot is of other sources or
+        holds as many deltas already.
+    '''
+
+    with open(snapshot_dir + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        manifest = read_manifest(snapshot_dir)
+        if manifest is None or get_generation(manifest)["sources"] != generation["sources"] \
+                or get_generation(manifest)["deltas"] >= generation["deltas"]:
+            return False
+        write_snapshot(snapshot_dir, tables, dictionaries, manifest["checksum"], generation["sources"],
+                       generation["version"], generation["deltas"])
+
+    return True
+
+
+def get_generation(manifest):
+    '''
+    Args:
+        manifest: the manifest of a snapshot
+    Returns:
+        dict with the "version" of its data, the checksum of its "sources"
+        and the number of "deltas" of the sources folded in it (see fold).
+        The snapshots not recording them are identified by their checksum.
+    '''
+
+    return {"version": manifest.get("version") or manifest["checksum"],
+            "sources": manifest.get("sources") or manifest["checksum"],
+            "deltas": manifest.get("deltas", 0)}
+
+
+def open_snapshot(snapshot_dir, manifest=None, shared=False):
+    '''
+    Opens every table of a snapshot. The frames are built on top of the
+    values read, without copies: opened shared, they are read-only views of
+    the memory-mapped files.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        manifest: the manifest, read from the directory if not given
+        shared: memory-map the columns read-only if True, else read them in memory
+    Returns:
+        dict of table name -> dataframe
+    '''
+
+    manifest = manifest or read_manifest(snapshot_dir)
+    dtypes = encoding.get_dtypes(manifest["dictionaries"])
+    tables = {}
+    for table_name, table in manifest["tables"].items():
+        # one block per column (no consolidation), so the memory-mapped values are not copied.
+        tables[table_name] = pd.DataFrame({column["name"]: _read_column(os.path.join(snapshot_dir, column["file"]),
+                                                                        column, table["rows"], dtypes, shared)
+                                           for column in table["columns"]},
+                                          index=pd.RangeIndex(table["rows"]), copy=False)
+
+    return tables
+
+
+def open_orders(snapshot_dir, manifest=None, shared=False):
+    '''
+    Opens the sorted columns of a snapshot, see ORDER_COLUMNS.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        manifest: the manifest, read from the directory if not given
+        shared: memory-map the files read-only if True, else read them in memory
+    Returns:
+        dict of table name -> column name -> dict with the sorted "values"
+        (int64 for dates) and the "positions" of the rows sorting them.
+    '''
+
+    manifest = manifest or read_manifest(snapshot_dir)
+    orders = {}
+    for table_name, table in manifest["tables"].items():
+        columns = {column["name"]: column for column in table["columns"]}
+        orders[table_name] = {}
+        for column_name, entry in table.get("orders", {}).items():
+            dtype = np.dtype(columns[column_name]["dtype"])
+            orders[table_name][column_name] = {
+                "values": _read_values(os.path.join(snapshot_dir, entry["values"]), dtype, table["rows"], shared),
+                "positions": _read_values(os.path.join(snapshot_dir, entry["positions"]), np.dtype(np.int64),
+                                          table["rows"], shared),
+            }
+
+    return orders
+
+
+def load(snapshot_dir, trips_source, detail_source, start, end, chunksize=ingest.CHUNK_SIZE, shared=False):
+    '''
+    Opens the snapshot, building it first if the sources changed.
+
+    If the sources can not be reached, the existing snapshot is used as is.
+    The build is done under a file lock, so concurrent workers build it once.
+
+    Args:
+        snapshot_dir: directory of the snapshot
+        trips_source: path or url of the trips CSV
+        detail_source: path or url of the passages CSV
+        start: first year kept (inclusive)
+        end: last year kept (inclusive)
+        chunksize: number of rows read at a time when building
+        shared: memory-map the columns read-only if True, else read them in memory
+    Returns:
+        The trips dataframe (sorted by departure date), the passages dataframe
+        (sorted by trip Id), the generation of the snapshot (its version,
+        sources and deltas, see get_generation) and the sorted columns (see
+        open_orders).
+    '''
+
+    sources = sources_checksum(trips_source, detail_source)
+    checksum = snapshot_checksum(sources, start, end)
+    manifest = read_manifest(snapshot_dir)
+
+    if manifest is None or (checksum is not None and manifest["checksum"] != checksum):
+        os.makedirs(os.path.dirname(os.path.abspath(snapshot_dir)), exist_ok=True)
+        with open(snapshot_dir + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # another worker may have built it while we were waiting.
+            manifest = read_manifest(snapshot_dir)
+            if manifest is None or (checksum is not None and manifest["checksum"] != checksum):
+                build_snapshot(snapshot_dir, trips_source, detail_source, start, end, checksum, chunksize, sources)
+                manifest = read_manifest(snapshot_dir)
+
+    tables = open_snapshot(snapshot_dir, manifest, shared)
+
+    return tables["trips"], tables["passages"], get_generation(manifest), open_orders(snapshot_dir, manifest, shared)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the local snapshot of the datasets.")
+    parser.add_argument("trips_source")
+    parser.add_argument("detail_source")
+    parser.add_argument("--snapshot-dir", default="./assets/data/snapshot")
+    parser.add_argument("--start", type=int, default=2011)
+    parser.add_argument("--end", type=int, default=2021)
+    parser.add_argument("--chunksize", type=int, default=ingest.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    trips, passages, generation, _ = load(args.snapshot_dir, args.trips_source, args.detail_source,
+                                          args.start, args.end, args.chunksize)
+    print("snapshot {}: {:,} trips, {:,} passages".format(generation["version"], trips.shape[0], passages.shape[0]))
@@ -0,0 +1,161 @@
+'''
+    Static export of the figures: the dashboard served with no figure
+    built per request.
+
+    Every figure the callbacks can show (see figures.get_input_space) is
+    written as JSON, next to its gzip (.gz) and brotli (.br) versions, and
+    a manifest maps the inputs of each builder to its file. Run with
+    STATIC_FIGURES set to the url of the export, the app registers
+    clientside callbacks (see assets/static_figures.js) reading the
+    manifest and the figures from it instead of its figure callbacks: any
+    static file server or CDN serving the precompressed files (e.g.
+    gzip_static and brotli_static in nginx) takes the load, the server
+    only answers the layout, the page switches and the dropdowns.
+
+    The export is the figures of one version of the dataset, the appended
+    deltas are shown once it is exported again.
+
+    python static_export.py --output ./assets/data/static --workers 8
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import brotli
+import plotly.utils
+
+import figures
+import prerender
+
+
+MANIFEST = "manifest.json"
+
+
+def get_input_key(inputs):
+    '''
+    Args:
+        inputs: the inputs of a builder
+    Returns:
+        The key of the inputs in the manifest, their compact JSON, as
+        JSON.stringify writes them in the browser.
+    '''
+
+    return json.dumps(list(inputs), cls=plotly.utils.PlotlyJSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_file(output_dir, path, content):
+    '''
+    Writes a file with its gzip and brotli versions.
+
+    Args:
+        output_dir: directory of the export
+        path: path of the file in the export
+        content: content of the file, bytes
+    Returns:
+        The size of the three files, in bytes.
+    '''
+
+    path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = 0
+    for suffix, encoded in (("", content),
+                            (".gz", gzip.compress(content, compresslevel=9, mtime=0)),
+                            (".br", brotli.compress(content, quality=11))):
+        with open(path + suffix, "wb") as export_file:
+            export_file.write(encoded)
+        size += len(encoded)
+
+    return size
+
+
+def _write_figure(output_dir, name, key, figure):
+    '''
+    Returns:
+        The path of the figure in the export, and the size of its files.
+    '''
+
+    digest = hashlib.sha256(key.encode()).hexdigest()[:24]
+    path = "{}/{}.json".format(name, digest)
+    content = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder, separators=(",", ":")).encode()
+
+    return path, write_file(output_dir, path, content)
+
+
+def _export(dataset, tasks, output_dir):
+    '''
+    Builds figures and writes them in the export, in a worker.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        tasks: list of (name of the builder, inputs), see figures.get_input_space
+        output_dir: directory of the export
+    Returns:
+        dict with the files of the figures (name -> key of the inputs -> path)
+        and the "bytes" written.
+    '''
+
+    result = {"files": {}, "bytes": 0}
+    for name, inputs in tasks:
+        key = get_input_key(inputs)
+        path, size = _write_figure(output_dir, name, key, figures.BUILDERS[name](dataset, *inputs))
+        result["files"].setdefault(name, {})[key] = path
+        result["bytes"] += size
+
+    return result
+
+
+def export(dataset, output_dir, workers=prerender.WORKERS, chunk_size=prerender.CHUNK_SIZE):
+    '''
+    Exports every figure of a dataset, replacing the previous export.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        output_dir: directory of the export
+        workers: number of processes, the figures are built in this process if 1
+        chunk_size: number of figures sent to a process at a time
+    Returns:
+        dict with the number of "figures", the "bytes" written and the
+        "seconds" it took.
+    '''
+
+    started = time.perf_counter()
+    # written aside, the files served are never a mix of two exports.
+    tmp_dir = output_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    tasks = list(figures.get_input_space(dataset))
+    results = prerender.map_chunks(dataset, _export, tasks, (tmp_dir,), workers, chunk_size)
+
+    manifest = {"version": dataset["version"], "default_region": figures.get_default_region(dataset),
+                "figures": {}, "empty": {}}
+    size = sum(result["bytes"] for result in results)
+    for result in results:
+        for name, files in result["files"].items():
+            manifest["figures"].setdefault(name, {}).update(files)
+    for name, build in figures.EMPTY_FIGURES.items():
+        manifest["empty"][name], empty_size = _write_figure(tmp_dir, "empty", name, build())
+        size += empty_size
+    size += write_file(tmp_dir, MANIFEST, json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode())
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+
+    return {"figures": len(tasks), "bytes": size, "seconds": round(time.perf_counter() - started, 2)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export every figure of the dashboard as static files.")
+    parser.add_argument("--output", default="./assets/data/static")
+    parser.add_argument("--workers", type=int, default=prerender.WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=prerender.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    dashboard = prerender.load_app()
+    summary = export(dashboard.loader.get_dataset(), args.output, args.workers, args.chunk_size)
+    print("{figures} figures exported ({bytes} bytes with the compressed files) in {seconds} s".format(**summary))
@@ -0,0 +1,270 @@
+'''
+    Statistics of the summary panel.
+
+    All the metrics of the panel (number of voyages, % of international
+    voyages, average duration, most used vessel type) are computed in one
+    vectorized pass over the numpy columns of the trips, for all the trips
+    or for a subset (region, vessel type, year range). The trips are sorted
+    by departure date, so a year range is a slice of the columns.
+'''
+
+import numpy as np
+from flask import jsonify, request
+
+import encoding
+import time_index
+
+
+INTERNATIONAL_REGIONS = ["East Canadian Water Region", "West Canadian Water Region"]
+
+NS_PER_DAY = 86400 * 10**9
+NS_PER_SECOND = 10**9
+
+
+def get_columns(trips_df):
+    '''
+    Extracts the columns used by the statistics, as numpy arrays.
+
+    Args:
+        trips_df: the trips, dates converted and names encoded
+    Returns:
+        dict of numpy arrays and the names of the codes.
+    '''
+
+    return {
+        "departure_region": trips_df["Departure Region"].cat.codes.to_numpy(),
+        "arrival_region": trips_df["Arrival Region"].cat.codes.to_numpy(),
+        "vessel": trips_df["Vessel Type"].cat.codes.to_numpy(),
+        "departure": trips_df["Departure Date"].values.view("int64"),
+        "arrival": trips_df["Arrival Date"].values.view("int64"),
+        "regions": list(trips_df["Departure Region"].cat.categories),
+        "vessels": list(trips_df["Vessel Type"].cat.categories),
+    }
+
+
+def get_duration_hours(departure, arrival):
+    '''
+    Computes the duration of trips in hours, the seconds rounded to
+    hundredths of an hour like timedelta days * 24 + seconds / 3600.
+
+    Args:
+        departure: departure dates, int64 nanoseconds
+        arrival: arrival dates, int64 nanoseconds
+    Returns:
+        numpy array of hours.
+    '''
+
+    duration = arrival - departure
+    days, rest = np.divmod(duration, NS_PER_DAY)
+
+    return days * 24 + np.round(rest // NS_PER_SECOND / 3600, 2)
+
+
+def get_rows(columns, years=None):
+    '''
+    Selects the trips departing in a range of years.
+
+    Args:
+        columns: the columns of the trips, see get_columns
+        years: (first, last) years of departure (inclusive), all if None,
+            a side left open if it is None
+    Returns:
+        slice of the trips.
+    '''
+
+    if years is None:
+        return slice(None)
+
+    return time_index.get_range(columns["departure"], *time_index.get_year_bounds(*years))
+
+
+def get_mask(columns, region=None, vessel_type=None, rows=slice(None)):
+    '''
+    Selects a subset of the trips.
+
+    Args:
+        columns: the columns of the trips, see get_columns
+        region: trips departing from or arriving in this region, all if None
+        vessel_type: trips using this vessel type, all if None
+        rows: slice of the trips the mask applies to, see get_rows
+    Returns:
+        boolean numpy array over the rows, None to select every row.
+    '''
+
+    mask = None
+
+    def combine(mask, condition):
+        return condition if mask is None else mask & condition
+
+    if region is not None:
+        code = columns["regions"].index(region) if region in columns["regions"] else -2
+        mask = combine(mask, (columns["departure_region"][rows] == code) | (columns["arrival_region"][rows] == code))
+    if vessel_type is not None:
+        code = columns["vessels"].index(vessel_type) if vessel_type in columns["vessels"] else -2
+        mask = combine(mask, columns["vessel"][rows] == code)
+
+    return mask
+
+
+def count_international(columns, departure_region, arrival_region):
+    '''
+    Counts the international voyages of each trip.
+
+    Args:
+        columns: the columns of the trips, see get_columns
+        departure_region: codes of the departure regions of the trips
+        arrival_region: codes of the arrival regions of the trips
+    Returns:
+        numpy array of counts, 0 to 2 per trip.
+    '''
+
+    # a voyage between both waters counts twice, as in the original panel.
+    international = np.zeros(departure_region.shape[0], dtype=np.int64)
+    for region in INTERNATIONAL_REGIONS:
+        if region in columns["regions"]:
+            code = columns["regions"].index(region)
+            international += (departure_region == code) | (arrival_region == code)
+
+    return international
+
+
+def compute_stats(columns, mask=None, rows=slice(None)):
+    '''
+    Computes the raw statistics of some trips. They are sums, so the
+    statistics of two sets of trips add up.
+
+    Args:
+        columns: the columns of the trips, see get_columns
+        mask: boolean array selecting the trips among the rows, every row if None
+        rows: slice of the trips, see get_rows
+    Returns:
+        dict with the number of voyages, of international voyages,
+        the total duration in hours and the number of voyages per vessel type.
+    '''
+
+    def pick(values):
+        values = values[rows]
+        return values if mask is None else values[mask]
+
+    departure_region = pick(columns["departure_region"])
+    arrival_region = pick(columns["arrival_region"])
+    international = int(count_international(columns, departure_region, arrival_region).sum())
+
+    vessels = np.bincount(pick(columns["vessel"]).astype(np.int64) + 1,
+                          minlength=len(columns["vessels"]) + 1)
+
+    return {
+        "count": int(departure_region.shape[0]),
+        "international": international,
+        "duration_hours": float(get_duration_hours(pick(columns["departure"]), pick(columns["arrival"])).sum()),
+        "vessels": vessels[1:],  # the first bin counts the missing types
+    }
+
+
+def add_stats(stats, vessel_names, other, other_vessel_names):
+    '''
+    Adds the statistics of two sets of trips, e.g. the loaded trips and
+    newly received ones. The vessel types may differ.
+
+    Args:
+        stats: the raw statistics of some trips, see compute_stats
+        vessel_names: names of their vessel types, by code
+        other: the raw statistics of other trips
+        other_vessel_names: names of their vessel types, by code
+    Returns:
+        The statistics of all the trips and the names of their vessel
+        types (sorted union), by code.
+    '''
+
+    names = sorted(set(vessel_names) | set(other_vessel_names))
+    vessels = np.zeros(len(names), dtype=np.int64)
+    np.add.at(vessels, encoding.get_remap(vessel_names, names)[:-1], stats["vessels"])
+    np.add.at(vessels, encoding.get_remap(other_vessel_names, names)[:-1], other["vessels"])
+
+    return {
+        "count": stats["count"] + other["count"],
+        "international": stats["international"] + other["international"],
+        "duration_hours": stats["duration_hours"] + other["duration_hours"],
+        "vessels": vessels,
+    }, names
+
+
+def format_stats(stats, vessel_names):
+    '''
+    Formats the statistics for the summary panel.
+
+    Args:
+        stats: the raw statistics, see compute_stats
+        vessel_names: names of the vessel types, by code
+    Returns:
+        dict with the values of the panel: total_voyage, international_trips,
+        trip_duration and most_used_vessel.
+    '''
+
+    total_voyage = stats["count"]
+    if not total_voyage:
+        return {"total_voyage0": 0, "total_voyage": "0", "international_trips": "-",
+                "trip_duration": "-", "most_used_vessel": "-"}
+
+    percentage = round(stats["international"] / total_voyage * 100, 2)
+    avg_duration_hour = round(stats["duration_hours"] / total_voyage, 2)
+
+    return {
+        "total_voyage0": total_voyage,
+        "total_voyage": "{:,}".format(total_voyage),
+        "international_trips": "{:,}".format(percentage) + "%",
+        "trip_duration": "{:,}".format(avg_duration_hour),
+        "most_used_vessel": vessel_names[int(np.argmax(stats["vessels"]))],
+    }
+
+
+def get_summary(columns, region=None, vessel_type=None, years=None):
+    '''
+    Computes the values of the summary panel for a subset of the trips.
+
+    Args:
+        columns: the columns of the trips, see get_columns
+        region: name of a region, all regions if None
+        vessel_type: a vessel type, all types if None
+        years: (first, last) years, all years if None, see get_rows
+    Returns:
+        dict with the values of the panel, see format_stats.
+    '''
+
+    rows = get_rows(columns, years)
+    stats = compute_stats(columns, get_mask(columns, region, vessel_type, rows), rows)
+
+    return format_stats(stats, columns["vessels"])
+
+
+def register_routes(server, get_dataset):
+    '''
+    Adds the /api/summary endpoint to the Flask server. It returns the
+    values of the panel for the subset given by the optional parameters
+    region, vessel_type, start and end (years).
+
+    Args:
+        server: the Flask server of the Dash app
+        get_dataset: function returning the current dataset, None while loading
+    '''
+
+    @server.route("/api/summary")
+    def summary():  # pylint: disable=unused-variable
+        dataset = get_dataset()
+        if dataset is None:
+            return jsonify({"status": "loading"}), 503
+
+        years = None
+        if "start" in request.args or "end" in request.args:
+            # a missing year leaves its side of the range open.
+            try:
+                years = tuple(int(request.args[name]) if name in request.args else None for name in ("start", "end"))
+            except ValueError:
+                return jsonify({"error": "start and end must be years"}), 400
+            if None not in years and years[0] > years[1]:
+                return jsonify({"error": "start must not be after end"}), 400
+
+        return jsonify(get_summary(dataset["columns"],
+                                   region=request.args.get("region"),
+                                   vessel_type=request.args.get("vessel_type"),
+                                   years=years))
@@ -0,0 +1,276 @@
+'''
+    Synthetic trips and passages, to measure how the app scales.
+
+    The frames follow the schema of trips_slim.csv and detail_sample.csv.
+    The traffic is skewed like the real one: the Pacific and the St.
+    Lawrence see most of the voyages, a few harbours of each region
+    (Vancouver, Montreal, Halifax...) most of its traffic, most voyages stay
+    in their region, and cargo vessels dominate. The rows are generated in
+    chunks, each chunk from its own seed, so any size (up to 100M rows and
+    more) is produced in bounded memory and is reproducible.
+
+    python synthetic.py OUT_DIR --trips 1000000 writes OUT_DIR/trips_slim.csv
+    and OUT_DIR/detail_sample.csv.
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import preprocess
+
+
+CHUNK_SIZE = 1000000
+
+# region -> share of the voyages.
+REGIONS = {"Pacific Region": 0.3, "Quebec Region": 0.2, "Central Region": 0.17, "Maritimes Region": 0.14,
+           "Newfoundland Region": 0.08, "East Canadian Water Region": 0.06,
+           "West Canadian Water Region": 0.04, "Arctic Region": 0.01}
+
+# region -> harbour -> (latitude, longitude), harbours by decreasing traffic.
+HARBOURS = {
+    "Pacific Region": {"Vancouver": (49.29, -123.11), "Victoria": (48.42, -123.37),
+                       "Nanaimo": (49.17, -123.94), "Prince Rupert": (54.31, -130.33),
+                       "Kitimat": (54.05, -128.65)},
+    "Central Region": {"Hamilton": (43.27, -79.86), "Toronto": (43.64, -79.38),
+                       "Thunder Bay": (48.43, -89.22), "Windsor": (42.32, -83.04)},
+    "Quebec Region": {"Montreal": (45.50, -73.55), "Quebec": (46.81, -71.20),
+                      "Sept-Iles": (50.20, -66.38), "Baie-Comeau": (49.22, -68.15),
+                      "Trois-Rivieres": (46.34, -72.54)},
+    "Maritimes Region": {"Halifax": (44.65, -63.57), "Saint John": (45.27, -66.06),
+                         "Sydney": (46.14, -60.19), "Charlottetown": (46.23, -63.13)},
+    "Newfoundland Region": {"St. John's": (47.56, -52.71), "Argentia": (47.30, -53.99),
+                            "Corner Brook": (48.95, -57.95)},
+    "Arctic Region": {"Iqaluit": (63.75, -68.52), "Churchill": (58.77, -94.17)},
+    "East Canadian Water Region": {"Atlantic Ocean": (44.00, -55.00)},
+    "West Canadian Water Region": {"Pacific Ocean": (48.00, -130.00)},
+}
+
+# vessel type -> share of the voyages.
+VESSELS = {"Cargo": 0.34, "Tanker": 0.16, "Tug": 0.14, "Passenger": 0.11, "Fishing": 0.1,
+           "Special Purpose": 0.08, "Government": 0.05, "Pleasure Craft": 0.02}
+
+EVENTS = ("Departure", "CIP Passage", "Arrival")
+
+FIRST_ID = 2079000000000000
+
+
+def get_harbours(skew=1.1):
+    '''
+    Lists the harbours with their traffic share: the share of the region
+    (see REGIONS), split over its harbours by a Zipf law of their rank.
+
+    Args:
+        skew: exponent of the Zipf law, 0 for uniform traffic in a region
+    Returns:
+        dataframe of the harbours: Region, Hardour, Latitude, Longitude, Weight.
+    '''
+
+    rows = []
+    for region, harbours in HARBOURS.items():
+        weights = 1 / np.arange(1, len(harbours) + 1) ** skew
+        weights = REGIONS[region] * weights / weights.sum()
+        for (harbour, (latitude, longitude)), weight in zip(harbours.items(), weights):
+            rows.append((region, harbour, latitude, longitude, weight))
+    harbours = pd.DataFrame(rows, columns=["Region", "Hardour", "Latitude", "Longitude", "Weight"])
+    harbours["Weight"] /= harbours.Weight.sum()
+
+    return harbours
+
+
+def generate_trips(rng, rows, first_id, start, end, harbours, local_share=0.6):
+    '''
+    Generates trips.
+
+    Args:
+        rng: numpy random generator
+        rows: number of trips
+        first_id: Id of the first trip
+        start: first year of the departures (inclusive)
+        end: last year of the departures (inclusive)
+        harbours: the harbours, see get_harbours
+        local_share: share of the voyages arriving in the region they departed from
+    Returns:
+        dataframe of the trips, with the columns of trips_slim.csv, and the
+        departure and arrival positions in the harbours (numpy arrays).
+    '''
+
+    departure = rng.choice(harbours.shape[0], rows, p=harbours.Weight.to_numpy())
+    arrival = rng.choice(harbours.shape[0], rows, p=harbours.Weight.to_numpy())
+
+    # local voyages: the arrival harbour is drawn among the harbours of the departure region.
+    regions = harbours.Region.to_numpy()
+    local = rng.random(rows) < local_share
+    for region in np.unique(regions):
+        in_region = np.flatnonzero(regions == region)
+        chosen = np.flatnonzero(local & (regions[departure] == region))
+        weights = harbours.Weight.to_numpy()[in_region]
+        arrival[chosen] = rng.choice(in_region, chosen.shape[0], p=weights / weights.sum())
+
+    first, last = np.array([str(start), str(end + 1)], dtype="M8[Y]").astype("M8[s]").astype(np.int64)
+    departure_date = rng.integers(first, last, rows).astype("M8[s]")
+    # durations: log-normal, a day or so, from half an hour to a month.
+    hours = np.clip(rng.lognormal(np.log(20), 1.0, rows), 0.5, 720)
+    arrival_date = departure_date + (hours * 3600).astype(np.int64).astype("m8[s]")
+
+    trips = pd.DataFrame({
+        "Id": first_id + np.arange(rows, dtype=np.int64),
+        "Departure Date": format_dates(departure_date),
+        "Departure Hardour": harbours.Hardour.to_numpy()[departure],
+        "Departure Region": regions[departure],
+        "Arrival Date": format_dates(arrival_date),
+        "Arrival Hardour": harbours.Hardour.to_numpy()[arrival],
+        "Arrival Region": regions[arrival],
+        "Vessel Type": rng.choice(list(VESSELS), rows, p=list(VESSELS.values())),
+    }, columns=preprocess.TRIP_COLUMNS)
+
+    return trips, departure, arrival
+
+
+def format_dates(dates):
+    '''
+    Args:
+        dates: numpy datetime64 array
+    Returns:
+        numpy array of the dates formatted like the sources, "2015-03-01 12:00:00".
+    '''
+
+    # "2015-03-01T12:00:00": the separator is replaced in the bytes, np.char.replace is slow.
+    text = np.datetime_as_string(dates, unit="s").astype("S19")
+    characters = text.view(np.uint8).reshape(-1, 19)
+    characters[:, 10] = ord(" ")
+
+    return characters.reshape(-1).view("S19").astype("U19")
+
+
+def generate_passages(rng, trips, departure, arrival, harbours, share=0.2, mean_passages=8):
+    '''
+    Generates the passages of some of the trips: a departure, positions
+    reported on the way, then an arrival.
+
+    Args:
+        rng: numpy random generator
+        trips: the trips, see generate_trips
+        departure: positions of the departure harbours of the trips
+        arrival: positions of the arrival harbours of the trips
+        harbours: the harbours, see get_harbours
+        share: share of the trips having passages
+        mean_passages: average number of positions reported on the way
+    Returns:
+        dataframe of the passages, with the columns of detail_sample.csv.
+    '''
+
+    chosen = np.flatnonzero(rng.random(trips.shape[0]) < share)
+    sizes = 2 + rng.poisson(mean_passages, chosen.shape[0])
+    trip = np.repeat(chosen, sizes)
+    starts = np.cumsum(sizes) - sizes
+    rank = np.arange(trip.shape[0]) - np.repeat(starts, sizes)
+    last = np.repeat(sizes - 1, sizes)
+    step = rank / last
+
+    origin = harbours[["Latitude", "Longitude"]].to_numpy()[departure[trip]]
+    destination = harbours[["Latitude", "Longitude"]].to_numpy()[arrival[trip]]
+    noise = rng.normal(0, 0.2, (trip.shape[0], 2)) * np.sin(np.pi * step)[:, None]
+    position = origin + (destination - origin) * step[:, None] + noise
+
+    event = np.where(rank == 0, 0, np.where(rank == last, 2, 1))
+    # passages are reported in the harbour of departure, then in the one of arrival.
+    harbour = np.where(rank == 0, departure[trip], arrival[trip])
+
+    return pd.DataFrame({
+        "Id": trips.Id.to_numpy()[trip],
+        "Latitude": position[:, 0],
+        "Longitude": position[:, 1],
+        "Hardour": harbours.Hardour.to_numpy()[harbour],
+        "Region": harbours.Region.to_numpy()[harbour],
+        "Event Type": np.array(EVENTS, dtype=object)[event],
+        "Rank Number": rank + 1,
+    }, columns=preprocess.PASSAGE_COLUMNS)
+
+
+def generate(rows, seed=0, start=2011, end=2021, passage_share=0.2, skew=1.1, chunksize=CHUNK_SIZE):
+    '''
+    Generates trips and their passages, in chunks.
+
+    Args:
+        rows: number of trips
+        seed: seed of the random generators
+        start: first year of the departures (inclusive)
+        end: last year of the departures (inclusive)
+        passage_share: share of the trips having passages
+        skew: exponent of the Zipf law of the harbour traffic
+        chunksize: number of trips per chunk
+    Yields:
+        The trips and the passages of each chunk.
+    '''
+
+    harbours = get_harbours(skew)
+    for number, first in enumerate(range(0, rows, chunksize)):
+        rng = np.random.default_rng([seed, number])
+        trips, departure, arrival = generate_trips(rng, min(chunksize, rows - first), FIRST_ID + first,
+                                                   start, end, harbours)
+        yield trips, generate_passages(rng, trips, departure, arrival, harbours, passage_share)
+
+
+def generate_frames(rows, seed=0, **options):
+    '''
+    Generates trips and their passages in memory.
+
+    Args:
+        rows: number of trips
+        seed: seed of the random generators
+        options: see generate
+    Returns:
+        The trips dataframe and the passages dataframe.
+    '''
+
+    chunks = list(generate(rows, seed, **options))
+    if not chunks:
+        chunks = list(generate(1, seed, **options))
+        chunks = [(trips.iloc[0:0], passages.iloc[0:0]) for trips, passages in chunks]
+
+    return (pd.concat([trips for trips, _ in chunks], ignore_index=True),
+            pd.concat([passages for _, passages in chunks], ignore_index=True))
+
+
+def write_csv(out_dir, rows, seed=0, **options):
+    '''
+    Writes generated trips and passages as the source CSVs, one chunk at a time.
+
+    Args:
+        out_dir: directory of the CSVs
+        rows: number of trips
+        seed: seed of the random generators
+        options: see generate
+    Returns:
+        The paths of the trips and of the passages CSVs.
+    '''
+
+    os.makedirs(out_dir, exist_ok=True)
+    trips_path = os.path.join(out_dir, "trips_slim.csv")
+    detail_path = os.path.join(out_dir, "detail_sample.csv")
+    for number, (trips, passages) in enumerate(generate(rows, seed, **options)):
+        trips.to_csv(trips_path, index=False, mode="w" if number == 0 else "a", header=number == 0)
+        passages.to_csv(detail_path, index=False, mode="w" if number == 0 else "a", header=number == 0)
+
+    return trips_path, detail_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic trips and passages CSVs.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--trips", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=int, default=2011)
+    parser.add_argument("--end", type=int, default=2021)
+    parser.add_argument("--passage-share", type=float, default=0.2)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    paths = write_csv(args.out_dir, args.trips, args.seed, start=args.start, end=args.end,
+                      passage_share=args.passage_share, skew=args.skew, chunksize=args.chunksize)
+    print("wrote {} and {}".format(*paths))
@@ -52,6 +52,31 @@ def create_custom_theme():
     )
     pio.templates['new_theme'].layout.colorscale.sequential = THEME["colorscale"]
 
+def get_loading_figure():
+    '''
+        Returns the figure displayed while the data is loading.
+    '''
+
+    fig = go.Figure()
+    fig.update_layout(
+        showlegend=False,
+        xaxis={"visible": False},
+        yaxis={"visible": False},
+        dragmode=False,
+        annotations=[
+            dict(
+                xref="paper",
+                yref="paper",
+                text="Warming up, the data is loading...",
+                showarrow=False,
+                align="center",
+            )
+        ]
+    )
+
+    return fig
+
+
 def set_default_theme():
     '''
         Sets the default theme to be a combination of the
@@ -0,0 +1,71 @@
+'''
+    The modules of the app are imported from src, as the app does. The
+    fixtures are small synthetic datasets (see synthetic.py), built once.
+'''
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset  # noqa: E402  pylint: disable=wrong-import-position
+import encoding  # noqa: E402  pylint: disable=wrong-import-position
+import preprocess  # noqa: E402  pylint: disable=wrong-import-position
+import synthetic  # noqa: E402  pylint: disable=wrong-import-position
+
+
+TRIPS = 3000
+
+
+def read_frames(trips_raw, passages_raw):
+    '''
+    Reads trips and passages as the app does: dates converted, years
+    filtered, names encoded.
+
+    Returns:
+        The trips and the passages.
+    '''
+
+    trips = preprocess.filter_years(preprocess.convert_dates(trips_raw), 2011, 2021).reset_index(drop=True)
+    passages = preprocess.convert_dates(passages_raw)
+    dictionaries = encoding.build_dictionaries(trips, passages)
+
+    return encoding.encode(trips.copy(), dictionaries), encoding.encode(passages.copy(), dictionaries)
+
+
+@pytest.fixture(scope="session")
+def raw():
+    '''
+    Trips and passages, as read from the CSVs.
+    '''
+
+    return synthetic.generate_frames(TRIPS, seed=7)
+
+
+@pytest.fixture(scope="session")
+def frames(raw):
+    '''
+    Trips and passages, as read by the app.
+    '''
+
+    return read_frames(*raw)
+
+
+@pytest.fixture(scope="session")
+def data(frames):
+    '''
+    The dataset of the trips and passages, see dataset.py
+    '''
+
+    return dataset.build_dataset(*frames, "test")
+
+
+@pytest.fixture(scope="session")
+def sources(tmp_path_factory):
+    '''
+    The paths of the source CSVs of the trips and passages.
+    '''
+
+    return synthetic.write_csv(str(tmp_path_factory.mktemp("sources")), TRIPS, seed=7)
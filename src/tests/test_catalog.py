@@ -0,0 +1,58 @@
+'''
+    Tests of the catalog of the regions, harbours and vessel types.
+'''
+
+import pandas as pd
+
+import catalog
+import cube
+import encoding
+
+
+def count_harbours(trips):
+    '''
+    Returns:
+        The voyages from and to each harbour counted by pandas, by region and harbour.
+    '''
+
+    directions = [trips[["Departure Region", "Departure Hardour"]].set_axis(["region", "harbour"], axis=1),
+                  trips[["Arrival Region", "Arrival Hardour"]].set_axis(["region", "harbour"], axis=1)]
+
+    return pd.concat(directions).astype(object).dropna().groupby(["region", "harbour"]).size()
+
+
+def test_catalog_counts_the_voyages_of_each_harbour(frames):
+    trips = frames[0]
+    expected = count_harbours(trips)
+
+    data_catalog = catalog.build_catalog(cube.build_cube(trips))
+
+    assert data_catalog["totals"] == {region: counts.droplevel(0).to_dict()
+                                      for region, counts in expected.groupby(level=0)}
+    assert data_catalog["harbours"] == {region: sorted(counts.index.get_level_values(1))
+                                        for region, counts in expected.groupby(level=0)}
+    assert [option["value"] for option in data_catalog["vessel_options"]] == \
+        sorted(trips["Vessel Type"].dropna().astype(object).unique())
+
+
+def test_harbour_options_of_a_region(frames):
+    data_catalog = catalog.build_catalog(cube.build_cube(frames[0]))
+    region = data_catalog["region_options"][0]["value"]
+
+    options = catalog.get_harbour_options(data_catalog, region)
+
+    assert options == [{"label": name, "value": name} for name in data_catalog["harbours"][region]]
+    assert catalog.get_harbour_options(data_catalog, "Atlantis") == []
+
+
+def test_merged_catalogs_are_the_catalog_of_all_the_trips(frames):
+    trips = frames[0]
+    parts = []
+    for part in (trips.iloc[:100], trips.iloc[100:]):
+        part = part.assign(**{column: part[column].astype(object) for column in encoding.ENCODED_COLUMNS
+                              if column in part.columns})
+        parts.append(encoding.encode(part, encoding.build_dictionaries(part)))
+
+    merged = catalog.merge_catalogs(*[catalog.build_catalog(cube.build_cube(part)) for part in parts])
+
+    assert merged == catalog.build_catalog(cube.build_cube(trips))
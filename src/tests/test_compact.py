@@ -0,0 +1,64 @@
+'''
+    Tests of the compact arrays of the figures.
+'''
+
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+import compact
+
+
+def decode_array(typed):
+    '''
+    Returns:
+        The values of a typed array, decoded as the browser does (see assets/clientside.js).
+    '''
+
+    return np.frombuffer(base64.b64decode(typed["bdata"]), dtype=np.dtype(typed["dtype"]).newbyteorder("<"))
+
+
+@pytest.mark.parametrize("values, dtype", [([0, 255], "u1"), ([-1, 127], "i1"), ([0, 65535], "u2"),
+                                           ([-300, 300], "i2"), ([0, 2**32 - 1], "u4"), ([-2**31, 5], "i4"),
+                                           ([0, 2**40], "f8"), ([], "u1")])
+def test_typed_arrays_round_trip(values, dtype):
+    typed = compact.encode_array(np.array(values, dtype=np.int64))
+
+    assert typed["dtype"] == dtype
+    assert decode_array(typed).tolist() == values
+
+
+def test_only_long_integer_arrays_are_encoded():
+    counts = np.arange(compact.MIN_TYPED_LENGTH)
+    figure = {"data": [{"type": "bar", "y": counts, "x": counts[:3], "customdata": counts / 2,
+                        "name": "counts"}]}
+
+    trace = compact.encode_traces(figure)["data"][0]
+
+    assert decode_array(trace["y"]).tolist() == counts.tolist()
+    assert trace["x"].tolist() == [0, 1, 2]
+    assert trace["customdata"].dtype == np.float64
+    assert trace["name"] == "counts"
+
+
+def test_integers_and_colors():
+    assert compact.to_integers([1.0, 2.0, 3.0]).dtype == np.int64
+    assert compact.to_integers([1.0, 2.5]).tolist() == [1.0, 2.5]
+    assert compact.to_integers([1.0, np.nan]).dtype == np.float64
+    assert compact.round_colors([0.123456, -np.inf]).tolist() == [0.123, -np.inf]
+
+
+def test_evenly_spaced_dates_are_a_start_and_a_step():
+    trace = go.Scatter(y=[1, 2, 3])
+    compact.set_dates(trace, pd.Series(pd.date_range("2015-01-01", periods=3, freq="7D")))
+
+    assert trace.x is None
+    assert trace.x0 == "2015-01-01" and trace.dx == 7 * compact.MS_PER_DAY
+
+    uneven = go.Scatter(y=[1, 2, 3])
+    dates = pd.Series(pd.to_datetime(["2015-01-01", "2015-02-01", "2015-03-01"]))
+    compact.set_dates(uneven, dates)
+    assert uneven.x0 is None and len(uneven.x) == 3
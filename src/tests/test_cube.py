@@ -0,0 +1,98 @@
+'''
+    Tests of the count cube against pandas group-bys of the trips.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+import encoding
+
+
+def count_trips(trips, direction, by):
+    '''
+    Returns:
+        The voyages of a direction counted by pandas, indexed by names and years.
+    '''
+
+    date, region, harbour = cube.DIRECTION_COLUMNS[direction]
+    values = pd.DataFrame({"region": trips[region].astype(object), "harbour": trips[harbour].astype(object),
+                           "vessel": trips["Vessel Type"].astype(object), "year": trips[date].dt.year})
+
+    return values.dropna(subset=[value for value in by if value != "year"]).groupby(by).size()
+
+
+def decode(trips):
+    '''
+    Returns:
+        The trips with their names decoded.
+    '''
+
+    return trips.assign(**{column: trips[column].astype(object) for column in trips.columns
+                           if column in encoding.ENCODED_COLUMNS})
+
+
+def count_cells(data_cube, directions, by, **values):
+    '''
+    Returns:
+        The voyages counted by the cube, indexed by names and years.
+    '''
+
+    counts = cube.aggregate(data_cube, cube.select(data_cube, directions, **values), by)
+    names = {"region": data_cube["regions"], "harbour": data_cube["harbours"], "vessel": data_cube["vessels"]}
+    frame = counts.reset_index()
+    frame = frame[np.all([frame[value] >= 0 for value in by if value in names] or [True], axis=0)]
+    for value in by:
+        if value in names:
+            frame[value] = [names[value][code] for code in frame[value]]
+
+    return frame.set_index(by)["Counts"]
+
+
+@pytest.mark.parametrize("direction", [cube.DEPARTURE, cube.ARRIVAL])
+def test_counts_by_region_and_year(frames, direction):
+    trips = frames[0]
+    data_cube = cube.build_cube(trips)
+
+    expected = count_trips(trips, direction, ["region", "year"])
+
+    pd.testing.assert_series_equal(count_cells(data_cube, [direction], ["region", "year"]), expected,
+                                   check_names=False, check_dtype=False)
+
+
+def test_counts_of_a_harbour_and_vessel_type(frames):
+    trips = frames[0]
+    data_cube = cube.build_cube(trips)
+    region = trips["Departure Region"].mode()[0]
+    harbour = trips.loc[trips["Departure Region"] == region, "Departure Hardour"].mode()[0]
+
+    rows = cube.select(data_cube, [cube.DEPARTURE], region=region, harbour=harbour, vessel="Cargo", year=2015)
+
+    expected = ((trips["Departure Region"] == region) & (trips["Departure Hardour"] == harbour)
+                & (trips["Vessel Type"] == "Cargo") & (trips["Departure Date"].dt.year == 2015)).sum()
+    assert data_cube["counts"][rows].sum() == expected
+    assert cube.select(data_cube, [cube.DEPARTURE], region="Atlantis").shape[0] == 0
+
+
+def test_both_directions_add_up(frames):
+    data_cube = cube.build_cube(frames[0])
+
+    both = data_cube["counts"][cube.select(data_cube, cube.get_directions(cube.BOTH))].sum()
+
+    assert both == 2 * frames[0].shape[0]
+
+
+def test_merged_cubes_count_all_the_trips(frames):
+    trips = frames[0]
+    first, second = trips.iloc[:100], trips.iloc[100:]
+    # each part with its own names, as new trips are received.
+    parts = [encoding.encode(decode(part), encoding.build_dictionaries(decode(part)))
+             for part in (first, second)]
+
+    merged = cube.merge_cubes(cube.build_cube(parts[0]), cube.build_cube(parts[1]))
+    built = cube.build_cube(trips)
+
+    for direction in (cube.DEPARTURE, cube.ARRIVAL):
+        pd.testing.assert_series_equal(count_cells(merged, [direction], ["region", "harbour", "vessel", "day"]),
+                                       count_cells(built, [direction], ["region", "harbour", "vessel", "day"]))
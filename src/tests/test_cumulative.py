@@ -0,0 +1,108 @@
+'''
+    Tests of the per-day cumulative counts against scans of the trips.
+'''
+
+import numpy as np
+import pytest
+
+import cube
+import cumulative
+import encoding
+import summary_stats
+
+
+def get_day(dates):
+    '''
+    Returns:
+        The days since epoch of dates.
+    '''
+
+    return dates.values.view("int64") // cumulative.NS_PER_DAY
+
+
+def get_ranges(trips, count=20, seed=0):
+    '''
+    Returns:
+        Random (first, last) days, within and beyond the days of the trips.
+    '''
+
+    days = get_day(trips["Departure Date"])
+    bounds = np.random.default_rng(seed).integers(days.min() - 30, days.max() + 30, (count, 2))
+
+    return [(int(first), int(last)) for first, last in np.sort(bounds, axis=1)] + [(int(days.min()), int(days.max()))]
+
+
+def build(trips):
+    '''
+    Returns:
+        The cumulative counts of trips.
+    '''
+
+    return cumulative.build(cube.build_cube(trips), summary_stats.get_columns(trips))
+
+
+def test_yearly_counts_of_a_range_are_the_filtered_trips(frames):
+    trips = frames[0]
+    tables = build(trips)
+    day = get_day(trips["Departure Date"])
+
+    for days in get_ranges(trips):
+        names, years, counts = cumulative.sum_by_year(tables["region"], [(0,)], days)
+
+        selected = trips[(day >= days[0]) & (day <= days[1])]
+        expected = selected.groupby([selected["Departure Region"].astype(object),
+                                     selected["Departure Date"].dt.year]).size()
+        found = {(name, int(year)): int(count) for name, row in zip(names, counts)
+                 for year, count in zip(years, row) if count}
+        assert found == {key: int(count) for key, count in expected.items()}
+
+
+def test_stats_of_a_range_are_the_stats_of_the_filtered_trips(frames):
+    trips = frames[0].sort_values("Departure Date", kind="stable").reset_index(drop=True)
+    tables = build(trips)
+    columns = summary_stats.get_columns(trips)
+    day = get_day(trips["Departure Date"])
+
+    for days in get_ranges(trips, seed=1):
+        stats, names = cumulative.get_stats(tables["trips"], days)
+
+        expected = summary_stats.compute_stats(columns, (day >= days[0]) & (day <= days[1]))
+        assert names == columns["vessels"]
+        assert stats["count"] == expected["count"] and stats["international"] == expected["international"]
+        assert stats["duration_hours"] == pytest.approx(expected["duration_hours"])
+        assert np.array_equal(stats["vessels"], expected["vessels"])
+
+
+def test_merged_counts_are_the_counts_of_all_the_trips(frames):
+    trips = frames[0]
+    parts = []
+    # the parts have their own names and days.
+    for part in (trips[trips["Departure Date"].dt.year < 2014], trips[trips["Departure Date"].dt.year >= 2014]):
+        part = part.assign(**{column: part[column].astype(object) for column in encoding.ENCODED_COLUMNS
+                              if column in part.columns})
+        parts.append(build(encoding.encode(part, encoding.build_dictionaries(part))))
+
+    merged = cumulative.merge(*parts)
+    built = build(trips)
+
+    for days in get_ranges(trips, seed=2):
+        for name, prefixes in (("region", [(0,), (1,)]), ("harbour", [(1, "Pacific Region")]),
+                               ("vessel", [(0, "Cargo")])):
+            for result, expected in zip(cumulative.sum_by_year(merged[name], prefixes, days),
+                                        cumulative.sum_by_year(built[name], prefixes, days)):
+                assert np.array_equal(result, expected)
+        stats, names = cumulative.get_stats(merged["trips"], days)
+        expected, expected_names = cumulative.get_stats(built["trips"], days)
+        assert names == expected_names
+        assert stats["count"] == expected["count"]
+        assert np.array_equal(stats["vessels"], expected["vessels"])
+
+
+def test_days_of_the_slider_are_within_the_data(frames):
+    tables = build(frames[0])
+    first_day, last_day = tables["region"]["first_day"], tables["region"]["first_day"] + tables["region"]["days"] - 1
+
+    assert cumulative.get_days(tables, None) is None
+    assert cumulative.get_days(tables, [first_day - 10, last_day + 10]) is None
+    assert cumulative.get_days(tables, [first_day - 10, first_day + 5]) == (first_day, first_day + 5)
+    assert cumulative.get_days(tables, [last_day, first_day + 5]) == (first_day + 5, last_day)
@@ -0,0 +1,164 @@
+'''
+    Tests of the deltas: merged into the dataset, saved, replayed after a
+    restart and kept across rebuilds of the snapshot.
+'''
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import dataset
+import delta
+import snapshot
+import summary_stats
+
+
+def load(snapshot_dir, delta_dir, sources, shared=False):
+    '''
+    Loads the dataset as the app does (see app.load_dataset).
+
+    Returns:
+        The dataset with the saved deltas applied.
+    '''
+
+    delta.adopt(delta_dir, os.path.join(snapshot_dir, "deltas"))
+    trips, passages, generation, orders = snapshot.load(snapshot_dir, *sources, 2011, 2021, shared=shared)
+    delta.carry_over(delta_dir, generation["sources"])
+    data = dataset.build_dataset(trips, passages, generation["version"], orders)
+    data.update(sources=generation["sources"], deltas=generation["deltas"], folded=generation["deltas"])
+
+    return delta.sync(data, delta_dir, 2011, 2021)
+
+
+def as_values(dataframe):
+    '''
+    Returns:
+        The frame with its categorical columns as names.
+    '''
+
+    return dataframe.assign(**{column: dataframe[column].astype(object) for column in dataframe.columns
+                               if dataframe[column].dtype == "category"}).reset_index(drop=True)
+
+
+def received(content):
+    '''
+    Returns:
+        The number of trips of a delta kept, in the years of the dataset.
+    '''
+
+    return delta.read_delta(content, "trips", 2011, 2021).shape[0]
+
+
+@pytest.fixture
+def parts(raw, tmp_path):
+    '''
+    The sources without their last trips, and those trips as a delta.
+    '''
+
+    trips, passages = raw
+    directory = tmp_path / "sources"
+    directory.mkdir()
+    trips.iloc[:2500].to_csv(str(directory / "trips.csv"), index=False)
+    passages.to_csv(str(directory / "passages.csv"), index=False)
+
+    return (str(directory / "trips.csv"), str(directory / "passages.csv")), \
+        trips.iloc[2500:].to_csv(index=False).encode()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    return str(tmp_path / "snapshot"), str(tmp_path / "deltas")
+
+
+def test_merged_delta_is_the_dataset_of_all_the_trips(raw, parts, dirs, tmp_path):
+    sources, content = parts
+    data = load(*dirs, sources)
+
+    merged = delta.apply_delta(data, content, "trips", 2011, 2021)
+
+    raw[0].to_csv(str(tmp_path / "all.csv"), index=False)
+    expected = load(str(tmp_path / "all"), str(tmp_path / "all-deltas"), (str(tmp_path / "all.csv"), sources[1]))
+    pd.testing.assert_frame_equal(as_values(merged["trips"]), as_values(expected["trips"]))
+    assert merged["catalog"] == expected["catalog"]
+    assert summary_stats.get_summary(merged["columns"]) == summary_stats.get_summary(expected["columns"])
+
+
+def test_appended_delta_is_synced_by_the_other_workers(parts, dirs):
+    sources, content = parts
+    first, second = load(*dirs, sources), load(*dirs, sources)
+
+    appended = delta.append(first, dirs[1], content, "trips", 2011, 2021)
+    synced = delta.sync(second, dirs[1], 2011, 2021)
+
+    assert appended["deltas"] == synced["deltas"] == 1
+    assert synced["version"] == appended["version"] != first["version"]
+    assert synced["trips"].shape[0] == first["trips"].shape[0] + received(content)
+    assert delta.sync(synced, dirs[1], 2011, 2021) is synced
+
+
+def test_deltas_are_replayed_after_a_new_snapshot_format(parts, dirs, monkeypatch):
+    sources, content = parts
+    appended = delta.append(load(*dirs, sources), dirs[1], content, "trips", 2011, 2021)
+    monkeypatch.setattr(snapshot, "FORMAT_VERSION", snapshot.FORMAT_VERSION + 1)
+
+    reloaded = load(*dirs, sources)
+
+    assert snapshot.read_manifest(dirs[0])["format"] == snapshot.FORMAT_VERSION
+    assert reloaded["deltas"] == 1
+    pd.testing.assert_frame_equal(as_values(reloaded["trips"]), as_values(appended["trips"]))
+
+
+def test_deltas_are_carried_over_when_the_sources_change(raw, parts, dirs):
+    sources, content = parts
+    appended = delta.append(load(*dirs, sources), dirs[1], content, "trips", 2011, 2021)
+    raw[0].iloc[:2].assign(Id=lambda rows: rows["Id"] + 10**9).to_csv(sources[0], mode="a", header=False,
+                                                                       index=False)
+
+    reloaded = load(*dirs, sources)
+
+    assert reloaded["sources"] != appended["sources"]
+    assert reloaded["deltas"] == 1
+    assert reloaded["trips"].shape[0] == appended["trips"].shape[0] + 2
+    assert os.listdir(dirs[1]) == [delta.get_directory(dirs[1], reloaded["sources"])[len(dirs[1]) + 1:]]
+
+
+def test_deltas_of_the_snapshot_directory_are_adopted(parts, dirs):
+    sources, content = parts
+    data = load(*dirs, sources)
+    # older versions saved the deltas in the snapshot directory, by snapshot checksum.
+    legacy = os.path.join(dirs[0], "deltas", "0123456789abcdef")
+    delta.save_delta(legacy, content, "trips")
+    shutil.rmtree(dirs[1], ignore_errors=True)
+
+    reloaded = load(*dirs, sources)
+
+    assert not os.path.exists(os.path.join(dirs[0], "deltas", "0123456789abcdef", "000000-trips.csv"))
+    assert reloaded["deltas"] == 1
+    assert reloaded["trips"].shape[0] == data["trips"].shape[0] + received(content)
+
+
+def test_folded_deltas_are_loaded_memory_mapped(raw, parts, dirs):
+    sources, _ = parts
+    first, second = [raw[0].iloc[rows].to_csv(index=False).encode() for rows in (slice(2500, 2750), slice(2750, None))]
+    appended = delta.append(load(*dirs, sources), dirs[1], first, "trips", 2011, 2021)
+    checksum = snapshot.read_manifest(dirs[0])["checksum"]
+
+    assert delta.fold(appended, dirs[0])
+    folded = load(*dirs, sources, shared=True)
+
+    assert snapshot.read_manifest(dirs[0])["checksum"] == checksum
+    assert folded["version"] == appended["version"]
+    assert folded["deltas"] == folded["folded"] == 1
+    pd.testing.assert_frame_equal(as_values(folded["trips"]), as_values(appended["trips"]))
+    assert not folded["trips"]["Id"].to_numpy().flags.writeable
+    assert not delta.fold(folded, dirs[0])
+
+    # only the deltas saved after the folded ones are replayed.
+    appended = delta.append(folded, dirs[1], second, "trips", 2011, 2021)
+    reloaded = load(*dirs, sources, shared=True)
+
+    assert reloaded["deltas"] == 2 and reloaded["folded"] == 1
+    assert reloaded["version"] == appended["version"]
+    pd.testing.assert_frame_equal(as_values(reloaded["trips"]), as_values(appended["trips"]))
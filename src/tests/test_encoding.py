@@ -0,0 +1,57 @@
+'''
+    Tests of the dictionary encoding of the names.
+'''
+
+import numpy as np
+import pandas as pd
+
+import encoding
+import preprocess
+
+
+def test_encode_keeps_the_names(raw):
+    trips = preprocess.convert_dates(raw[0])
+    dictionaries = encoding.build_dictionaries(trips, raw[1])
+
+    encoded = encoding.encode(trips.copy(), dictionaries)
+
+    for column in ("Departure Region", "Arrival Hardour", "Vessel Type"):
+        assert encoded[column].dtype == "category"
+        assert encoded[column].astype(object).tolist() == trips[column].tolist()
+
+
+def test_dictionaries_are_shared_by_the_trips_and_passages(frames):
+    trips, passages = frames
+
+    dictionaries = encoding.get_dictionaries(trips, passages)
+
+    assert list(trips["Departure Region"].cat.categories) == list(passages["Region"].cat.categories)
+    assert dictionaries["region"] == sorted(set(trips["Departure Region"].astype(object))
+                                            | set(trips["Arrival Region"].astype(object))
+                                            | set(passages["Region"].dropna().astype(object)))
+
+
+def test_equals_compares_codes(frames):
+    trips = frames[0]
+
+    assert np.array_equal(encoding.equals(trips["Vessel Type"], "Cargo"),
+                          (trips["Vessel Type"].astype(object) == "Cargo").to_numpy())
+    assert not encoding.equals(trips["Vessel Type"], "Submarine").any()
+    assert encoding.get_code(trips["Vessel Type"], "Submarine") == -1
+
+
+def test_remap_keeps_missing_codes():
+    remap = encoding.get_remap(["b", "d"], ["a", "b", "c", "d"])
+    codes = np.array([0, 1, -1])
+
+    assert remap[codes].tolist() == [1, 3, -1]
+
+
+def test_encoded_frame_uses_less_memory(raw):
+    trips = preprocess.convert_dates(raw[0])
+    encoded = encoding.encode(trips.copy(), encoding.build_dictionaries(trips))
+
+    report = encoding.memory_report(trips, encoded)
+
+    assert isinstance(report, pd.DataFrame)
+    assert report.loc["Total", "After"] < report.loc["Total", "Before"]
@@ -0,0 +1,149 @@
+'''
+    Tests of the downloads into the cache, against a local HTTP server.
+'''
+
+import hashlib
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+import fetch
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    Serves the content of the server, in byte ranges if it accepts them,
+    and records the requests.
+    '''
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _headers(self):
+        self.send_header("ETag", self.server.etag)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.server.requests.append(("HEAD", None))
+        self.send_response(200)
+        self._headers()
+        self.send_header("Content-Length", str(len(self.server.content)))
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        content = self.server.content
+        requested = self.headers.get("Range")
+        self.server.requests.append(("GET", requested))
+        if requested and self.server.ranges and self.headers.get("If-Range") in (None, self.server.etag):
+            start, stop = (int(value) for value in requested[len("bytes="):].split("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, stop, len(content)))
+            content = content[start:stop + 1]
+        else:
+            self.send_response(200)
+        self._headers()
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.content = bytes(range(256)) * 40 + b"end"
+    httpd.etag = '"v1"'
+    httpd.ranges = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = "http://127.0.0.1:{}/trips.csv".format(httpd.server_address[1])
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def ranges(server):
+    return [requested for method, requested in server.requests if method == "GET"]
+
+
+def test_download_in_ranges(server, tmp_path):
+    path = fetch.download(server.url, str(tmp_path), chunk_size=1000, workers=3)
+
+    with open(path, "rb") as downloaded:
+        assert downloaded.read() == server.content
+    assert fetch.get_digest(path) == hashlib.sha256(server.content).hexdigest()
+    assert sorted(ranges(server)) == sorted("bytes={}-{}".format(start, min(start + 1000, len(server.content)) - 1)
+                                            for start in range(0, len(server.content), 1000))
+    assert not os.path.exists(fetch.get_paths(str(tmp_path), server.url)["partial"])
+
+
+def test_download_resumes(server, tmp_path):
+    paths = fetch.get_paths(str(tmp_path), server.url)
+    os.makedirs(os.path.dirname(paths["partial"]))
+    # an interrupted download: the first and third ranges were written.
+    with open(paths["partial"], "wb") as partial:
+        partial.write(server.content[:1000] + bytes(1000) + server.content[2000:3000])
+        partial.truncate(len(server.content))
+    with open(paths["state"], "w") as state:
+        json.dump({"etag": server.etag, "length": len(server.content), "chunk_size": 1000, "done": [0, 2]}, state)
+
+    path = fetch.download(server.url, str(tmp_path), chunk_size=1000)
+
+    with open(path, "rb") as downloaded:
+        assert downloaded.read() == server.content
+    assert "bytes=0-999" not in ranges(server) and "bytes=2000-2999" not in ranges(server)
+    assert "bytes=1000-1999" in ranges(server)
+
+
+def test_download_restarts_when_the_file_changed(server, tmp_path):
+    paths = fetch.get_paths(str(tmp_path), server.url)
+    os.makedirs(os.path.dirname(paths["partial"]))
+    with open(paths["partial"], "wb") as partial:
+        partial.write(bytes(len(server.content)))
+    with open(paths["state"], "w") as state:
+        json.dump({"etag": '"v0"', "length": len(server.content), "chunk_size": 1000, "done": [0, 1, 2]}, state)
+
+    path = fetch.download(server.url, str(tmp_path), chunk_size=1000)
+
+    with open(path, "rb") as downloaded:
+        assert downloaded.read() == server.content
+    assert "bytes=0-999" in ranges(server)
+
+
+def test_download_without_ranges(server, tmp_path):
+    server.ranges = False
+
+    path = fetch.download(server.url, str(tmp_path), chunk_size=1000)
+
+    with open(path, "rb") as downloaded:
+        assert downloaded.read() == server.content
+    assert ranges(server) == [None]
+
+
+def test_cached_url_is_not_downloaded_again(server, tmp_path):
+    first = fetch.download(server.url, str(tmp_path), chunk_size=1000)
+    server.requests.clear()
+
+    assert fetch.download(server.url, str(tmp_path), chunk_size=1000) == first
+    assert server.requests == [("HEAD", None)]
+    assert fetch.fetch(server.url, str(tmp_path)) == first
+    assert server.requests == [("HEAD", None)]
+
+
+def test_concurrent_downloads_download_once(server, tmp_path):
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(fetch.download(server.url, str(tmp_path), chunk_size=500)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(paths)) == 1 and len(paths) == 4
+    with open(paths[0], "rb") as downloaded:
+        assert downloaded.read() == server.content
+    assert len(ranges(server)) == len(range(0, len(server.content), 500))
@@ -0,0 +1,51 @@
+'''
+    Tests of the memoized figures.
+'''
+
+import flask
+
+import figure_cache
+
+
+def test_figure_is_built_once_per_version():
+    cache = figure_cache.new_cache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"data": len(builds)}
+
+    first = figure_cache.get_or_build(figure_cache.make_key("heatmap", "v1", 2015), build, cache)
+    again = figure_cache.get_or_build(figure_cache.make_key("heatmap", "v1", 2015), build, cache)
+    other = figure_cache.get_or_build(figure_cache.make_key("heatmap", "v2", 2015), build, cache)
+
+    assert first is again
+    assert other == {"data": 2}
+    assert figure_cache.get_stats(cache) == {"size": 2, "max_size": figure_cache.MAX_SIZE, "hits": 1,
+                                             "misses": 2, "evictions": 0, "hit_ratio": round(1 / 3, 4)}
+
+
+def test_least_recently_used_is_evicted():
+    cache = figure_cache.new_cache(max_size=2)
+    figure_cache.put("a", 1, cache)
+    figure_cache.put("b", 2, cache)
+    assert figure_cache.get("a", cache) == 1
+
+    figure_cache.put("c", 3, cache)
+
+    assert figure_cache.get("b", cache) is None
+    assert figure_cache.get("a", cache) == 1 and figure_cache.get("c", cache) == 3
+    assert figure_cache.get_stats(cache)["evictions"] == 1
+
+    figure_cache.clear(cache)
+    assert figure_cache.get_stats(cache)["size"] == 0
+
+
+def test_stats_endpoint():
+    server = flask.Flask(__name__)
+    figure_cache.register_routes(server)
+
+    response = server.test_client().get("/stats/figure-cache")
+
+    assert response.status_code == 200
+    assert set(response.json) == {"size", "max_size", "hits", "misses", "evictions", "hit_ratio"}
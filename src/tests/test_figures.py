@@ -0,0 +1,76 @@
+'''
+    Tests of the daily and monthly charts packed for the clientside toggle.
+'''
+
+import base64
+
+import numpy as np
+import pytest
+
+import figures
+
+
+def get_values(trace, name):
+    '''
+    Returns:
+        The values of an array of a trace, decoded if it is a typed array
+        (see compact.encode_array), as the browser does.
+    '''
+
+    values = trace[name]
+    if isinstance(values, dict):
+        return np.frombuffer(base64.b64decode(values["bdata"]), dtype=np.dtype(values["dtype"]).newbyteorder("<"))
+
+    return np.asarray(values)
+
+
+def count_trips(trips, direction, year, **names):
+    '''
+    Returns:
+        The number of trips departing (0) or arriving (1) in a year, from
+        and to the places named (region, harbour).
+    '''
+
+    prefix = ("Departure", "Arrival")[direction]
+    selected = trips[prefix + " Date"].dt.year == year
+    for name, value in names.items():
+        column = prefix + (" Region" if name == "region" else " Hardour")
+        selected &= trips[column] == value
+
+    return int(selected.sum())
+
+
+def check_packed(packed, expected):
+    '''
+    Checks the daily and monthly figures packed hold the expected voyages.
+    '''
+
+    daily, monthly = packed["daily"], packed["monthly"]
+
+    assert [trace["type"] for trace in daily["data"]] == ["scatter"]
+    assert [trace["type"] for trace in monthly["data"]] == ["bar"]
+    # the template is sent once, next to the figures.
+    assert packed["template"] is not None
+    assert "template" not in daily["layout"] and "template" not in monthly["layout"]
+    assert get_values(daily["data"][0], "y").sum() == get_values(monthly["data"][0], "y").sum() == expected
+    assert get_values(monthly["data"][0], "y").shape[0] == 12
+
+
+@pytest.mark.parametrize("direction", [0, 1])
+def test_region_frequencies_hold_both_charts(frames, data, direction):
+    trips = frames[0]
+    region = trips["Departure Region"].mode()[0]
+
+    packed = figures.get_region_frequencies(data, region, 2015, direction)
+
+    check_packed(packed, count_trips(trips, direction, 2015, region=region))
+
+
+def test_harbour_frequencies_hold_both_charts(frames, data):
+    trips = frames[0]
+    region = trips["Departure Region"].mode()[0]
+    harbour = trips.loc[trips["Departure Region"] == region, "Departure Hardour"].mode()[0]
+
+    packed = figures.get_harbour_frequencies(data, region, harbour, 0, 2015)
+
+    check_packed(packed, count_trips(trips, 0, 2015, region=region, harbour=harbour))
@@ -0,0 +1,83 @@
+'''
+    Tests of the origin-destination flows against pandas group-bys.
+'''
+
+import flask
+import pandas as pd
+import pytest
+
+import encoding
+import flows
+
+
+FILTERS = [{}, {"years": (2014, 2016)}, {"vessel": "Cargo"}, {"region": "Quebec Region"},
+           {"years": (2012, 2012), "vessel": "Tug", "region": "Pacific Region"}, {"vessel": "Submarine"},
+           {"years": (1990, 2030)}]
+
+
+def count_flows(trips, level, years=None, vessel=None, region=None):
+    '''
+    Returns:
+        The voyages between origins and destinations counted by pandas, sorted
+        as get_flows sorts them.
+    '''
+
+    selected = trips
+    if years is not None:
+        selected = selected[selected["Departure Date"].dt.year.between(*years)]
+    if vessel is not None:
+        selected = selected[selected["Vessel Type"] == vessel]
+    if region is not None:
+        selected = selected[(selected["Departure Region"] == region) | (selected["Arrival Region"] == region)]
+    columns = ["Departure Region", "Arrival Region"] if level == "region" else ["Departure Hardour", "Arrival Hardour"]
+
+    counts = selected[columns].astype(object).dropna().groupby(columns).size()
+    flow_data = pd.DataFrame({"Origin": counts.index.get_level_values(0),
+                              "Destination": counts.index.get_level_values(1), "Counts": counts.to_numpy()})
+
+    return flow_data.sort_values(by=["Counts", "Origin", "Destination"], ascending=[False, True, True],
+                                 ignore_index=True)
+
+
+@pytest.mark.parametrize("level", ["region", "harbour"])
+@pytest.mark.parametrize("options", FILTERS)
+def test_flows_are_the_grouped_trips(frames, level, options):
+    trips = frames[0]
+
+    flow_data = flows.get_flows(flows.build_flows(trips), level, **options)
+
+    expected = count_flows(trips, level, **options)
+    pd.testing.assert_frame_equal(flow_data, expected, check_dtype=False)
+
+
+def test_merged_flows_are_the_flows_of_all_the_trips(frames):
+    trips = frames[0]
+    parts = []
+    # the parts have their own names and years.
+    for part in (trips[trips["Departure Date"].dt.year < 2014], trips[trips["Departure Date"].dt.year >= 2014]):
+        part = part.assign(**{column: part[column].astype(object) for column in encoding.ENCODED_COLUMNS
+                              if column in part.columns})
+        parts.append(flows.build_flows(encoding.encode(part, encoding.build_dictionaries(part))))
+
+    merged = flows.merge_flows(*parts)
+    built = flows.build_flows(trips)
+
+    assert flows.get_years(merged) == flows.get_years(built)
+    for level in flows.LEVELS:
+        for options in FILTERS:
+            pd.testing.assert_frame_equal(flows.get_flows(merged, level, **options),
+                                          flows.get_flows(built, level, **options))
+
+
+def test_api_returns_the_flows(frames, data):
+    server = flask.Flask(__name__)
+    flows.register_routes(server, lambda: data)
+    client = server.test_client()
+
+    response = client.get("/api/flows", query_string={"level": "harbour", "vessel_type": "Cargo", "start": 2015})
+
+    assert response.status_code == 200
+    expected = count_flows(frames[0], "harbour", years=(2015, 9999), vessel="Cargo")
+    assert response.json["flows"] == [{"origin": origin, "destination": destination, "voyages": int(counts)}
+                                      for origin, destination, counts in expected.itertuples(index=False)]
+    assert client.get("/api/flows", query_string={"level": "country"}).status_code == 400
@@ -0,0 +1,63 @@
+'''
+    Tests of the yearly counts of the harbours against pandas group-bys.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cube
+import encoding
+import preprocess
+
+
+def count_harbours(trips, region, direction):
+    '''
+    Returns:
+        The voyages of the harbours of a region by year counted by pandas,
+        a harbour per row and a year per column.
+    '''
+
+    counts = []
+    for prefix in [("Departure", "Arrival")[direction]] if direction < 2 else ["Departure", "Arrival"]:
+        in_region = trips[trips[prefix + " Region"] == region]
+        counts.append(in_region.groupby([in_region[prefix + " Hardour"].astype(object),
+                                         in_region[prefix + " Date"].dt.year]).size())
+
+    return pd.concat(counts).groupby(level=[0, 1]).sum().unstack(fill_value=0)
+
+
+@pytest.mark.parametrize("direction", [0, 1, 2])
+def test_yearly_counts_of_the_harbours(frames, direction):
+    trips = frames[0]
+    harbour_years = cube.build_harbour_years(cube.build_cube(trips))
+
+    for region in harbour_years["regions"]:
+        counts = preprocess.get_harbour_yearly_counts(harbour_years, region, direction)
+
+        expected = count_harbours(trips, region, direction)
+        expected = expected.reindex(index=counts.index, columns=harbour_years["years"], fill_value=0)
+        assert [date.year for date in counts.columns] == harbour_years["years"].tolist()
+        assert np.array_equal(counts.to_numpy(), expected.to_numpy())
+
+    assert preprocess.get_harbour_yearly_counts(harbour_years, "Atlantis", direction).empty
+
+
+def test_merged_counts_are_the_counts_of_all_the_trips(frames):
+    trips = frames[0]
+    parts = []
+    # the parts have their own names and years.
+    for part in (trips[trips["Departure Date"].dt.year < 2014], trips[trips["Departure Date"].dt.year >= 2014]):
+        part = part.assign(**{column: part[column].astype(object) for column in encoding.ENCODED_COLUMNS
+                              if column in part.columns})
+        part = encoding.encode(part, encoding.build_dictionaries(part))
+        parts.append(cube.build_harbour_years(cube.build_cube(part)))
+
+    merged = cube.merge_harbour_years(*parts)
+    built = cube.build_harbour_years(cube.build_cube(trips))
+
+    assert np.array_equal(merged["years"], built["years"])
+    assert list(merged["regions"]) == sorted(built["regions"])
+    for region, counts in built["regions"].items():
+        assert merged["regions"][region]["harbours"] == counts["harbours"]
+        assert np.array_equal(merged["regions"][region]["counts"], counts["counts"])
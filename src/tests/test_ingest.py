@@ -0,0 +1,64 @@
+'''
+    Tests of the streaming ingestion of the sources and of the chunked
+    build of the snapshot.
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+import preprocess
+import snapshot
+
+
+def test_streamed_trips_are_the_filtered_trips(sources):
+    streamed = pd.concat(ingest.stream_trips(sources[0], 2011, 2021, chunksize=700), ignore_index=True)
+    expected = preprocess.filter_years(preprocess.convert_dates(pd.read_csv(sources[0])), 2011, 2021)
+
+    pd.testing.assert_frame_equal(streamed, expected.reset_index(drop=True))
+
+
+def test_encoded_chunks_keep_their_codes():
+    dictionaries = ingest.new_dictionaries()
+    first = ingest.encode_chunk(pd.DataFrame({"Vessel Type": ["Tug", "Cargo", None]}), dictionaries)
+    second = ingest.encode_chunk(pd.DataFrame({"Vessel Type": ["Cargo", "Ferry"]}), dictionaries)
+
+    assert first["Vessel Type"].tolist() == [0, 1, -1]
+    assert second["Vessel Type"].tolist() == [1, 2]
+
+    names, remaps = ingest.sort_dictionaries(dictionaries)
+    assert names["vessel"] == ["Cargo", "Ferry", "Tug"]
+    assert [names["vessel"][code] for code in remaps["vessel"][[0, 1, 2]]] == ["Tug", "Cargo", "Ferry"]
+
+
+@pytest.mark.parametrize("rows, chunksize, high", [(0, 10, 5), (1, 10, 5), (5000, 300, 40), (1000, 64, 10**12),
+                                                   (4096, 4096, 3)])
+def test_chunked_sort_is_a_stable_argsort(tmp_path, monkeypatch, rows, chunksize, high):
+    # blocks of one row: every step of the merge is exercised.
+    monkeypatch.setattr(snapshot, "MERGE_BLOCK", 1)
+    values = np.random.default_rng(rows).integers(0, high, rows).astype(np.int64)
+    values.tofile(str(tmp_path / "values"))
+    mapped = snapshot._read_values(str(tmp_path / "values"), values.dtype, rows, True)
+
+    snapshot._argsort(mapped, str(tmp_path / "sorted"), str(tmp_path / "positions"), chunksize)
+
+    order = np.argsort(values, kind="stable")
+    assert np.array_equal(np.fromfile(str(tmp_path / "positions"), dtype=np.int64), order)
+    assert np.array_equal(np.fromfile(str(tmp_path / "sorted"), dtype=np.int64), values[order])
+    assert sorted(os.listdir(str(tmp_path))) == ["positions", "sorted", "values"]
+
+
+def test_snapshot_does_not_depend_on_the_chunk_size(sources, tmp_path, monkeypatch):
+    trips, passages, _, orders = snapshot.load(str(tmp_path / "large"), *sources, 2011, 2021)
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 257)
+    chunked_trips, chunked_passages, _, chunked_orders = snapshot.load(str(tmp_path / "small"), *sources,
+                                                                       2011, 2021, chunksize=257)
+
+    pd.testing.assert_frame_equal(chunked_trips, trips)
+    pd.testing.assert_frame_equal(chunked_passages, passages)
+    for name in ("values", "positions"):
+        assert np.array_equal(chunked_orders["trips"]["Arrival Date"][name], orders["trips"]["Arrival Date"][name])
+    assert np.all(np.diff(orders["trips"]["Arrival Date"]["values"]) >= 0)
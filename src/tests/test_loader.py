@@ -0,0 +1,103 @@
+'''
+    Tests of the background loading of the dataset.
+'''
+
+import threading
+
+import flask
+import pytest
+
+import delta
+import loader
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(loader, "_state", {"status": "starting", "dataset": None, "error": None,
+                                           "started": None, "loaded": None,
+                                           "reload": {"status": None, "error": None, "failures": 0, "retry": None}})
+    server = flask.Flask(__name__)
+    loader.register_routes(server)
+
+    return server.test_client()
+
+
+def test_dataset_is_served_once_loaded(client):
+    release = threading.Event()
+
+    def build():
+        release.wait(10)
+        return {"version": "v1"}
+
+    thread = loader.start(build)
+    assert loader.get_dataset() is None
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/healthz").json["status"] == "loading"
+
+    release.set()
+    thread.join(10)
+
+    assert loader.is_ready() and loader.get_dataset() == {"version": "v1"}
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json["version"] == "v1"
+
+
+def test_failed_load_is_reported(client):
+    def build():
+        raise ValueError("no sources")
+
+    loader.start(build).join(10)
+
+    response = client.get("/healthz")
+    assert response.status_code == 500
+    assert response.json["status"] == "failed"
+    assert "no sources" in response.json["error"]
+    assert client.get("/readyz").status_code == 503
+
+
+def test_set_dataset_replaces_the_dataset(client):
+    loader.set_dataset({"version": "v1"})
+    loader.set_dataset({"version": "v2"})
+
+    assert loader.get_status()["version"] == "v2"
+    assert client.get("/readyz").status_code == 200
+
+
+def test_failed_fold_keeps_the_dataset_and_backs_off(client, monkeypatch, tmp_path):
+    def fold(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(delta, "fold", fold)
+    built = []
+
+    def build():
+        # as app.fold_deltas: fold the deltas, then load the new generation.
+        delta.fold(loader.get_dataset(), str(tmp_path), 1)
+        built.append(True)
+        return {"version": "v2"}
+
+    loader.set_dataset({"version": "v1"})
+    loader.reload(build).join(10)
+
+    for path in ("/healthz", "/readyz"):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.json["status"] == "ready" and response.json["version"] == "v1"
+    reload = client.get("/healthz").json["reload"]
+    assert reload["status"] == "failed" and reload["failures"] == 1
+    assert "disk full" in reload["error"]
+    assert 0 < reload["retry_seconds"] <= loader.RELOAD_BACKOFF
+
+    # retried only once the backoff is over, twice as long after a second failure.
+    assert loader.reload(build) is None
+    loader._state["reload"]["retry"] = 0
+    loader.reload(build).join(10)
+    assert loader.get_status()["reload"]["failures"] == 2
+    assert loader.get_status()["reload"]["retry_seconds"] > loader.RELOAD_BACKOFF
+
+    monkeypatch.setattr(delta, "fold", lambda *args: True)
+    loader._state["reload"]["retry"] = 0
+    loader.reload(build).join(10)
+    assert built and loader.get_dataset() == {"version": "v2"}
+    assert "reload" not in loader.get_status()
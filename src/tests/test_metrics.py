@@ -0,0 +1,81 @@
+'''
+    Tests of the latency and payload metrics of the callbacks.
+'''
+
+import flask
+import pytest
+
+import figure_cache
+import metrics
+import response_cache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    metrics.clear()
+    monkeypatch.setattr(response_cache, "_responses", figure_cache.new_cache(response_cache.MAX_SIZE))
+    server = flask.Flask(__name__)
+
+    @server.route("/_dash-update-component", methods=["POST"])
+    def update():  # pylint: disable=unused-variable
+        with metrics.phase("data"):
+            metrics.add_rows(250)
+        metrics.add_figure_lookup("miss")
+        return flask.jsonify({"figure": [0] * 100})
+
+    # the metrics first, so they measure the hits of the response cache.
+    metrics.register_routes(server, lambda output: output.split(".")[0])
+    response_cache.register_routes(server, lambda: {"version": "v1"})
+
+    yield server.test_client()
+    metrics.clear()
+
+
+def get_samples(client):
+    '''
+    Returns:
+        dict of sample (name and labels) -> value of the /metrics endpoint.
+    '''
+
+    response = client.get("/metrics")
+    assert response.mimetype == "text/plain"
+
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in response.get_data(as_text=True)
+            .splitlines() if line and not line.startswith("#")}
+
+
+def test_callback_requests_are_measured(client):
+    body = {"output": "heatmap.figure", "inputs": []}
+
+    client.post("/_dash-update-component", json=body)
+    client.post("/_dash-update-component", json=body)
+
+    samples = get_samples(client)
+    assert samples['dash_callback_requests_total{callback="heatmap",cache="miss"}'] == 1
+    assert samples['dash_callback_requests_total{callback="heatmap",cache="hit"}'] == 1
+    assert samples['dash_callback_figure_cache_total{callback="heatmap",result="miss"}'] == 1
+    assert samples['dash_callback_duration_seconds_count{callback="heatmap",phase="total"}'] == 2
+    # the hit reads nothing.
+    assert samples['dash_callback_rows_scanned_bucket{callback="heatmap",le="0"}'] == 1
+    assert samples['dash_callback_rows_scanned_sum{callback="heatmap"}'] == 250
+    assert samples['dash_callback_response_bytes_count{callback="heatmap"}'] == 2
+
+
+def test_other_requests_are_not_measured(client):
+    client.get("/metrics")
+
+    assert not get_samples(client)
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics.clear()
+    for value in (0.001, 0.2, 20):
+        metrics.observe("dash_callback_duration_seconds", ("a", "total"), value)
+
+    lines = metrics.render().splitlines()
+    metrics.clear()
+
+    assert 'dash_callback_duration_seconds_bucket{callback="a",phase="total",le="0.005"} 1' in lines
+    assert 'dash_callback_duration_seconds_bucket{callback="a",phase="total",le="0.25"} 2' in lines
+    assert 'dash_callback_duration_seconds_bucket{callback="a",phase="total",le="10"} 2' in lines
+    assert 'dash_callback_duration_seconds_bucket{callback="a",phase="total",le="+Inf"} 3' in lines
@@ -0,0 +1,52 @@
+'''
+    Tests of the index of the passages by trip Id.
+'''
+
+import numpy as np
+import pandas as pd
+
+import passage_index
+
+
+def test_get_trip_is_the_filtered_passages(frames):
+    passages = frames[1]
+    index = passage_index.build_index(passages)
+
+    for trip_id in passages["Id"].drop_duplicates().sample(20, random_state=1):
+        pd.testing.assert_frame_equal(passage_index.get_trip(index, trip_id).reset_index(drop=True),
+                                      passages[passages["Id"] == trip_id].reset_index(drop=True))
+
+    assert passage_index.get_trip(index, -1).empty
+    assert passage_index.get_trip(index, None).empty
+    assert not passage_index.has_trip(index, -1)
+
+
+def test_get_trips_gathers_the_passages_in_order(frames):
+    passages = frames[1]
+    index = passage_index.build_index(passages)
+    trip_ids = passages["Id"].drop_duplicates().sample(5, random_state=2).tolist()
+
+    found = passage_index.get_trips(index, trip_ids + [-1, trip_ids[0]])
+
+    assert found["ids"].tolist() == trip_ids
+    assert found["missing"].tolist() == [-1]
+    offsets = found["offsets"]
+    for position, trip_id in enumerate(trip_ids):
+        pd.testing.assert_frame_equal(found["passages"].iloc[offsets[position]:offsets[position + 1]]
+                                      .reset_index(drop=True),
+                                      passages[passages["Id"] == trip_id].reset_index(drop=True))
+
+
+def test_merged_index_is_the_index_of_all_the_passages(frames):
+    passages = frames[1]
+    # the new passages complete trips already indexed, and add new trips.
+    new = np.random.default_rng(3).random(passages.shape[0]) < 0.2
+    index = passage_index.build_index(passages[~new].reset_index(drop=True))
+
+    merged = passage_index.merge_index(index, passages[new].reset_index(drop=True))
+    built = passage_index.build_index(passages.iloc[np.argsort(new, kind="stable")].reset_index(drop=True))
+
+    pd.testing.assert_frame_equal(merged["passages"], built["passages"])
+    assert np.array_equal(merged["trip_ids"], built["trip_ids"])
+    assert np.array_equal(merged["offsets"], built["offsets"])
+    assert passage_index.has_trips(merged, passages["Id"].to_numpy()).all()
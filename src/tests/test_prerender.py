@@ -0,0 +1,65 @@
+'''
+    Tests of the warm-up command and of the figure store it fills.
+'''
+
+import itertools
+import os
+
+import pytest
+
+import figure_cache
+import figure_store
+import figures
+import prerender
+
+
+@pytest.fixture
+def tasks(data, monkeypatch):
+    '''
+    A few figures of each builder: the whole input space takes too long to build here.
+    '''
+
+    space = sorted(figures.get_input_space(data), key=lambda task: task[0])
+    selected = [task for _, group in itertools.groupby(space, key=lambda task: task[0])
+                for task in itertools.islice(group, 2)]
+    monkeypatch.setattr(figures, "get_input_space", lambda dataset: iter(selected))
+
+    return selected
+
+
+def test_input_space_covers_the_heatmaps(data):
+    space = list(figures.get_input_space(data))
+
+    assert ("region_heat", (0, None)) in space and ("region_heat", (2, None)) in space
+    assert {name for name, _ in space} == {"region_heat", "vessel_heat", "harbour_heat", "region_frequencies",
+                                           "harbour_bar", "harbour_frequencies", "vessel_dots"}
+    assert len(space) == len(set(space))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_prerender_stores_every_figure(data, tasks, tmp_path, workers):
+    store_dir = str(tmp_path / "store")
+    os.makedirs(os.path.join(store_dir, "previous"))
+
+    summary = prerender.prerender(data, store_dir, workers=workers, chunk_size=3)
+
+    assert summary["figures"] == summary["written"] == len(tasks)
+    assert summary["pruned"] == ["previous"]
+    for name, inputs in tasks:
+        assert figure_store.contains(store_dir, figure_cache.make_key(name, data["version"], *inputs))
+
+    again = prerender.prerender(data, store_dir, workers=workers, chunk_size=3)
+    assert again["skipped"] == len(tasks) and again["written"] == 0
+
+
+def test_stored_figures_are_not_built_again(data, tasks, tmp_path, monkeypatch):
+    store_dir = str(tmp_path / "store")
+    prerender.prerender(data, store_dir, workers=1)
+    monkeypatch.setattr(figure_cache, "_figures", figure_cache.new_cache())
+    monkeypatch.setitem(figures._store, "dir", store_dir)
+    monkeypatch.setattr(figures, "BUILDERS", {})
+
+    for name, inputs in tasks:
+        figure = figures.get_cached(name, data, *inputs)
+        assert figure == figure_store.load(store_dir, figure_cache.make_key(name, data["version"], *inputs))
+        assert figure is not None
@@ -0,0 +1,76 @@
+'''
+    Tests of the cached callback responses.
+'''
+
+import gzip
+
+import flask
+import pytest
+
+import figure_cache
+import response_cache
+
+
+BODY = {"output": "region-heatmap.figure", "inputs": [{"id": "direction", "value": "departure"}]}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(response_cache, "_responses", figure_cache.new_cache(response_cache.MAX_SIZE))
+    app = flask.Flask(__name__)
+    app.calls = []
+    app.dataset = {"version": "v1"}
+
+    @app.route("/_dash-update-component", methods=["POST"])
+    def update():  # pylint: disable=unused-variable
+        app.calls.append(flask.request.get_json())
+        return flask.jsonify({"figure": len(app.calls)})
+
+    response_cache.register_routes(app, lambda: app.dataset)
+
+    return app
+
+
+def test_response_is_built_once_per_version(server):
+    client = server.test_client()
+
+    first = client.post("/_dash-update-component", json=BODY)
+    again = client.post("/_dash-update-component", json=BODY)
+    server.dataset = {"version": "v2"}
+    other = client.post("/_dash-update-component", json=BODY)
+
+    assert len(server.calls) == 2
+    assert again.json == first.json == {"figure": 1}
+    assert other.json == {"figure": 2}
+    assert response_cache.get_stats()["hits"] == 1
+
+
+def test_etag_gets_a_304(server):
+    client = server.test_client()
+    etag = client.post("/_dash-update-component", json=BODY).headers["ETag"].strip('"')
+
+    response = client.post("/_dash-update-component", json=BODY, headers={"If-None-Match": '"' + etag + '"'})
+
+    assert response.status_code == 304
+    assert len(server.calls) == 1
+
+
+def test_response_is_gzipped_when_accepted(server):
+    client = server.test_client()
+    client.post("/_dash-update-component", json=BODY)
+
+    response = client.post("/_dash-update-component", json=BODY, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == b'{"figure":1}\n'
+
+
+def test_polling_callbacks_are_not_cached(server):
+    client = server.test_client()
+    body = {"output": "loading-poll.disabled", "inputs": []}
+
+    client.post("/_dash-update-component", json=body)
+    client.post("/_dash-update-component", json=body)
+
+    assert len(server.calls) == 2
+    assert response_cache.get_stats()["size"] == 0
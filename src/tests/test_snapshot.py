@@ -0,0 +1,95 @@
+'''
+    Tests of the columnar snapshot of the sources.
+'''
+
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import preprocess
+import snapshot
+
+
+def as_values(dataframe):
+    '''
+    Returns:
+        The frame with its categorical columns as names, to compare frames
+        encoded with other dictionaries.
+    '''
+
+    return pd.DataFrame({column: dataframe[column].astype(object) if dataframe[column].dtype == "category"
+                         else dataframe[column] for column in dataframe.columns}).reset_index(drop=True)
+
+
+def read_sources(sources):
+    '''
+    Returns:
+        The trips (years filtered, by departure date) and the passages (by
+        trip Id) of the source CSVs, read with pandas.
+    '''
+
+    trips = preprocess.filter_years(preprocess.convert_dates(pd.read_csv(sources[0])), 2011, 2021)
+    passages = preprocess.convert_dates(pd.read_csv(sources[1]))
+
+    return (trips.sort_values("Departure Date", kind="stable").reset_index(drop=True),
+            passages.sort_values("Id", kind="stable").reset_index(drop=True))
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    return str(tmp_path / "snapshot")
+
+
+def test_load_reads_the_sources(sources, snapshot_dir):
+    trips, passages, _, _ = snapshot.load(snapshot_dir, *sources, 2011, 2021)
+    expected_trips, expected_passages = read_sources(sources)
+
+    pd.testing.assert_frame_equal(as_values(trips), as_values(expected_trips))
+    pd.testing.assert_frame_equal(as_values(passages), as_values(expected_passages))
+    assert trips["Departure Region"].dtype == "category"
+
+
+def test_load_reuses_the_snapshot(sources, snapshot_dir):
+    snapshot.load(snapshot_dir, *sources, 2011, 2021)
+    created = snapshot.read_manifest(snapshot_dir)["created"]
+
+    trips, _, _, _ = snapshot.load(snapshot_dir, *sources, 2011, 2021)
+
+    assert snapshot.read_manifest(snapshot_dir)["created"] == created
+    assert trips.shape[0] == read_sources(sources)[0].shape[0]
+
+
+def test_load_rebuilds_when_a_source_changes(sources, snapshot_dir, tmp_path):
+    trips_path = str(tmp_path / "trips.csv")
+    shutil.copy(sources[0], trips_path)
+    trips, _, generation, _ = snapshot.load(snapshot_dir, trips_path, sources[1], 2011, 2021)
+
+    added = pd.read_csv(trips_path).head(2).assign(Id=lambda rows: rows["Id"] + 10**9)
+    added.to_csv(trips_path, mode="a", header=False, index=False)
+    rebuilt, _, rebuilt_generation, _ = snapshot.load(snapshot_dir, trips_path, sources[1], 2011, 2021)
+
+    assert rebuilt.shape[0] == trips.shape[0] + 2
+    assert rebuilt_generation["version"] != generation["version"]
+
+
+def test_load_keeps_the_snapshot_when_the_sources_are_unreachable(sources, snapshot_dir, tmp_path):
+    trips, _, generation, _ = snapshot.load(snapshot_dir, *sources, 2011, 2021)
+
+    missing = str(tmp_path / "missing.csv")
+    kept, _, kept_generation, _ = snapshot.load(snapshot_dir, missing, missing, 2011, 2021)
+
+    assert kept_generation == generation
+    pd.testing.assert_frame_equal(as_values(kept), as_values(trips))
+
+
+def test_load_rebuilds_a_snapshot_of_another_format(sources, snapshot_dir, monkeypatch):
+    snapshot.load(snapshot_dir, *sources, 2011, 2021)
+    monkeypatch.setattr(snapshot, "FORMAT_VERSION", snapshot.FORMAT_VERSION + 1)
+
+    assert snapshot.read_manifest(snapshot_dir) is None
+    snapshot.load(snapshot_dir, *sources, 2011, 2021)
+
+    assert snapshot.read_manifest(snapshot_dir)["format"] == snapshot.FORMAT_VERSION
+    assert not os.path.exists(snapshot_dir + ".tmp")
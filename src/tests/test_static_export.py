@@ -0,0 +1,58 @@
+'''
+    Tests of the static export of the figures.
+'''
+
+import gzip
+import json
+import os
+
+import brotli
+import plotly.utils
+import pytest
+
+import figures
+import static_export
+
+
+@pytest.fixture
+def tasks(data, monkeypatch):
+    '''
+    The first figures of the input space: all of them take too long to build here.
+    '''
+
+    selected = list(figures.get_input_space(data))[:6]
+    monkeypatch.setattr(figures, "get_input_space", lambda dataset: iter(selected))
+
+    return selected
+
+
+def test_input_keys_are_written_as_in_the_browser():
+    assert static_export.get_input_key(("Pacific Region", 2015, 0, None)) == '["Pacific Region",2015,0,null]'
+    assert static_export.get_input_key(("Baie-Comeau", "Île d'Orléans")) == '["Baie-Comeau","Île d\'Orléans"]'
+
+
+def test_export_writes_every_figure_and_the_manifest(data, tasks, tmp_path):
+    output_dir = str(tmp_path / "static")
+    os.makedirs(output_dir)
+    open(os.path.join(output_dir, "stale.json"), "w").close()
+
+    summary = static_export.export(data, output_dir, workers=1, chunk_size=4)
+
+    assert summary["figures"] == len(tasks)
+    assert not os.path.exists(os.path.join(output_dir, "stale.json"))
+    assert not os.path.exists(output_dir + ".tmp")
+    with open(os.path.join(output_dir, static_export.MANIFEST), "rb") as manifest_file:
+        manifest = json.loads(manifest_file.read())
+    assert manifest["version"] == data["version"]
+    assert set(manifest["empty"]) == set(figures.EMPTY_FIGURES)
+
+    for name, inputs in tasks:
+        path = os.path.join(output_dir, manifest["figures"][name][static_export.get_input_key(inputs)])
+        with open(path, "rb") as figure_file:
+            content = figure_file.read()
+        with open(path + ".gz", "rb") as figure_file:
+            assert gzip.decompress(figure_file.read()) == content
+        with open(path + ".br", "rb") as figure_file:
+            assert brotli.decompress(figure_file.read()) == content
+        expected = json.dumps(figures.BUILDERS[name](data, *inputs), cls=plotly.utils.PlotlyJSONEncoder)
+        assert json.loads(content) == json.loads(expected)
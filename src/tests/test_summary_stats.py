@@ -0,0 +1,116 @@
+'''
+    Tests of the statistics of the summary panel against pandas.
+'''
+
+import flask
+import numpy as np
+import pandas as pd
+import pytest
+
+import preprocess
+import summary_stats
+import time_index
+
+
+def get_duration_hours(trips):
+    '''
+    Returns:
+        The durations of the trips in hours, computed with timedeltas as
+        the original panel did.
+    '''
+
+    duration = trips["Arrival Date"] - trips["Departure Date"]
+
+    return duration.dt.days * 24 + (duration.dt.seconds / 3600).round(2)
+
+
+def test_duration_hours_are_the_timedelta_hours(frames):
+    trips = frames[0]
+
+    hours = summary_stats.get_duration_hours(trips["Departure Date"].values.view("int64"),
+                                             trips["Arrival Date"].values.view("int64"))
+
+    assert np.allclose(hours, get_duration_hours(trips).to_numpy())
+
+
+@pytest.mark.parametrize("region, vessel_type, years", [(None, None, None),
+                                                        ("East Canadian Water Region", None, None),
+                                                        (None, "Cargo", (2013, 2016)),
+                                                        ("Atlantis", None, None)])
+def test_summary_of_a_subset(frames, region, vessel_type, years):
+    # sorted by departure date as in the dataset: a year range is a slice.
+    trips = frames[0].sort_values("Departure Date", kind="stable").reset_index(drop=True)
+    selected = trips
+    if region is not None:
+        selected = selected[(selected["Departure Region"] == region) | (selected["Arrival Region"] == region)]
+    if vessel_type is not None:
+        selected = selected[selected["Vessel Type"] == vessel_type]
+    if years is not None:
+        selected = selected[selected["Departure Date"].dt.year.between(*years)]
+
+    summary = summary_stats.get_summary(summary_stats.get_columns(trips), region, vessel_type, years)
+
+    assert summary["total_voyage0"] == selected.shape[0]
+    if selected.empty:
+        assert summary["international_trips"] == "-"
+        return
+    assert summary["international_trips"] == preprocess.get_international_trips(selected)
+    assert summary["trip_duration"] == "{:,}".format(round(get_duration_hours(selected).sum() / selected.shape[0], 2))
+    assert summary["most_used_vessel"] == selected["Vessel Type"].astype(object).value_counts().sort_index().idxmax()
+
+
+def test_stats_of_two_parts_add_up(frames):
+    trips = frames[0]
+    columns = summary_stats.get_columns(trips)
+    first = trips[trips["Vessel Type"] != "Cargo"]
+    second = trips[trips["Vessel Type"] == "Cargo"].copy()
+    second["Vessel Type"] = second["Vessel Type"].astype(object).astype("category")
+    first_columns = summary_stats.get_columns(first)
+    second_columns = summary_stats.get_columns(second)
+
+    stats, names = summary_stats.add_stats(summary_stats.compute_stats(first_columns), first_columns["vessels"],
+                                           summary_stats.compute_stats(second_columns), second_columns["vessels"])
+
+    expected = summary_stats.compute_stats(columns)
+    assert names == columns["vessels"]
+    assert stats["count"] == expected["count"] and stats["international"] == expected["international"]
+    assert stats["duration_hours"] == pytest.approx(expected["duration_hours"])
+    assert np.array_equal(stats["vessels"], expected["vessels"])
+    assert pd.Series(stats["vessels"], index=names).idxmax() == summary_stats.format_stats(
+        expected, columns["vessels"])["most_used_vessel"]
+
+
+@pytest.mark.parametrize("query, years", [({"start": 2015}, (2015, None)), ({"end": 2014}, (None, 2014)),
+                                          ({"start": 2015, "end": 2021}, (2015, 2021)),
+                                          ({"start": 0, "end": 99999}, (None, None)), ({"start": 2030}, (2030, None)),
+                                          ({"end": -5}, (None, -5))])
+def test_api_summary_of_a_year_range(frames, data, query, years):
+    server = flask.Flask(__name__)
+    summary_stats.register_routes(server, lambda: data)
+    departure = frames[0]["Departure Date"].dt.year
+    expected = ((departure >= (years[0] or 0)) & (departure <= (years[1] or 9999))).sum()
+
+    response = server.test_client().get("/api/summary", query_string=query)
+
+    assert response.status_code == 200
+    assert response.json["total_voyage0"] == expected
+
+
+@pytest.mark.parametrize("query", [{"start": 2016, "end": 2015}, {"start": "twenty"}])
+def test_api_rejects_invalid_years(data, query):
+    server = flask.Flask(__name__)
+    summary_stats.register_routes(server, lambda: data)
+
+    response = server.test_client().get("/api/summary", query_string=query)
+
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_year_bounds_stay_within_int64():
+    low, high = time_index.get_year_bounds(0, 9999)
+
+    assert low == np.iinfo(np.int64).min and high == np.iinfo(np.int64).max
+    assert time_index.get_year_bounds(None, 2015) == (np.iinfo(np.int64).min, time_index.to_ns("2016-01-01"))
+    assert time_index.get_year_bounds(2015, None) == (time_index.to_ns("2015-01-01"), np.iinfo(np.int64).max)
+    assert time_index.get_year_bounds(2262, 2262)[0] == time_index.to_ns("2262-01-01")
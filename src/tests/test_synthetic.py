@@ -0,0 +1,64 @@
+'''
+    Tests of the synthetic trips and passages, and of the benchmark run on them.
+'''
+
+import pandas as pd
+
+import benchmark
+import preprocess
+import synthetic
+
+
+def test_frames_follow_the_schema_of_the_sources(raw):
+    trips, passages = raw
+
+    assert list(trips.columns[:len(preprocess.TRIP_COLUMNS)]) == preprocess.TRIP_COLUMNS
+    assert set(preprocess.PASSAGE_COLUMNS) <= set(passages.columns)
+    assert trips.shape[0] == 3000 and trips["Id"].is_unique
+    assert set(passages["Id"]) <= set(trips["Id"])
+    assert set(trips["Departure Region"]) <= set(synthetic.REGIONS)
+    assert set(trips["Vessel Type"]) <= set(synthetic.VESSELS)
+
+    dates = preprocess.convert_dates(trips)
+    assert (dates["Arrival Date"] >= dates["Departure Date"]).all()
+    assert dates["Departure Date"].dt.year.between(2011, 2021).all()
+
+
+def test_frames_are_reproducible():
+    first = synthetic.generate_frames(500, seed=3, chunksize=200)
+    again = synthetic.generate_frames(500, seed=3, chunksize=200)
+    other = synthetic.generate_frames(500, seed=4, chunksize=200)
+
+    for frame, same, different in zip(first, again, other):
+        pd.testing.assert_frame_equal(frame, same)
+        assert not frame.equals(different)
+
+
+def test_written_csv_are_the_frames(tmp_path):
+    trips_path, detail_path = synthetic.write_csv(str(tmp_path), 500, seed=3, chunksize=200)
+    trips, passages = synthetic.generate_frames(500, seed=3, chunksize=200)
+
+    pd.testing.assert_frame_equal(pd.read_csv(trips_path), trips, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.read_csv(detail_path), passages, check_dtype=False)
+
+
+def test_traffic_is_skewed(raw):
+    trips = raw[0]
+
+    shares = trips["Departure Region"].value_counts(normalize=True)
+    assert shares.index[0] == max(synthetic.REGIONS, key=synthetic.REGIONS.get)
+    assert trips["Vessel Type"].value_counts().index[0] == "Cargo"
+
+
+def test_benchmark_measures_every_step():
+    results = benchmark.run([300], repeat=2, callbacks=False)
+
+    steps = results["sizes"]["300"]["steps"]
+    assert "dataset.build_dataset" in steps
+    assert all(measure["runs"] == 2 and measure["p50_ms"] >= 0 for measure in steps.values())
+
+    faster = {"sizes": {"300": {"steps": {name: dict(measure, p50_ms=measure["p50_ms"] / 2)
+                                          for name, measure in steps.items()}}}}
+    comparison = benchmark.compare(results, faster)
+    assert comparison.shape[0] == len(steps)
+    assert (comparison["Ratio"].dropna() <= 0.5).all()
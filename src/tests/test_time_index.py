@@ -0,0 +1,42 @@
+'''
+    Tests of the index of the trips by date against date filters.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import time_index
+
+
+@pytest.mark.parametrize("start, end", [("2015-01-01", "2016-01-01"), ("2013-03-15", "2013-03-16"),
+                                        ("1990-01-01", "2030-01-01"), ("2030-01-01", "2031-01-01")])
+@pytest.mark.parametrize("on", ["departure", "arrival"])
+def test_trips_of_a_range_are_the_filtered_trips(frames, start, end, on):
+    trips = frames[0]
+    index = time_index.build_index(trips)
+    column = "Departure Date" if on == "departure" else "Arrival Date"
+
+    selected = time_index.get_trips(index, start, end, on)
+
+    expected = index["trips"][(index["trips"][column] >= start) & (index["trips"][column] < end)]
+    assert sorted(selected["Id"]) == sorted(expected["Id"])
+    assert selected[column].is_monotonic_increasing
+
+
+def test_year_and_month_bounds():
+    assert time_index.get_year_bounds(2015, 2016) == (time_index.to_ns("2015-01-01"), time_index.to_ns("2017-01-01"))
+    assert time_index.get_month_bounds(2015, 12) == (time_index.to_ns("2015-12-01"), time_index.to_ns("2016-01-01"))
+
+
+def test_merged_index_is_the_index_of_all_the_trips(frames):
+    trips = frames[0]
+    new = np.random.default_rng(4).random(trips.shape[0]) < 0.3
+    index = time_index.build_index(trips[~new].reset_index(drop=True))
+
+    merged = time_index.merge_index(index, trips[new].reset_index(drop=True))
+    built = time_index.build_index(trips.iloc[np.argsort(new, kind="stable")].reset_index(drop=True))
+
+    pd.testing.assert_frame_equal(merged["trips"], built["trips"])
+    for name in ("departure", "arrival", "arrival_order"):
+        assert np.array_equal(merged[name], built[name])
@@ -0,0 +1,88 @@
+'''
+    Tests of the simplified itineraries of the trips.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import passage_index
+import trip_geometry
+
+
+def make_trip(latitudes, longitudes, events=None):
+    '''
+    Returns:
+        The passages of a trip, shuffled: the geometry orders them by rank.
+    '''
+
+    size = len(latitudes)
+    events = events or ["Departure"] + ["CIP Passage"] * (size - 2) + ["Arrival"]
+    atrip = pd.DataFrame({"Latitude": latitudes, "Longitude": longitudes, "Event Type": events,
+                          "Rank Number": np.arange(1, size + 1)})
+
+    return atrip.sample(frac=1, random_state=0)
+
+
+def get_distances(geometry, kept):
+    '''
+    Returns:
+        The distance of each passage to the itinerary through the passages
+        kept (their positions in the trip), projected.
+    '''
+
+    x, y = trip_geometry.project(geometry["latitude"].astype(np.float64), geometry["longitude"].astype(np.float64))
+    ranks = np.flatnonzero(np.isin(geometry["order"], kept))
+    distances = np.zeros(x.shape[0])
+    for first, last in zip(ranks[:-1], ranks[1:]):
+        if last - first > 1:
+            distances[first + 1:last] = trip_geometry._segment_distances(x, y, first, last)
+
+    return distances
+
+
+def test_straight_itinerary_keeps_its_ends():
+    geometry = trip_geometry.build_geometry(make_trip(np.zeros(50), np.linspace(-60, -50, 50)))
+
+    kept = trip_geometry.simplify(geometry, zoom=10)
+
+    assert kept.tolist() == [geometry["order"][0], geometry["order"][-1]]
+
+
+@pytest.mark.parametrize("zoom", [2, 6, 10])
+def test_dropped_passages_are_within_the_tolerance(zoom):
+    rng = np.random.default_rng(zoom)
+    atrip = make_trip(45 + np.cumsum(rng.normal(0, 0.05, 300)), -60 + np.cumsum(rng.normal(0, 0.05, 300)))
+    geometry = trip_geometry.build_geometry(atrip)
+
+    kept = trip_geometry.simplify(geometry, zoom)
+
+    assert 2 <= kept.shape[0] < 300
+    assert np.all(np.diff(atrip["Rank Number"].to_numpy()[kept]) > 0)
+    assert get_distances(geometry, kept).max() <= trip_geometry.get_tolerance(zoom) * 1.0001
+
+
+def test_events_are_always_kept():
+    events = ["Departure"] + ["CIP Passage"] * 10 + ["Arrival"] + ["CIP Passage"] * 10 + ["Arrival"]
+    atrip = make_trip(np.zeros(23), np.linspace(-60, -50, 23), events)
+    geometry = trip_geometry.build_geometry(atrip)
+
+    kept = trip_geometry.simplify(geometry, zoom=0)
+
+    assert sorted(atrip["Rank Number"].to_numpy()[kept]) == [1, 12, 23]
+
+
+def test_simplify_many_keeps_at_most_max_points(frames):
+    index = passage_index.build_index(frames[1])
+    geometries = [trip_geometry.build_geometry(passage_index.get_trip(index, trip_id))
+                  for trip_id in index["trip_ids"][:20]]
+    total = sum(geometry["order"].shape[0] for geometry in geometries)
+    events = sum(int(np.isinf(geometry["significance"]).sum()) for geometry in geometries)
+
+    everything = trip_geometry.simplify_many(geometries)
+    bounded = trip_geometry.simplify_many(geometries, max_points=events + 10)
+
+    assert sum(kept.shape[0] for kept in everything) == total
+    assert events <= sum(kept.shape[0] for kept in bounded) <= events + 10
+    for geometry, kept in zip(geometries, bounded):
+        assert set(geometry["order"][np.isinf(geometry["significance"])]) <= set(kept)
@@ -0,0 +1,72 @@
+'''
+    Tests of the batch lookup of the passages of several trips.
+'''
+
+import flask
+import pytest
+
+import voyages
+
+
+@pytest.fixture
+def client(data):
+    server = flask.Flask(__name__)
+    voyages.register_routes(server, lambda: data)
+
+    return server.test_client()
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2079000000000003, 2079000000000001", [2079000000000003, 2079000000000001]),
+    ("12 34;56", [12, 34, 56]), (7, [7]), (7.0, [7]), (7.5, None), ("", None), ("12, abc", None), ("-3", None),
+    (None, None),
+    # the Ids not fitting in an int64.
+    ("2079000000000003, 99999999999999999999", None), ("123456789012345678901234", None), (2**63, None),
+])
+def test_parse_ids(value, expected):
+    assert voyages.parse_ids(value) == expected
+
+
+def test_lookup_keeps_the_order_of_the_ids(frames, data):
+    passages = frames[1]
+    trip_ids = passages["Id"].drop_duplicates().tolist()[:5]
+
+    batch = voyages.lookup(data, trip_ids[::-1] + [trip_ids[0], -1], max_trips=4)
+
+    assert batch["ids"].tolist() == trip_ids[::-1][:4]
+    assert batch["total"] == 6 and batch["truncated"]
+    assert batch["passages"].shape[0] == passages["Id"].isin(trip_ids[1:]).sum()
+
+
+def test_trips_of_a_harbour_have_passages(frames, data):
+    trips, passages = frames
+    harbour = trips["Departure Hardour"].mode()[0]
+
+    trip_ids = voyages.find_trips(data, harbour, "2015-01-01", "2017-01-01")
+
+    selected = trips[((trips["Departure Hardour"] == harbour) | (trips["Arrival Hardour"] == harbour))
+                     & (trips["Departure Date"] >= "2015-01-01") & (trips["Departure Date"] < "2017-01-01")
+                     & trips["Id"].isin(passages["Id"])]
+    assert sorted(trip_ids.tolist()) == sorted(selected["Id"].tolist())
+
+
+def test_api_returns_the_simplified_trips(frames, client):
+    trip_ids = frames[1]["Id"].drop_duplicates().tolist()[:3]
+
+    response = client.get("/api/passages", query_string={"ids": ",".join(map(str, trip_ids + [1])),
+                                                         "max_points": 40})
+
+    assert response.status_code == 200
+    assert [trip["id"] for trip in response.json["trips"]] == trip_ids
+    assert response.json["missing"] == [1]
+    assert all(len(trip["latitude"]) == len(trip["rank"]) >= 2 for trip in response.json["trips"])
+
+
+@pytest.mark.parametrize("query", [{"ids": "2079000000000003, 99999999999999999999"},
+                                   {"ids": "123456789012345678901234"}, {"ids": "abc"},
+                                   {"ids": "12", "max_points": -3}, {"ids": "12", "zoom": "far"}, {}])
+def test_api_rejects_invalid_requests(client, query):
+    response = client.get("/api/passages", query_string=query)
+
+    assert response.status_code == 400
+    assert "error" in response.json
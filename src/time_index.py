@@ -0,0 +1,236 @@
+'''
+    Index of the trips by date.
+
+    The trips are sorted by departure date once, and the arrival dates are
+    kept sorted next to the permutation that sorts them. Dates are int64
+    nanoseconds since epoch (UTC), so selecting a year, a month or any
+    date range is a binary search, then a slice, instead of extracting
+    the year of every date.
+'''
+
+import numpy as np
+import pandas as pd
+
+
+# the years starting within the int64 nanoseconds of datetime64[ns] (1677-09-21 to 2262-04-11).
+MIN_YEAR = 1678
+MAX_YEAR = 2262
+
+
+def to_ns(date):
+    '''
+    Args:
+        date: a date, e.g. "2015-03-01", a Timestamp or a datetime64
+    Returns:
+        The date as int64 nanoseconds since epoch, UTC.
+    '''
+
+    timestamp = pd.Timestamp(date)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+
+    return timestamp.value
+
+
+def get_year_start(year):
+    '''
+    Args:
+        year: a year
+    Returns:
+        The first nanosecond of the year, the smallest (largest) int64 for
+        the years before (after) the dates datetime64[ns] holds.
+    '''
+
+    if year < MIN_YEAR:
+        return int(np.iinfo(np.int64).min)
+    if year > MAX_YEAR:
+        return int(np.iinfo(np.int64).max)
+
+    return int(np.array(str(year), dtype="M8[Y]").astype("M8[ns]").view("int64"))
+
+
+def get_year_bounds(start, end):
+    '''
+    Args:
+        start: first year (inclusive), no bound if None
+        end: last year (inclusive), no bound if None
+    Returns:
+        The first nanosecond of start and of the year after end.
+    '''
+
+    low = get_year_start(start) if start is not None else int(np.iinfo(np.int64).min)
+    high = get_year_start(end + 1) if end is not None else int(np.iinfo(np.int64).max)
+
+    return low, high
+
+
+def get_month_bounds(year, month):
+    '''
+    Args:
+        year: a year
+        month: a month, 1 to 12
+    Returns:
+        The first nanosecond of the month and of the next month.
+    '''
+
+    first = np.datetime64("{:04d}-{:02d}".format(year, month), "M")
+    bounds = np.array([first, first + 1]).astype("M8[ns]").view("int64")
+
+    return int(bounds[0]), int(bounds[1])
+
+
+def get_range(values, start, end):
+    '''
+    Finds the dates of a sorted array falling in [start, end).
+
+    Args:
+        values: sorted int64 dates
+        start: first date, nanoseconds (inclusive)
+        end: last date, nanoseconds (exclusive)
+    Returns:
+        The slice of the positions of those dates.
+    '''
+
+    low, high = np.searchsorted(values, [start, end])
+
+    return slice(int(low), int(high))
+
+
+def is_sorted(values):
+    '''
+    Args:
+        values: numpy array
+    Returns:
+        True if the values are in increasing order.
+    '''
+
+    return bool(np.all(values[1:] >= values[:-1]))
+
+
+def build_index(trips_df, arrival=None):
+    '''
+    Sorts the trips by departure date and the arrival dates. Trips already
+    sorted (e.g. by the snapshot) are used as they are, not copied.
+
+    Args:
+        trips_df: the trips, dates converted
+        arrival: the arrival dates of the sorted trips, already sorted: a
+            dict with the int64 "values" and the "positions" of the trips
+            (see snapshot.open_orders), computed if None
+    Returns:
+        The index, a dict with the sorted trips, their sorted departure
+        dates, the sorted arrival dates and the positions of the trips
+        in arrival order.
+    '''
+
+    trips = trips_df
+    if not is_sorted(trips_df["Departure Date"].values.view("int64")):
+        order = np.argsort(trips_df["Departure Date"].values.view("int64"), kind="stable")
+        trips = trips_df.iloc[order].reset_index(drop=True)
+        arrival = None
+
+    if arrival is None:
+        arrival_dates = trips["Arrival Date"].values.view("int64")
+        arrival_order = np.argsort(arrival_dates, kind="stable")
+        arrival = {"values": arrival_dates[arrival_order], "positions": arrival_order}
+
+    return {
+        "trips": trips,
+        "departure": trips["Departure Date"].values.view("int64"),
+        "arrival": arrival["values"],
+        "arrival_order": arrival["positions"],
+    }
+
+
+def select(index, start, end, on="departure"):
+    '''
+    Finds the trips departing (or arriving) in [start, end).
+
+    Args:
+        index: the time index
+        start: first date, nanoseconds (inclusive)
+        end: last date, nanoseconds (exclusive)
+        on: "departure" or "arrival"
+    Returns:
+        The positions of the trips: a slice for departures, a numpy array
+        for arrivals.
+    '''
+
+    rows = get_range(index[on], start, end)
+    if on == "arrival":
+        return index["arrival_order"][rows]
+
+    return rows
+
+
+def get_trips(index, start, end, on="departure"):
+    '''
+    Args:
+        index: the time index
+        start: first date (inclusive), see to_ns
+        end: last date (exclusive), see to_ns
+        on: "departure" or "arrival"
+    Returns:
+        dataframe of the trips departing (or arriving) in [start, end).
+    '''
+
+    return index["trips"].iloc[select(index, to_ns(start), to_ns(end), on)]
+
+
+def get_insert_positions(values, new_values):
+    '''
+    Finds where sorted values go in a sorted array, after the equal values
+    already there.
+
+    Args:
+        values: sorted array
+        new_values: sorted array of the values to insert
+    Returns:
+        numpy array of the positions of the new values in the merged array.
+    '''
+
+    return np.searchsorted(values, new_values, side="right") + np.arange(new_values.shape[0])
+
+
+def merge_index(index, trips_df):
+    '''
+    Inserts new trips in the index. The new trips are sorted, then merged
+    with the sorted trips, the trips of the index are not sorted again.
+
+    Args:
+        index: the time index
+        trips_df: the new trips, encoded with the same dictionaries as the index
+    Returns:
+        The time index of all the trips.
+    '''
+
+    order = np.argsort(trips_df["Departure Date"].values.view("int64"), kind="stable")
+    trips_df = trips_df.iloc[order].reset_index(drop=True)
+    size, new_size = index["departure"].shape[0], trips_df.shape[0]
+
+    # positions of the previous and of the new trips in the merged trips.
+    positions = get_insert_positions(index["departure"], trips_df["Departure Date"].values.view("int64"))
+    previous = np.delete(np.arange(size + new_size), positions)
+    take = np.empty(size + new_size, dtype=np.int64)
+    take[previous] = np.arange(size)
+    take[positions] = size + np.arange(new_size)
+    trips = pd.concat([index["trips"], trips_df], ignore_index=True).take(take).reset_index(drop=True)
+
+    new_arrival = trips_df["Arrival Date"].values.view("int64")
+    new_order = np.argsort(new_arrival, kind="stable")
+    arrival_positions = get_insert_positions(index["arrival"], new_arrival[new_order])
+    is_new = np.zeros(size + new_size, dtype=bool)
+    is_new[arrival_positions] = True
+    arrival = np.empty(size + new_size, dtype=np.int64)
+    arrival[arrival_positions] = new_arrival[new_order]
+    arrival[~is_new] = index["arrival"]
+    arrival_order = np.empty(size + new_size, dtype=np.int64)
+    arrival_order[arrival_positions] = positions[new_order]
+    arrival_order[~is_new] = previous[index["arrival_order"]]
+
+    return {
+        "trips": trips,
+        "departure": trips["Departure Date"].values.view("int64"),
+        "arrival": arrival,
+        "arrival_order": arrival_order,
+    }
@@ -0,0 +1,191 @@
+'''
+    Simplified itineraries of the trips.
+
+    The passages of a trip are ordered by rank and simplified with the
+    Douglas-Peucker algorithm, run once per trip: each passage gets the
+    tolerance below which it is kept (its significance), so the itinerary
+    at any zoom is a threshold on it. The tolerance of a zoom is a fraction
+    of a pixel of the Web Mercator map, so no drawn line moves by more than
+    that. The departures, arrivals and other events are always kept, as
+    are the first and the last passages.
+
+    The geometries are small (float32 positions and significances) and kept
+    in a bounded cache by trip and dataset version.
+'''
+
+import numpy as np
+
+import figure_cache
+
+
+MAX_SIZE = 1024
+
+# the passages of this event type may be dropped, the other events are always kept.
+PASSAGE_EVENT = "CIP Passage"
+
+# largest distance, in pixels, between the itinerary and the passages dropped.
+TOLERANCE_PIXELS = 1.0
+
+_geometries = figure_cache.new_cache(MAX_SIZE)
+
+
+def project(latitudes, longitudes):
+    '''
+    Args:
+        latitudes: numpy array, in degrees
+        longitudes: numpy array, in degrees
+    Returns:
+        The Web Mercator coordinates, in degrees of longitude at the equator.
+    '''
+
+    latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -85, 85)
+    y = np.degrees(np.log(np.tan(np.pi / 4 + np.radians(latitudes) / 2)))
+
+    return np.asarray(longitudes, dtype=np.float64), y
+
+
+def get_tolerance(zoom, pixels=TOLERANCE_PIXELS):
+    '''
+    Args:
+        zoom: zoom level of the map
+        pixels: the tolerance in pixels
+    Returns:
+        The tolerance in degrees, see project: a tile of 256 pixels spans
+        360 degrees at zoom 0.
+    '''
+
+    return pixels * 360 / (256 * 2 ** zoom)
+
+
+def _segment_distances(x, y, first, last):
+    '''
+    Args:
+        x, y: projected coordinates of the passages
+        first: position of the start of the segment
+        last: position of the end of the segment
+    Returns:
+        The distances from the passages between them to the segment.
+    '''
+
+    px, py = x[first + 1:last], y[first + 1:last]
+    dx, dy = x[last] - x[first], y[last] - y[first]
+    length = dx * dx + dy * dy
+    if length == 0:
+        return np.hypot(px - x[first], py - y[first])
+
+    step = np.clip(((px - x[first]) * dx + (py - y[first]) * dy) / length, 0, 1)
+
+    return np.hypot(px - x[first] - step * dx, py - y[first] - step * dy)
+
+
+def get_significance(x, y, keep):
+    '''
+    Runs the Douglas-Peucker algorithm down to a zero tolerance.
+
+    Args:
+        x, y: projected coordinates of the passages, in order
+        keep: boolean array of the passages always kept
+    Returns:
+        The significance of each passage: the largest tolerance keeping it,
+        infinite for the passages always kept. A passage is never more
+        significant than the one splitting its segment before it, so the
+        passages kept at a tolerance form the same itinerary as the
+        algorithm run at that tolerance.
+    '''
+
+    significance = np.zeros(x.shape[0], dtype=np.float64)
+    if x.shape[0] == 0:
+        return significance
+
+    significance[keep] = np.inf
+    significance[[0, -1]] = np.inf
+    anchors = np.flatnonzero(np.isinf(significance))
+
+    # the itinerary is split at the passages kept, each part is simplified on its own.
+    segments = [(first, last, np.inf) for first, last in zip(anchors[:-1], anchors[1:]) if last - first > 1]
+    while segments:
+        first, last, bound = segments.pop()
+        distances = _segment_distances(x, y, first, last)
+        position = first + 1 + int(np.argmax(distances))
+        significance[position] = min(distances.max(), bound)
+        if position - first > 1:
+            segments.append((first, position, significance[position]))
+        if last - position > 1:
+            segments.append((position, last, significance[position]))
+
+    return significance
+
+
+def build_geometry(atrip):
+    '''
+    Args:
+        atrip: dataframe of the passages of a trip, see passage_index.get_trip
+    Returns:
+        The geometry: the positions of the passages in the trip ordered by
+        rank ("order"), and their "latitude", "longitude" and "significance".
+    '''
+
+    order = np.argsort(atrip["Rank Number"].to_numpy(), kind="stable").astype(np.int32)
+    latitudes = atrip.Latitude.to_numpy(dtype=np.float64)[order]
+    longitudes = atrip.Longitude.to_numpy(dtype=np.float64)[order]
+    keep = (atrip["Event Type"].astype(str) != PASSAGE_EVENT).to_numpy()[order]
+
+    return {
+        "order": order,
+        "latitude": latitudes.astype(np.float32),
+        "longitude": longitudes.astype(np.float32),
+        "significance": get_significance(*project(latitudes, longitudes), keep).astype(np.float32),
+    }
+
+
+def simplify(geometry, zoom, pixels=TOLERANCE_PIXELS):
+    '''
+    Args:
+        geometry: the geometry of a trip, see build_geometry
+        zoom: zoom level of the map
+        pixels: the tolerance in pixels
+    Returns:
+        The positions, in the trip, of the passages kept at this zoom, ordered by rank.
+    '''
+
+    return geometry["order"][geometry["significance"] >= get_tolerance(zoom, pixels)]
+
+
+def simplify_many(geometries, zoom=None, max_points=None, pixels=TOLERANCE_PIXELS):
+    '''
+    Simplifies several itineraries drawn together: at the tolerance of the
+    zoom, raised if needed so that about max_points passages are kept in
+    all (the events are kept even beyond it).
+
+    Args:
+        geometries: the geometries of the trips, see build_geometry
+        zoom: zoom level of the map, no tolerance if None
+        max_points: largest number of passages kept, no limit if None
+        pixels: the tolerance in pixels
+    Returns:
+        The positions of the passages kept in each trip, ordered by rank.
+    '''
+
+    tolerance = get_tolerance(zoom, pixels) if zoom is not None else 0
+    significance = np.concatenate([geometry["significance"] for geometry in geometries] or [np.empty(0)])
+    if max_points is not None and np.count_nonzero(significance >= tolerance) > max_points:
+        tolerance = max(tolerance, np.partition(significance, -max_points)[-max_points])
+
+    return [geometry["order"][geometry["significance"] >= tolerance] for geometry in geometries]
+
+
+def get_cached(dataset, trip_id, atrip):
+    '''
+    Returns the geometry of a trip from the cache, building it on a miss.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        trip_id: the trip Id
+        atrip: dataframe of the passages of the trip
+    Returns:
+        The geometry, see build_geometry.
+    '''
+
+    key = figure_cache.make_key("trip_geometry", dataset["version"], trip_id)
+
+    return figure_cache.get_or_build(key, lambda: build_geometry(atrip), _geometries)
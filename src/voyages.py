@@ -0,0 +1,206 @@
+'''
+    Batch lookup of the passages of several trips.
+
+    The trips are given by their Ids, or as the trips departing from or
+    arriving at a harbour in a date range (see find_trips). Their passages
+    are retrieved in one batch (see passage_index.get_trips), at most
+    MAX_TRIPS trips at a time, and their itineraries are simplified
+    together to at most MAX_POINTS passages (see
+    trip_geometry.simplify_many), so hundreds of trips stay responsive.
+    The voyage page draws them on one map, /api/passages returns them.
+'''
+
+import re
+
+import numpy as np
+from flask import jsonify, request
+
+import encoding
+import passage_index
+import time_index
+import trip_geometry
+
+
+MAX_TRIPS = 200
+MAX_POINTS = 20000
+
+
+def parse_ids(value):
+    '''
+    Reads the trip Ids typed in the voyage page or given to the API.
+
+    Args:
+        value: a number, or a text of numbers separated by commas or spaces
+    Returns:
+        The list of Ids, None if the value is not a list of Ids (or an Id
+        does not fit in an int64, the type of the Ids).
+    '''
+
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        trip_ids = [int(value)]
+    elif isinstance(value, float):
+        if not value.is_integer():
+            return None
+        trip_ids = [int(value)]
+    else:
+        tokens = [token for token in re.split(r"[\s,;]+", str(value)) if token]
+        if not tokens or not all(token.isdigit() for token in tokens):
+            return None
+        trip_ids = [int(token) for token in tokens]
+
+    bounds = np.iinfo(np.int64)
+    if not all(bounds.min <= trip_id <= bounds.max for trip_id in trip_ids):
+        return None
+
+    return trip_ids
+
+
+def find_trips(dataset, harbour, start=None, end=None):
+    '''
+    Finds the trips departing from or arriving at a harbour, among the
+    trips having passages.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        harbour: name of the harbour
+        start: first departure date (inclusive), see time_index.to_ns, no bound if None
+        end: last departure date (exclusive), no bound if None
+    Returns:
+        numpy array of the Ids of the trips, by departure date.
+    '''
+
+    index = dataset["time_index"]
+    start = time_index.to_ns(start) if start is not None else np.iinfo(np.int64).min
+    end = time_index.to_ns(end) if end is not None else np.iinfo(np.int64).max
+    trips = index["trips"].iloc[time_index.select(index, start, end)]
+
+    matched = encoding.equals(trips["Departure Hardour"], harbour) | \
+        encoding.equals(trips["Arrival Hardour"], harbour)
+
+    trip_ids = trips.Id.to_numpy()[matched]
+
+    return trip_ids[passage_index.has_trips(dataset["passage_index"], trip_ids)]
+
+
+def lookup(dataset, trip_ids, max_trips=MAX_TRIPS):
+    '''
+    Retrieves the passages of trips, and their geometries.
+
+    Args:
+        dataset: the dataset, see dataset.py
+        trip_ids: trip Ids, only the first max_trips distinct ones are kept
+        max_trips: largest number of trips retrieved
+    Returns:
+        dict with the trips found (see passage_index.get_trips), their
+        "geometries" (see trip_geometry.build_geometry), the number of Ids
+        asked ("total") and whether they were cut to max_trips ("truncated").
+    '''
+
+    trip_ids, first = np.unique(np.asarray(trip_ids, dtype=np.int64), return_index=True)
+    # distinct Ids, in the order they were given.
+    trip_ids = trip_ids[np.argsort(first)]
+
+    batch = passage_index.get_trips(dataset["passage_index"], trip_ids[:max_trips])
+    offsets = batch["offsets"]
+    batch.update({
+        "geometries": [trip_geometry.get_cached(dataset, trip_id,
+                                                batch["passages"].iloc[offsets[number]:offsets[number + 1]])
+                       for number, trip_id in enumerate(batch["ids"])],
+        "total": int(trip_ids.shape[0]),
+        "truncated": bool(trip_ids.shape[0] > max_trips),
+    })
+
+    return batch
+
+
+def simplify(batch, zoom=None, max_points=MAX_POINTS):
+    '''
+    Simplifies the itineraries of trips looked up together.
+
+    Args:
+        batch: the trips, see lookup
+        zoom: zoom level of the map, no tolerance if None
+        max_points: largest number of passages kept in all the trips
+    Returns:
+        The trips, with the positions of the passages kept in each one
+        ("positions") and the "zoom".
+    '''
+
+    return dict(batch, positions=trip_geometry.simplify_many(batch["geometries"], zoom, max_points), zoom=zoom)
+
+
+def to_json(batch):
+    '''
+    Args:
+        batch: the trips looked up and simplified, see simplify
+    Returns:
+        dict of the trips, one list per column of their passages kept.
+    '''
+
+    trips = []
+    offsets = batch["offsets"]
+    for number, (trip_id, kept) in enumerate(zip(batch["ids"], batch["positions"])):
+        atrip = batch["passages"].iloc[offsets[number]:offsets[number + 1]].iloc[kept]
+        trips.append({
+            "id": int(trip_id),
+            "latitude": atrip.Latitude.to_numpy(dtype=np.float64).round(5).tolist(),
+            "longitude": atrip.Longitude.to_numpy(dtype=np.float64).round(5).tolist(),
+            "harbour": atrip.Hardour.astype(str).tolist(),
+            "region": atrip.Region.astype(str).tolist(),
+            "event": atrip["Event Type"].astype(str).tolist(),
+            "rank": atrip["Rank Number"].astype(int).tolist(),
+        })
+
+    return {
+        "trips": trips,
+        "missing": batch["missing"].tolist(),
+        "total": batch["total"],
+        "truncated": batch["truncated"],
+        "zoom": batch["zoom"],
+    }
+
+
+def register_routes(server, get_dataset):
+    '''
+    Adds the /api/passages endpoint to the Flask server. The trips are
+    given by ids (comma separated), or by harbour with the optional start
+    and end departure dates; zoom and max_points tune the simplification
+    (no zoom: only the max_points limit applies).
+
+    Args:
+        server: the Flask server of the Dash app
+        get_dataset: function returning the current dataset, None while loading
+    '''
+
+    @server.route("/api/passages", methods=["GET", "POST"])
+    def passages():  # pylint: disable=unused-variable
+        dataset = get_dataset()
+        if dataset is None:
+            return jsonify({"status": "loading"}), 503
+
+        values = request.get_json(silent=True) if request.method == "POST" else None
+        values = values if isinstance(values, dict) else request.values
+        if values.get("ids") is not None:
+            ids = values["ids"]
+            trip_ids = parse_ids(",".join(map(str, ids)) if isinstance(ids, list) else ids)
+            if trip_ids is None:
+                return jsonify({"error": "ids must be trip Ids separated by commas"}), 400
+        elif values.get("harbour"):
+            try:
+                trip_ids = find_trips(dataset, values["harbour"], values.get("start"), values.get("end"))
+            except ValueError as error:
+                return jsonify({"error": str(error)}), 400
+        else:
+            return jsonify({"error": "ids or harbour is required"}), 400
+
+        try:
+            zoom = float(values["zoom"]) if values.get("zoom") is not None else None
+            max_points = min(int(values.get("max_points", MAX_POINTS)), MAX_POINTS)
+        except (TypeError, ValueError):
+            return jsonify({"error": "zoom and max_points must be numbers"}), 400
+        if max_points < 1:
+            return jsonify({"error": "max_points must be at least 1"}), 400
+
+        return jsonify(to_json(simplify(lookup(dataset, trip_ids), zoom, max_points)))